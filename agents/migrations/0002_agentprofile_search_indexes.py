@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentprofile',
+            index=models.Index(fields=['display_name', 'id'], name='agents_agen_display_7ffe39_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentprofile',
+            index=models.Index(fields=['specialization'], name='agents_agen_special_09a54c_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18
+
+from django.db import migrations
+
+# Индексы для поиска организаторов по началу имени и специализации
+# (interactions/pickers.py); почему они такие — см. там же.
+TABLE = 'agents_agentprofile'
+PREFIX_SEARCH_FIELDS = ['display_name', 'specialization']
+
+
+def _index_name(field):
+    return f'{TABLE}_{field}_prefix'
+
+
+def create_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    quote = schema_editor.quote_name
+    for field in PREFIX_SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} (UPPER({quote(field)}) varchar_pattern_ops)'
+            )
+        elif vendor == 'sqlite':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} ({quote(field)} COLLATE NOCASE)'
+            )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    for field in PREFIX_SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(_index_name(field))}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0002_agentprofile_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='agentprofile',
+            name='agents_agen_special_09a54c_idx',
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -37,6 +37,11 @@ class AgentProfile(models.Model):
         verbose_name = 'Профиль организатора'
         verbose_name_plural = 'Профили организаторов'
         ordering = ['-created_at']
+        # Индексы для поиска по началу строки (istartswith) создаются
+        # миграцией prefix_search_indexes: они зависят от СУБД
+        indexes = [
+            models.Index(fields=['display_name', 'id']),
+        ]
 
     def __str__(self):
         return f"Agent: {self.display_name or self.user.username}"
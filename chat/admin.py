@@ -1,14 +1,20 @@
 from django.contrib import admin
-from .models import ChatRoom, Message
+from .models import ChatReadState, ChatRoom, Message
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ('performer', 'client', 'created_at')
+    list_display = ('performer', 'client', 'created_at', 'last_message_at')
     search_fields = ('performer__username', 'client__username')
     list_filter = ('created_at',)
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('room', 'sender', 'timestamp', 'is_read')
-    list_filter = ('is_read', 'timestamp')
+    list_display = ('room', 'sender', 'timestamp')
+    list_filter = ('timestamp',)
     search_fields = ('text', 'sender__username')
+
+@admin.register(ChatReadState)
+class ChatReadStateAdmin(admin.ModelAdmin):
+    list_display = ('room', 'user', 'last_read_message_id', 'updated_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('room', 'user')
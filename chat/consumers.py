@@ -1,8 +1,48 @@
+import functools
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync
+from channels.db import DatabaseSyncToAsync
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
-from .models import ChatRoom, Message
-from accounts.models import User
+from django.conf import settings
+
+from . import presence
+from .models import ChatReadState, ChatRoom, Message
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Отдельный ограниченный пул для запросов чата: по умолчанию sync_to_async
+    # выполняет всё в одном потоке, и занятая комната тормозит все сокеты процесса
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHAT_DB_WORKERS', 4),
+                thread_name_prefix='chat-db',
+            )
+    return _executor
+
+
+def chat_db(func):
+    """Выполняет func в пуле чата, закрывая устаревшие соединения с БД."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await DatabaseSyncToAsync(func, thread_sensitive=False, executor=_get_executor())(*args, **kwargs)
+    return wrapper
+
+
+def chat_io(func):
+    """Выполняет блокирующий вызов без БД (кэш присутствия) в том же пуле."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await SyncToAsync(func, thread_sensitive=False, executor=_get_executor())(*args, **kwargs)
+    return wrapper
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -15,16 +55,17 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        # Проверим, существует ли чат и есть ли доступ (через sync_to_async)
-        try:
-            room = await sync_to_async(ChatRoom.objects.select_related('performer', 'client').get)(id=self.room_id)
-            # Теперь performer и client уже загружены, можно использовать безопасно
-            if user != room.performer and user != room.client:
-                await self.close()
-                return
-        except ChatRoom.DoesNotExist:
+        # Комната и участники загружаются и проверяются один раз на соединение,
+        # дальше используются запомненные объекты
+        self.room = await self.load_room(self.room_id)
+        if self.room is None or user.pk not in (self.room.performer_id, self.room.client_id):
             await self.close()
             return
+        self.user_id = user.pk
+        if self.room.performer_id == user.pk:
+            self.sender, self.peer_id = self.room.performer, self.room.client_id
+        else:
+            self.sender, self.peer_id = self.room.client, self.room.performer_id
 
         # Подключаемся к группе
         await self.channel_layer.group_add(
@@ -33,6 +74,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        await self.touch_presence()
+        # Пользователь открыл чат — сообщения собеседника прочитаны
+        await self.mark_read()
 
     async def disconnect(self, close_code):
         # Отключаемся от группы
@@ -40,14 +84,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        if getattr(self, 'user_id', None) is not None:
+            await self.leave_presence()
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
-        message = data['message']
-        user_id = self.scope['user'].id
+        try:
+            data = json.loads(text_data)
+        except (ValueError, TypeError):
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('type') == 'heartbeat':
+            # Клиент подтверждает, что чат всё ещё открыт
+            await self.touch_presence()
+            return
+
+        message = data.get('message')
+        if not isinstance(message, str) or not message.strip():
+            return
 
         # Сохраним сообщение в БД
-        await self.save_message(self.room_id, user_id, message)
+        message_id = await self.save_message(message)
 
         # Рассылка всем в группе
         await self.channel_layer.group_send(
@@ -55,7 +112,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             {
                 'type': 'chat_message',
                 'message': message,
-                'sender_id': user_id,
+                'sender_id': self.user_id,
+                'message_id': message_id,
             }
         )
 
@@ -67,22 +125,29 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'message': message,
             'sender_id': sender_id,
+            'message_id': event.get('message_id'),
         }))
+        if sender_id != self.user_id:
+            # Получатель онлайн и видит чат
+            await self.mark_read(event.get('message_id'))
+
+    @chat_io
+    def touch_presence(self):
+        presence.touch(self.room.id, self.user_id, self.channel_name)
+
+    @chat_io
+    def leave_presence(self):
+        presence.leave(self.room.id, self.user_id, self.channel_name)
+
+    @chat_db
+    def load_room(self, room_id):
+        return ChatRoom.objects.select_related('performer', 'client').filter(id=room_id).first()
+
+    @chat_db
+    def save_message(self, text):
+        # Один INSERT: комната и отправитель уже загружены в connect
+        return Message.objects.create(room=self.room, sender=self.sender, text=text).pk
 
-    @sync_to_async
-    def save_message(self, room_id, user_id, text):
-        room = ChatRoom.objects.get(id=room_id)
-        user = User.objects.get(id=user_id)
-        message = Message.objects.create(room=room, sender=user, text=text)
-        
-        # Отмечаем все предыдущие сообщения от другого пользователя как прочитанные
-        # (так как пользователь сейчас онлайн и видит чат)
-        Message.objects.filter(
-            room=room
-        ).exclude(
-            sender=user
-        ).filter(
-            is_read=False
-        ).update(is_read=True)
-        
-        return message
\ No newline at end of file
+    @chat_db
+    def mark_read(self, message_id=None):
+        ChatReadState.mark_read(self.room.id, self.user_id, message_id)
@@ -0,0 +1,35 @@
+"""История сообщений чата.
+
+Страница — последние PAGE_SIZE сообщений комнаты; более ранние выбираются
+курсором before_id (id самого старого уже показанного сообщения) по
+индексу (room, id). Стоимость страницы не зависит от длины истории:
+ни COUNT, ни OFFSET не нужны.
+"""
+from django.utils import timezone
+
+from .models import Message
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def history_page(room_id, before_id=None, limit=PAGE_SIZE):
+    """Сообщения страницы по возрастанию id и признак, что есть более ранние."""
+    messages = Message.objects.filter(room_id=room_id)
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+    rows = list(messages.order_by('-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'text': message.text,
+        'timestamp': message.timestamp.isoformat(),
+        'time': timezone.localtime(message.timestamp).strftime('%H:%M'),
+    }
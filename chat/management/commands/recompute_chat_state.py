@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import ChatRoom
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает последнее сообщение и счётчики непрочитанных в чатах по таблице сообщений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, action='append', dest='rooms', help='ID чата (можно несколько)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = ChatRoom.objects.all()
+        if options['rooms']:
+            queryset = queryset.filter(pk__in=options['rooms'])
+        fixed = ChatRoom.recompute_message_state(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено чатов: {fixed}'))
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def create_read_states(apps, schema_editor):
+    # Отметка участника — последнее прочитанное им сообщение собеседника
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    Message = apps.get_model('chat', 'Message')
+
+    last_read = {
+        (room_id, sender_id): message_id
+        for room_id, sender_id, message_id in Message.objects.filter(is_read=True)
+        .values('room_id', 'sender_id')
+        .annotate(message_id=Max('id'))
+        .values_list('room_id', 'sender_id', 'message_id')
+    }
+    states = []
+    for room_id, performer_id, client_id in ChatRoom.objects.values_list('id', 'performer_id', 'client_id').iterator():
+        for user_id, peer_id in ((performer_id, client_id), (client_id, performer_id)):
+            message_id = last_read.get((room_id, peer_id))
+            if message_id:
+                states.append(ChatReadState(room_id=room_id, user_id=user_id, last_read_message_id=message_id))
+    ChatReadState.objects.bulk_create(states, batch_size=1000)
+
+
+def restore_is_read(apps, schema_editor):
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    Message = apps.get_model('chat', 'Message')
+
+    for room_id, user_id, message_id in ChatReadState.objects.values_list('room_id', 'user_id', 'last_read_message_id').iterator():
+        Message.objects.filter(room_id=room_id, id__lte=message_id).exclude(sender_id=user_id).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'user'), name='chat_read_state_room_user_unique')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'id'], name='chat_messag_room_id_12c833_idx'),
+        ),
+        migrations.RunPython(create_read_states, restore_is_read),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_message_state(apps, schema_editor):
+    ChatReadState = apps.get_model('chat', 'ChatReadState')
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+
+    watermarks = {
+        (room_id, user_id): message_id
+        for room_id, user_id, message_id in ChatReadState.objects.values_list('room_id', 'user_id', 'last_read_message_id')
+    }
+    rooms = []
+    for room in ChatRoom.objects.only('id', 'performer_id', 'client_id').iterator():
+        last = Message.objects.filter(room_id=room.id).order_by('-id').only('id', 'timestamp', 'text').first()
+        if last is None:
+            continue
+        text = ' '.join(last.text.split())
+        room.last_message_id = last.id
+        room.last_message_at = last.timestamp
+        room.last_message_preview = text if len(text) <= 120 else text[:119] + '…'
+        for user_id, field in ((room.performer_id, 'performer_unread_count'), (room.client_id, 'client_unread_count')):
+            setattr(room, field, Message.objects.filter(
+                room_id=room.id,
+                id__gt=watermarks.get((room.id, user_id), 0),
+            ).exclude(sender_id=user_id).count())
+        rooms.append(room)
+    ChatRoom.objects.bulk_update(
+        rooms,
+        ['last_message_id', 'last_message_at', 'last_message_preview', 'performer_unread_count', 'client_unread_count'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_read_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='client_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='performer_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['performer', 'last_message_at'], name='chat_chatro_perform_03d6c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['client', 'last_message_at'], name='chat_chatro_client__b429e9_idx'),
+        ),
+        migrations.RunPython(fill_message_state, migrations.RunPython.noop),
+    ]
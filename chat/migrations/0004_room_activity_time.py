@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:30
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_activity_time(apps, schema_editor):
+    # Чат без сообщений активен с момента создания
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatRoom.objects.filter(last_message_at__isnull=True).update(last_message_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_room_message_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_activity_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
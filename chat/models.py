@@ -1,23 +1,222 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from accounts.models import User
 
+PREVIEW_LENGTH = 120
+MESSAGE_STATE_FIELDS = [
+    'last_message_id',
+    'last_message_at',
+    'last_message_preview',
+    'performer_unread_count',
+    'client_unread_count',
+]
+
+
 class ChatRoom(models.Model):
     performer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='performer_chats')
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='client_chats')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Денормализация для списка чатов: поддерживается Message.save и
+    # ChatReadState.mark_read, пересчитывается командой recompute_chat_state.
+    # last_message_at — время последней активности: у чата без сообщений это
+    # время создания, поэтому список сортируется по нему без Coalesce
+    last_message_id = models.PositiveBigIntegerField(null=True, blank=True)
+    last_message_at = models.DateTimeField(default=timezone.now)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+    performer_unread_count = models.PositiveIntegerField(default=0)
+    client_unread_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('performer', 'client')
+        indexes = [
+            models.Index(fields=['performer', 'last_message_at']),
+            models.Index(fields=['client', 'last_message_at']),
+        ]
 
     def __str__(self):
         return f"Chat: {self.performer} ↔ {self.client}"
 
+    def save(self, *args, **kwargs):
+        # Поля сообщения меняются UPDATE-ами в обход экземпляра, поэтому
+        # полное сохранение устаревшего объекта не должно их перезаписывать.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MESSAGE_STATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def unread_count_for(self, user):
+        return self.performer_unread_count if user.pk == self.performer_id else self.client_unread_count
+
+    @classmethod
+    def record_message(cls, message):
+        """Одним UPDATE запоминает последнее сообщение и увеличивает счётчик получателя."""
+        cls.objects.filter(pk=message.room_id).update(
+            last_message_id=message.pk,
+            last_message_at=message.timestamp,
+            last_message_preview=preview(message.text),
+            performer_unread_count=Case(
+                When(client_id=message.sender_id, then=F('performer_unread_count') + 1),
+                default=F('performer_unread_count'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            client_unread_count=Case(
+                When(performer_id=message.sender_id, then=F('client_unread_count') + 1),
+                default=F('client_unread_count'),
+                output_field=models.PositiveIntegerField(),
+            ),
+        )
+
+    @classmethod
+    def refresh_unread_count(cls, room_id, user_id):
+        """Пересчитывает счётчик пользователя по его отметке прочтения."""
+        unread = _unread_subquery(OuterRef('pk'), user_id)
+        cls.objects.filter(pk=room_id).update(
+            performer_unread_count=Case(
+                When(performer_id=user_id, then=unread),
+                default=F('performer_unread_count'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            client_unread_count=Case(
+                When(client_id=user_id, then=unread),
+                default=F('client_unread_count'),
+                output_field=models.PositiveIntegerField(),
+            ),
+        )
+
+    @classmethod
+    def recompute_message_state(cls, queryset=None, batch_size=500):
+        """Пересчитывает денормализованные поля по сообщениям; возвращает число исправленных чатов."""
+        queryset = cls.objects.all() if queryset is None else queryset
+        last = Message.objects.filter(room=OuterRef('pk')).order_by('-id')
+        rows = queryset.order_by().annotate(
+            actual_last_message_id=Subquery(last.values('id')[:1]),
+            actual_last_message_at=Coalesce(Subquery(last.values('timestamp')[:1]), 'created_at'),
+            actual_last_message_text=Subquery(last.values('text')[:1]),
+            actual_performer_unread_count=_unread_subquery(OuterRef('pk'), OuterRef('performer_id')),
+            actual_client_unread_count=_unread_subquery(OuterRef('pk'), OuterRef('client_id')),
+        ).only('pk', 'performer_id', 'client_id', 'created_at', *MESSAGE_STATE_FIELDS)
+        changed = []
+        for room in rows.iterator(chunk_size=batch_size):
+            actual = {
+                'last_message_id': room.actual_last_message_id,
+                'last_message_at': room.actual_last_message_at,
+                'last_message_preview': preview(room.actual_last_message_text or ''),
+                'performer_unread_count': room.actual_performer_unread_count,
+                'client_unread_count': room.actual_client_unread_count,
+            }
+            if any(getattr(room, field) != value for field, value in actual.items()):
+                for field, value in actual.items():
+                    setattr(room, field, value)
+                changed.append(room)
+        cls.objects.bulk_update(changed, MESSAGE_STATE_FIELDS, batch_size=batch_size)
+        return len(changed)
+
+
+def preview(text):
+    text = ' '.join(text.split())
+    if len(text) <= PREVIEW_LENGTH:
+        return text
+    return text[:PREVIEW_LENGTH - 1] + '…'
+
+
+def _unread_subquery(room, user_id):
+    """
+    Число сообщений собеседника user_id выше его отметки прочтения.
+
+    room и user_id — значения или OuterRef на уровне запроса к ChatRoom.
+    """
+    watermark = Coalesce(
+        Subquery(
+            ChatReadState.objects.filter(
+                room_id=OuterRef('room_id'),
+                user_id=OuterRef(user_id) if isinstance(user_id, OuterRef) else user_id,
+            ).values('last_read_message_id')[:1]
+        ),
+        Value(0),
+    )
+    return Coalesce(
+        Subquery(
+            Message.objects.filter(room_id=room, id__gt=watermark)
+            .exclude(sender_id=user_id)
+            .order_by()
+            .values('room_id')
+            .annotate(count=Count('id'))
+            .values('count')[:1]
+        ),
+        Value(0),
+    )
+
 class Message(models.Model):
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'id']),
+        ]
+
+    def __str__(self):
+        return f"From {self.sender} at {self.timestamp}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChatRoom.record_message(self)
+
+
+class ChatReadState(models.Model):
+    """
+    Отметка прочтения чата пользователем.
+
+    Прочитаны все сообщения комнаты с id <= last_read_message_id;
+    непрочитанные — сообщения собеседника с большим id (индекс room, id).
+    """
+
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_states')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'user'], name='chat_read_state_room_user_unique'),
+        ]
 
     def __str__(self):
-        return f"From {self.sender} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.user} read {self.room_id} up to {self.last_read_message_id}"
+
+    @classmethod
+    def mark_read(cls, room_id, user_id, message_id=None):
+        """
+        Сдвигает отметку вперёд до message_id (по умолчанию — до последнего
+        сообщения комнаты). Отметка никогда не уменьшается, обычно это один
+        UPDATE одной строки и, если она сдвинулась, пересчёт счётчика
+        непрочитанных в ChatRoom (по сообщениям выше новой отметки).
+        """
+        if message_id is None:
+            message_id = Message.objects.filter(room_id=room_id).order_by('-id').values_list('id', flat=True).first()
+            if message_id is None:
+                return
+        states = cls.objects.filter(room_id=room_id, user_id=user_id, last_read_message_id__lt=message_id)
+        advanced = states.update(last_read_message_id=message_id, updated_at=timezone.now())
+        if not advanced:
+            state, advanced = cls.objects.get_or_create(
+                room_id=room_id,
+                user_id=user_id,
+                defaults={'last_read_message_id': message_id},
+            )
+            if not advanced and state.last_read_message_id < message_id:
+                # Строка уже была или её только что создал параллельный запрос
+                advanced = states.update(last_read_message_id=message_id, updated_at=timezone.now())
+        if advanced:
+            ChatRoom.refresh_unread_count(room_id, user_id)
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Присутствие пользователей в чатах.
+
+ChatConsumer отмечает каждое соединение при connect, продлевает отметку по
+heartbeat-кадрам клиента и снимает при disconnect. Отметки живут в кэше
+«presence» (Redis по адресу CHAT_PRESENCE_CACHE_URL, по умолчанию
+REDIS_URL) с TTL CHAT_PRESENCE_TTL: соединение, оборвавшееся без
+disconnect, перестаёт считаться присутствующим само.
+
+На пользователя в комнате заведено одно множество соединений: в Redis —
+sorted set, где член — channel_name, а вес — срок действия отметки. Каждое
+соединение меняет только свой член одной командой ZADD/ZREM, поэтому две
+вкладки, открывающиеся или закрывающиеся одновременно, не затирают отметки
+друг друга, а закрытая вкладка не снимает присутствие при открытой второй.
+Кэш без Redis (LocMem в тестах) общий только внутри процесса; там то же
+множество хранится словарём и меняется под блокировкой.
+
+Уведомления о сообщениях не отправляются пользователю, у которого чат
+открыт прямо сейчас.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+CACHE_ALIAS = 'presence'
+
+_local_lock = threading.Lock()
+
+
+def presence_ttl():
+    return getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+
+
+def heartbeat_interval():
+    """Как часто клиент должен подтверждать присутствие, в секундах."""
+    return max(presence_ttl() // 2, 5)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(room_id, user_id):
+    return f'chat:presence:{room_id}:{user_id}'
+
+
+def _redis(cache, key):
+    """Клиент Redis и полное имя ключа (с префиксом и версией кэша)."""
+    return cache._cache.get_client(key, write=True), cache.make_and_validate_key(key)
+
+
+def _alive(connections, now):
+    return {channel: expires for channel, expires in (connections or {}).items() if expires > now}
+
+
+def touch(room_id, user_id, channel_name):
+    """Отмечает или продлевает соединение channel_name пользователя в комнате."""
+    ttl = presence_ttl()
+    now = time.time()
+    cache = _cache()
+    if isinstance(cache, RedisCache):
+        client, key = _redis(cache, _key(room_id, user_id))
+        pipe = client.pipeline()
+        pipe.zadd(key, {channel_name: now + ttl})
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.expire(key, ttl)
+        pipe.execute()
+        return
+
+    key = _key(room_id, user_id)
+    with _local_lock:
+        connections = _alive(cache.get(key), now)
+        connections[channel_name] = now + ttl
+        cache.set(key, connections, ttl)
+
+
+def leave(room_id, user_id, channel_name):
+    cache = _cache()
+    if isinstance(cache, RedisCache):
+        client, key = _redis(cache, _key(room_id, user_id))
+        client.zrem(key, channel_name)
+        return
+
+    key = _key(room_id, user_id)
+    with _local_lock:
+        connections = _alive(cache.get(key), time.time())
+        connections.pop(channel_name, None)
+        if connections:
+            cache.set(key, connections, presence_ttl())
+        else:
+            cache.delete(key)
+
+
+def is_present(room_id, user_id):
+    """Открыт ли у пользователя чат хотя бы в одном живом соединении."""
+    now = time.time()
+    cache = _cache()
+    if isinstance(cache, RedisCache):
+        client, key = _redis(cache, _key(room_id, user_id))
+        return client.zcount(key, f'({now}', '+inf') > 0
+    return bool(_alive(cache.get(_key(room_id, user_id)), now))
@@ -1,10 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from accounts.models import LegalAcceptance
 from core.legal import LEGAL_DOCUMENTS, REQUIRED_LEGAL_DOCUMENT_SLUGS
-from .models import ChatRoom, Message
+from . import consumers, history, presence
+from .models import PREVIEW_LENGTH, ChatReadState, ChatRoom, Message
+from .routing import websocket_urlpatterns
+
+# Redis в тестах нет: присутствие хранится в памяти процесса
+LOCMEM_PRESENCE_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    presence.CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat-presence',
+    },
+}
 
 
 class ChatRoomTests(TestCase):
@@ -40,3 +62,336 @@ class ChatRoomTests(TestCase):
         self.assertContains(response, 'https://example.com')
         self.assertContains(response, '&lt;script&gt;alert(&quot;xss&quot;)&lt;/script&gt;')
         self.assertNotContains(response, '<script>alert("xss")</script>')
+
+
+
+@override_settings(CACHES=LOCMEM_PRESENCE_CACHES)
+class ChatReadStateTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.performer = User.objects.create_user(username='performer', email='performer@example.com', password='x')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='x')
+        self.room = ChatRoom.objects.create(performer=self.performer, client=self.client_user)
+        for slug in REQUIRED_LEGAL_DOCUMENT_SLUGS:
+            LegalAcceptance.objects.create(
+                user=self.performer,
+                document_slug=slug,
+                document_title=LEGAL_DOCUMENTS[slug]['title'],
+                document_version=LEGAL_DOCUMENTS[slug]['version'],
+            )
+        self.messages = [
+            Message.objects.create(room=self.room, sender=self.client_user, text=f'message {index}')
+            for index in range(3)
+        ]
+
+    def test_mark_read_moves_watermark_forward_only(self):
+        ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[1].id)
+        ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[0].id)
+
+        state = ChatReadState.objects.get(room=self.room, user=self.performer)
+        self.assertEqual(state.last_read_message_id, self.messages[1].id)
+
+        # Сдвиг отметки и пересчёт счётчика в комнате
+        with self.assertNumQueries(2):
+            ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[2].id)
+        state.refresh_from_db()
+        self.assertEqual(state.last_read_message_id, self.messages[2].id)
+
+    def test_chat_list_counts_peer_messages_above_watermark(self):
+        ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[0].id)
+        Message.objects.create(room=self.room, sender=self.performer, text='own reply')
+
+        self.client.force_login(self.performer)
+        response = self.client.get(reverse('chat_list'))
+
+        self.assertEqual(response.context['chats'][0].unread_count, 2)
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.performer_unread_count, self.room.client_unread_count), (2, 1))
+
+    def test_new_message_updates_room_summary(self):
+        message = Message.objects.create(room=self.room, sender=self.performer, text='  Привет,\n' + 'а' * 200)
+
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, message.id)
+        self.assertEqual(self.room.last_message_at, message.timestamp)
+        self.assertEqual(len(self.room.last_message_preview), PREVIEW_LENGTH)
+        self.assertTrue(self.room.last_message_preview.startswith('Привет, ааа'))
+        self.assertEqual((self.room.performer_unread_count, self.room.client_unread_count), (3, 1))
+
+        # Полное сохранение устаревшего объекта не затирает сводку
+        stale = ChatRoom.objects.get(pk=self.room.pk)
+        Message.objects.create(room=self.room, sender=self.client_user, text='ещё')
+        stale.save()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_preview, 'ещё')
+        self.assertEqual(self.room.performer_unread_count, 4)
+
+    def test_chat_list_is_a_single_room_query(self):
+        User = get_user_model()
+        for index in range(5):
+            other = User.objects.create_user(username=f'other{index}', email=f'other{index}@example.com', password='x')
+            room = ChatRoom.objects.create(performer=self.performer, client=other)
+            Message.objects.create(room=room, sender=other, text='hello')
+
+        self.client.force_login(self.performer)
+        # Сессия, пользователь, документы, чаты и два запроса базового шаблона
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('chat_list'))
+
+        self.assertEqual(len(response.context['chats']), 6)
+        self.assertEqual(response.context['chats'][0].last_message_preview, 'hello')
+
+    def test_chat_list_orders_by_last_activity(self):
+        User = get_user_model()
+        # Пользователь — клиент в одном чате и исполнитель в другом
+        agent = User.objects.create_user(username='agent', email='agent@example.com', password='x')
+        as_client = ChatRoom.objects.create(performer=agent, client=self.performer)
+        empty = ChatRoom.objects.create(performer=self.performer, client=User.objects.create_user(
+            username='silent', email='silent@example.com', password='x',
+        ))
+        ChatRoom.objects.filter(pk=as_client.pk).update(last_message_at=timezone.now() - timedelta(days=1))
+
+        self.client.force_login(self.performer)
+        response = self.client.get(reverse('chat_list'))
+
+        self.assertEqual([chat.pk for chat in response.context['chats']], [empty.pk, self.room.pk, as_client.pk])
+
+    def test_recompute_fixes_drifted_counters(self):
+        ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[0].id)
+        ChatRoom.objects.filter(pk=self.room.pk).update(
+            performer_unread_count=10,
+            last_message_preview='',
+        )
+
+        self.assertEqual(ChatRoom.recompute_message_state(), 1)
+
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.performer_unread_count, 2)
+        self.assertEqual(self.room.last_message_id, self.messages[-1].id)
+        self.assertEqual(self.room.last_message_preview, 'message 2')
+        self.assertEqual(ChatRoom.recompute_message_state(), 0)
+
+    def test_unread_reminder_skips_messages_below_watermark(self):
+        from notifications.models import Notification
+        from notifications.utils import check_unread_chat_messages
+
+        ChatReadState.mark_read(self.room.id, self.performer.id, self.messages[1].id)
+        Message.objects.filter(room=self.room).update(timestamp=timezone.now() - timedelta(minutes=10))
+
+        check_unread_chat_messages()
+
+        notified = set(Notification.objects.filter(
+            notification_type=Notification.NOTIFICATION_TYPE_CHAT_MESSAGE,
+        ).values_list('related_object_id', flat=True))
+        self.assertEqual(notified, {self.messages[2].id})
+
+    def test_opening_room_marks_everything_read(self):
+        self.client.force_login(self.performer)
+        self.client.get(reverse('chat_room', args=[self.room.id]))
+
+        state = ChatReadState.objects.get(room=self.room, user=self.performer)
+        self.assertEqual(state.last_read_message_id, self.messages[-1].id)
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.performer = User.objects.create_user(username='performer', email='performer@example.com', password='x')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='x')
+        self.outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='x')
+        self.room = ChatRoom.objects.create(performer=self.performer, client=self.client_user)
+        for user in (self.performer, self.outsider):
+            for slug in REQUIRED_LEGAL_DOCUMENT_SLUGS:
+                LegalAcceptance.objects.create(
+                    user=user,
+                    document_slug=slug,
+                    document_title=LEGAL_DOCUMENTS[slug]['title'],
+                    document_version=LEGAL_DOCUMENTS[slug]['version'],
+                )
+        Message.objects.bulk_create([
+            Message(room=self.room, sender=self.client_user if index % 2 else self.performer, text=f'message {index}')
+            for index in range(history.PAGE_SIZE * 2 + 5)
+        ])
+        self.message_ids = list(Message.objects.filter(room=self.room).order_by('id').values_list('id', flat=True))
+
+    def test_room_renders_only_latest_page(self):
+        self.client.force_login(self.performer)
+        response = self.client.get(reverse('chat_room', args=[self.room.id]))
+
+        rendered = [message.id for message in response.context['chat_messages']]
+        self.assertEqual(rendered, self.message_ids[-history.PAGE_SIZE:])
+        self.assertTrue(response.context['has_more_messages'])
+        self.assertContains(response, 'id="historyLoader"')
+        self.assertNotContains(response, f'data-message-id="{self.message_ids[0]}"')
+
+    def test_history_pages_backwards_by_before_id(self):
+        self.client.force_login(self.performer)
+        url = reverse('chat_history', args=[self.room.id])
+        collected = []
+        before_id = self.message_ids[-history.PAGE_SIZE]
+        while True:
+            data = self.client.get(url, {'before_id': before_id}).json()
+            collected = [item['id'] for item in data['messages']] + collected
+            if not data['has_more']:
+                break
+            before_id = data['before_id']
+
+        self.assertEqual(collected, self.message_ids[:-history.PAGE_SIZE])
+
+    def test_history_page_is_a_single_message_query(self):
+        self.client.force_login(self.performer)
+        url = reverse('chat_history', args=[self.room.id])
+        with self.assertNumQueries(5):
+            self.client.get(url, {'before_id': self.message_ids[-1]})
+
+    def test_history_rejects_outsiders_and_bad_cursor(self):
+        url = reverse('chat_history', args=[self.room.id])
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.performer)
+        self.assertEqual(self.client.get(url, {'before_id': 'abc'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_PRESENCE_CACHES)
+class ChatPresenceTests(TestCase):
+    def setUp(self):
+        caches[presence.CACHE_ALIAS].clear()
+        User = get_user_model()
+        self.performer = User.objects.create_user(username='performer', email='performer@example.com', password='x')
+        self.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='x', is_email_verified=True,
+        )
+        self.room = ChatRoom.objects.create(performer=self.performer, client=self.client_user)
+
+    def test_presence_lasts_until_last_connection_leaves(self):
+        presence.touch(self.room.id, self.client_user.id, 'tab-1')
+        presence.touch(self.room.id, self.client_user.id, 'tab-2')
+
+        presence.leave(self.room.id, self.client_user.id, 'tab-1')
+        self.assertTrue(presence.is_present(self.room.id, self.client_user.id))
+        self.assertFalse(presence.is_present(self.room.id, self.performer.id))
+
+        presence.leave(self.room.id, self.client_user.id, 'tab-2')
+        self.assertFalse(presence.is_present(self.room.id, self.client_user.id))
+
+    def test_connection_without_heartbeat_expires(self):
+        presence.touch(self.room.id, self.client_user.id, 'tab-1')
+
+        with mock.patch('chat.presence.time.time', return_value=time.time() + presence.presence_ttl() + 1):
+            self.assertFalse(presence.is_present(self.room.id, self.client_user.id))
+
+    def test_redis_presence_changes_only_own_connection(self):
+        redis_caches = {
+            **LOCMEM_PRESENCE_CACHES,
+            presence.CACHE_ALIAS: {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://127.0.0.1:6379/0',
+            },
+        }
+        client = mock.Mock()
+        client.zcount.return_value = 1
+        with override_settings(CACHES=redis_caches), \
+                mock.patch.object(presence, '_redis', return_value=(client, 'presence-key')):
+            presence.touch(self.room.id, self.client_user.id, 'tab-1')
+            presence.leave(self.room.id, self.client_user.id, 'tab-1')
+            self.assertTrue(presence.is_present(self.room.id, self.client_user.id))
+
+        # Соединение добавляет и снимает только свой член множества,
+        # не читая и не перезаписывая отметки других вкладок
+        client.pipeline.return_value.zadd.assert_called_once_with('presence-key', {'tab-1': mock.ANY})
+        client.zrem.assert_called_once_with('presence-key', 'tab-1')
+        client.get.assert_not_called()
+        client.set.assert_not_called()
+
+    def test_present_recipient_is_not_emailed(self):
+        presence.touch(self.room.id, self.client_user.id, 'tab-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(room=self.room, sender=self.performer, text='while online')
+        self.assertEqual(len(mail.outbox), 0)
+
+        presence.leave(self.room.id, self.client_user.id, 'tab-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(room=self.room, sender=self.performer, text='while away')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['client@example.com'])
+
+    def test_presence_outage_falls_back_to_email(self):
+        with mock.patch.object(presence, 'is_present', side_effect=ConnectionError('cache is down')), \
+                self.assertLogs('notifications.utils', level='ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(room=self.room, sender=self.performer, text='cache outage')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(
+    CACHES=LOCMEM_PRESENCE_CACHES,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class ChatConsumerTests(TransactionTestCase):
+    def setUp(self):
+        # Общая in-memory БД SQLite в тестах не допускает одновременной записи
+        # из разных потоков, поэтому пул чата здесь из одного потока
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        patcher = mock.patch.object(consumers, '_executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        User = get_user_model()
+        self.performer = User.objects.create_user(username='performer', email='performer@example.com', password='x')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='x')
+        self.outsider = User.objects.create_user(username='outsider', email='outsider@example.com', password='x')
+        self.room = ChatRoom.objects.create(performer=self.performer, client=self.client_user)
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room.id}/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def test_connection_is_present_until_disconnect(self):
+        caches[presence.CACHE_ALIAS].clear()
+
+        async def scenario():
+            communicator = self._communicator(self.client_user)
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'heartbeat'})
+            await communicator.receive_nothing()
+            online = await sync_to_async(presence.is_present)(self.room.id, self.client_user.id)
+            await communicator.disconnect()
+            return online
+
+        self.assertTrue(async_to_sync(scenario)())
+        self.assertFalse(presence.is_present(self.room.id, self.client_user.id))
+
+    def test_outsider_is_rejected(self):
+        async def scenario():
+            communicator = self._communicator(self.outsider)
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(scenario)())
+
+    def test_message_is_saved_and_marked_read_for_connected_peer(self):
+        Message.objects.create(room=self.room, sender=self.client_user, text='earlier')
+
+        async def scenario():
+            performer = self._communicator(self.performer)
+            client = self._communicator(self.client_user)
+            self.assertTrue((await performer.connect())[0])
+            self.assertTrue((await client.connect())[0])
+            await client.send_json_to({'message': 'hello'})
+            received = await performer.receive_json_from()
+            await client.receive_json_from()
+            await performer.disconnect()
+            await client.disconnect()
+            return received
+
+        received = async_to_sync(scenario)()
+
+        message = Message.objects.get(text='hello')
+        self.assertEqual(received, {'message': 'hello', 'sender_id': self.client_user.pk, 'message_id': message.id})
+        self.assertEqual(message.sender, self.client_user)
+        state = ChatReadState.objects.get(room=self.room, user=self.performer)
+        self.assertEqual(state.last_read_message_id, message.id)
@@ -1,15 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages as django_messages
-from django.http import HttpResponseForbidden
-from django.db.models import Count, Max, Q
-from django.db.models.functions import Coalesce
+from django.http import HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+from django.db.models import Q
 from django.urls import reverse
-from .models import ChatRoom, Message
+from . import history, presence
+from .models import ChatReadState, ChatRoom, Message
 from accounts.models import User
 from performers.models import PerformerProfile
 
 
+PROFILE_RELATIONS = [
+    f'{side}__{profile}'
+    for side in ('performer', 'client')
+    for profile in ('performer_profile', 'agent_profile', 'client_profile')
+]
+
+
 def _get_or_create_chat_room(user_a, user_b):
     """Возвращает общий чат двух пользователей (в любом порядке) или создает его."""
     existing_room = ChatRoom.objects.filter(
@@ -56,26 +64,26 @@ def _get_user_public_url(user):
 
 @login_required
 def chat_list(request):
-    # Показываем чаты пользователя, сначала самые активные.
+    # Показываем чаты пользователя, сначала самые активные. Последнее
+    # сообщение и счётчики непрочитанных хранятся в самой комнате.
+    # Вместо OR по двум колонкам — UNION двух подзапросов, каждый по своему
+    # индексу: (performer, last_message_at) и (client, last_message_at).
+    as_performer = ChatRoom.objects.filter(performer=request.user).order_by().values('pk')
+    as_client = ChatRoom.objects.filter(client=request.user).order_by().values('pk')
     chats = ChatRoom.objects.filter(
-        Q(performer=request.user) | Q(client=request.user)
+        pk__in=as_performer.union(as_client),
     ).select_related(
         'performer',
         'client',
-    ).annotate(
-        last_message_at=Max('messages__timestamp'),
-        last_activity_at=Coalesce(Max('messages__timestamp'), 'created_at'),
-        unread_count=Count(
-            'messages',
-            filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user),
-        ),
-    ).order_by('-last_activity_at', '-created_at')
+        *PROFILE_RELATIONS,
+    ).order_by('-last_message_at', '-id')
     chat_items = []
     for chat in chats:
-        target = chat.client if request.user == chat.performer else chat.performer
+        target = chat.client if request.user.pk == chat.performer_id else chat.performer
         chat.target_user = target
         chat.target_display_name = _get_user_public_name(target)
         chat.target_profile_url = _get_user_public_url(target)
+        chat.unread_count = chat.unread_count_for(request.user)
         chat_items.append(chat)
 
     return render(request, 'chat/chat_list.html', {'chats': chat_items})
@@ -88,27 +96,50 @@ def chat_room(request, room_id):
     if request.user != room.performer and request.user != room.client:
         return HttpResponseForbidden('У вас нет доступа к этому чату.')
 
-    chat_messages = Message.objects.filter(room=room).order_by('timestamp')
-    
-    # Отмечаем все сообщения от другого пользователя как прочитанные
-    Message.objects.filter(
-        room=room
-    ).exclude(
-        sender=request.user
-    ).filter(
-        is_read=False
-    ).update(is_read=True)
+    # Только последняя страница, более ранние подгружаются через chat_history
+    chat_messages, has_more = history.history_page(room.id)
+
+    # Чат открыт — сдвигаем отметку прочтения до последнего сообщения
+    if chat_messages:
+        ChatReadState.mark_read(room.id, request.user.id, chat_messages[-1].id)
 
     target = room.client if request.user == room.performer else room.performer
 
     return render(request, 'chat/chat_room.html', {
         'room': room,
         'chat_messages': chat_messages,
+        'has_more_messages': has_more,
+        'presence_heartbeat_seconds': presence.heartbeat_interval(),
         'target_display_name': _get_user_public_name(target),
         'target_profile_url': _get_user_public_url(target),
     })
 
 
+@login_required
+@require_GET
+def chat_history(request, room_id):
+    """Страница истории: ?before_id=<id самого старого показанного сообщения>."""
+    room = get_object_or_404(ChatRoom, id=room_id)
+    if request.user.id not in (room.performer_id, room.client_id):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    try:
+        before_id = request.GET.get('before_id')
+        before_id = int(before_id) if before_id else None
+        limit = min(int(request.GET.get('limit') or history.PAGE_SIZE), history.MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+
+    messages_page, has_more = history.history_page(room.id, before_id, limit)
+    return JsonResponse({
+        'messages': [history.serialize_message(message) for message in messages_page],
+        'has_more': has_more,
+        'before_id': messages_page[0].id if messages_page else None,
+    })
+
+
 @login_required
 def send_message(request, room_id):
     room = get_object_or_404(ChatRoom, id=room_id)
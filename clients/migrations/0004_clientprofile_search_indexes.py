@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_alter_clientprofile_company_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientprofile',
+            index=models.Index(fields=['company_name', 'id'], name='clients_cli_company_144c58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientprofile',
+            index=models.Index(fields=['venue_type'], name='clients_cli_venue_t_f5640c_idx'),
+        ),
+    ]
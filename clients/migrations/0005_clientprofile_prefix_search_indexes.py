@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18
+
+from django.db import migrations
+
+# Поиск площадок по началу названия и типа площадки (interactions/pickers.py).
+TABLE = 'clients_clientprofile'
+PREFIX_SEARCH_FIELDS = ['company_name', 'venue_type']
+
+
+def _index_name(field):
+    return f'{TABLE}_{field}_prefix'
+
+
+def create_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    quote = schema_editor.quote_name
+    for field in PREFIX_SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} (UPPER({quote(field)}) varchar_pattern_ops)'
+            )
+        elif vendor == 'sqlite':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} ({quote(field)} COLLATE NOCASE)'
+            )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    for field in PREFIX_SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(_index_name(field))}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_clientprofile_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='clientprofile',
+            name='clients_cli_venue_t_f5640c_idx',
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -22,5 +22,12 @@ class ClientProfile(models.Model):
     has_green_rooms = models.BooleanField('Гримерные комнаты', default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Индексы для поиска по началу строки (istartswith) создаются
+        # миграцией prefix_search_indexes: они зависят от СУБД
+        indexes = [
+            models.Index(fields=['company_name', 'id']),
+        ]
+
     def __str__(self):
         return f"Client: {self.company_name}"
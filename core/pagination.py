@@ -0,0 +1,240 @@
+"""Keyset (cursor) pagination.
+
+В отличие от django.core.paginator.Paginator не выполняет COUNT(*) и OFFSET:
+страница выбирается условием «строго после/до ключа» по полям сортировки,
+поэтому глубокие страницы стоят столько же, сколько первая.
+
+Последнее поле сортировки должно быть уникальным (обычно id). NULL-значения
+всегда идут в конце сортировки, независимо от направления.
+"""
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+DIRECTION_NEXT = 'n'
+DIRECTION_PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder обрезает микросекунды, а ключ курсора должен быть точным
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction=DIRECTION_NEXT):
+    payload = json.dumps({'v': values, 'd': direction}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values, direction = payload['v'], payload['d']
+    except (binascii.Error, ValueError, UnicodeDecodeError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or direction not in (DIRECTION_NEXT, DIRECTION_PREVIOUS):
+        raise InvalidCursor(cursor)
+    return values, direction
+
+
+def _parse_ordering(ordering):
+    return [(name[1:], True) if name.startswith('-') else (name, False) for name in ordering]
+
+
+def _order_expressions(fields, reverse=False):
+    nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+    expressions = []
+    for name, descending in fields:
+        if descending != reverse:
+            expressions.append(F(name).desc(**nulls))
+        else:
+            expressions.append(F(name).asc(**nulls))
+    return expressions
+
+
+def _after(name, descending, value):
+    """Строки строго после value по одному полю (NULL — в конце)."""
+    if value is None:
+        return Q(pk__in=[])
+    lookup = 'lt' if descending else 'gt'
+    return Q(**{f'{name}__{lookup}': value}) | Q(**{f'{name}__isnull': True})
+
+
+def _before(name, descending, value):
+    """Строки строго до value по одному полю (NULL — в конце)."""
+    if value is None:
+        return Q(**{f'{name}__isnull': False})
+    lookup = 'gt' if descending else 'lt'
+    return Q(**{f'{name}__{lookup}': value})
+
+
+def _equal(name, value):
+    if value is None:
+        return Q(**{f'{name}__isnull': True})
+    return Q(**{name: value})
+
+
+def _resolve_field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    model = queryset.model
+    *relations, field_name = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    if field_name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(field_name)
+
+
+def clean_cursor_values(queryset, ordering, values):
+    """
+    Приводит значения ключа из курсора к типам полей сортировки.
+
+    Курсор приходит от клиента: значение неверного типа не должно дойти до
+    ORM, поэтому любая ошибка преобразования — InvalidCursor.
+    """
+    fields = _parse_ordering(ordering)
+    if len(values) != len(fields):
+        raise InvalidCursor(values)
+    cleaned = []
+    for (name, _), value in zip(fields, values):
+        if value is None:
+            cleaned.append(None)
+            continue
+        if isinstance(value, (list, dict)):
+            raise InvalidCursor(values)
+        try:
+            cleaned.append(_resolve_field(queryset, name).to_python(value))
+        except (ValidationError, TypeError, ValueError) as error:
+            raise InvalidCursor(values) from error
+    return cleaned
+
+
+def keyset_filter(ordering, values, direction=DIRECTION_NEXT, queryset=None):
+    """
+    Q-условие лексикографического сравнения с ключом values.
+
+    С queryset значения сначала проверяются clean_cursor_values.
+    """
+    fields = _parse_ordering(ordering)
+    if queryset is not None:
+        values = clean_cursor_values(queryset, ordering, values)
+    if len(values) != len(fields):
+        raise InvalidCursor(values)
+    compare = _after if direction == DIRECTION_NEXT else _before
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for (name, descending), value in zip(fields, values):
+        condition |= prefix & compare(name, descending, value)
+        prefix &= _equal(name, value)
+    return condition
+
+
+def cached_count(queryset, timeout=60):
+    """COUNT(*) запроса, закешированный по тексту SQL на timeout секунд."""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    digest = hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+    cache_key = f'keyset-count:{digest}'
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout)
+    return count
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[-1]), DIRECTION_NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[0]), DIRECTION_PREVIOUS)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page, count_cache_timeout=60):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.fields = _parse_ordering(self.ordering)
+        self.per_page = per_page
+        self.count_cache_timeout = count_cache_timeout
+
+    def key_for(self, obj):
+        return [getattr(obj, name) for name, _ in self.fields]
+
+    @property
+    def count(self):
+        """Приблизительное (закешированное) число строк без учёта курсора."""
+        return cached_count(self.queryset.order_by(), self.count_cache_timeout)
+
+    def get_page(self, cursor=None):
+        """Страница после/до курсора; неверный курсор даёт первую страницу."""
+        values, direction = None, DIRECTION_NEXT
+        if cursor:
+            try:
+                values, direction = decode_cursor(cursor)
+                condition = keyset_filter(self.ordering, values, direction, queryset=self.queryset)
+            except InvalidCursor:
+                values, direction = None, DIRECTION_NEXT
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(condition)
+
+        if direction == DIRECTION_PREVIOUS:
+            rows = list(queryset.order_by(*_order_expressions(self.fields, reverse=True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+
+        rows = list(queryset.order_by(*_order_expressions(self.fields))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_more, has_previous=values is not None)
@@ -189,7 +189,20 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Upload limits (tunable via .env to avoid 413 on mobile uploads)
 MAX_UPLOAD_SIZE_MB = config('MAX_UPLOAD_SIZE_MB', default=35, cast=int)
 DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+# Файлы крупнее порога Django пишет во временный файл, а не держит в памяти воркера
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=2621440, cast=int)
+
+# Project attachments (interactions/uploads.py): chunked resumable uploads streamed to disk
+ATTACHMENT_MAX_SIZE_MB = config('ATTACHMENT_MAX_SIZE_MB', default=2048, cast=int)
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default=str(BASE_DIR / 'tmp' / 'uploads'))
+
+# Image renditions (performers/renditions.py): generated after upload in a background thread pool
+IMAGE_RENDITIONS_ASYNC = config('IMAGE_RENDITIONS_ASYNC', default=True, cast=bool)
+IMAGE_RENDITION_WORKERS = config('IMAGE_RENDITION_WORKERS', default=2, cast=int)
+
+# Notification emails (notifications/utils.py): project invitations are sent after commit in a background thread pool
+NOTIFICATION_EMAILS_ASYNC = config('NOTIFICATION_EMAILS_ASYNC', default=True, cast=bool)
+NOTIFICATION_EMAIL_WORKERS = config('NOTIFICATION_EMAIL_WORKERS', default=2, cast=int)
 
 # Email (SMTP)
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
@@ -234,6 +247,24 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Потоки для запросов к БД из ChatConsumer (chat/consumers.py)
+CHAT_DB_WORKERS = config('CHAT_DB_WORKERS', default=4, cast=int)
+
+# Присутствие в чатах (chat/presence.py). Отметки должны видеть все процессы
+# (daphne, команды уведомлений), поэтому кэш — Redis, по умолчанию тот же,
+# что у Channels; тесты подменяют его на LocMem через override_settings
+CHAT_PRESENCE_CACHE_URL = config('CHAT_PRESENCE_CACHE_URL', default=REDIS_URL)
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'presence': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CHAT_PRESENCE_CACHE_URL,
+    },
+}
+
 # Security settings для production
 USE_X_FORWARDED_HOST = config('USE_X_FORWARDED_HOST', default=False, cast=bool)
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
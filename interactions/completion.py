@@ -0,0 +1,168 @@
+"""Сценарий подтверждения завершения проекта.
+
+Переходы (статус проекта / completion_status участников):
+
+* start — проект «В работе», есть принявшие участие: создатель и
+  суперпользователи сразу подтверждают, остальные получают запрос;
+* respond — принявший участие подтверждает или отклоняет завершение;
+* evaluate — все подтвердили → «Завершено», кто-то отклонил → «В работе»;
+* reset / cancel — запросы сбрасываются (при отмене проект → «Отменено»).
+
+Каждая операция выполняется в транзакции: строка проекта блокируется
+select_for_update, участники переводятся массовыми UPDATE, а проект
+(статус, даты и счётчики) сохраняется одним запросом. Одновременные ответы
+нескольких участников выстраиваются в очередь на блокировке проекта.
+"""
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import PARTICIPANT_COUNTER_FIELDS, Interaction, InteractionParticipant
+
+COMPLETION_COUNTER_FIELDS = list(InteractionParticipant.COMPLETION_COUNTER_FIELDS.values())
+_SYNCED_FIELDS = ['status', 'success_flag', 'completion_requested_at', 'completion_completed_at', *PARTICIPANT_COUNTER_FIELDS]
+
+
+def _lock(interaction_id):
+    return Interaction.objects.select_for_update().get(pk=interaction_id)
+
+
+def _write(locked, fields, target=None):
+    """Сохраняет проект одним UPDATE и переносит состояние в target."""
+    if fields:
+        locked.save(update_fields=list(dict.fromkeys(fields)))
+    if target is not None and target is not locked:
+        for field in _SYNCED_FIELDS:
+            setattr(target, field, getattr(locked, field))
+        target._loaded_status = locked.status
+
+
+def _evaluate(locked, now):
+    if not locked.participants_accepted_count:
+        return []
+    if locked.completion_declined_count:
+        # At least one participant declined completion, keep project active
+        locked.status = Interaction.STATUS_IN_PROGRESS
+        return ['status']
+    if locked.completion_outstanding_count > 0:
+        return []
+    locked.status = Interaction.STATUS_COMPLETED
+    locked.success_flag = True
+    locked.completion_completed_at = now
+    return ['status', 'success_flag', 'completion_completed_at']
+
+
+def _reset(locked):
+    locked.completion_requested_at = None
+    if locked.status != Interaction.STATUS_COMPLETED:
+        locked.completion_completed_at = None
+    locked.participant_links.update(
+        completion_status=InteractionParticipant.COMPLETION_NOT_REQUESTED,
+        completion_requested_at=None,
+        completion_responded_at=None,
+    )
+    for field in COMPLETION_COUNTER_FIELDS:
+        setattr(locked, field, 0)
+    return ['completion_requested_at', 'completion_completed_at', *COMPLETION_COUNTER_FIELDS]
+
+
+@transaction.atomic
+def reset(interaction):
+    locked = _lock(interaction.pk)
+    _write(locked, _reset(locked), interaction)
+
+
+@transaction.atomic
+def cancel(interaction):
+    locked = _lock(interaction.pk)
+    locked.status = Interaction.STATUS_CANCELLED
+    _write(locked, ['status', *_reset(locked)], interaction)
+
+
+@transaction.atomic
+def evaluate(interaction):
+    locked = _lock(interaction.pk)
+    _write(locked, _evaluate(locked, timezone.now()), interaction)
+
+
+@transaction.atomic
+def sync_status_from_participants(interaction):
+    """Статус проекта по ответам на приглашения (черновик / предложение / в работе)."""
+    locked = _lock(interaction.pk)
+    if not locked.participants_total_count:
+        locked.status = Interaction.STATUS_DRAFT
+    elif locked.participants_pending_count:
+        locked.status = Interaction.STATUS_PROPOSAL_SENT
+    elif locked.status not in (Interaction.STATUS_COMPLETED, Interaction.STATUS_CANCELLED):
+        locked.status = (
+            Interaction.STATUS_IN_PROGRESS if locked.participants_accepted_count else Interaction.STATUS_PROPOSAL_SENT
+        )
+
+    fields = ['status']
+    if locked.status == Interaction.STATUS_PROPOSAL_SENT:
+        fields += _reset(locked)
+    _write(locked, fields, interaction)
+
+
+@transaction.atomic
+def start(interaction):
+    """Запрашивает подтверждение завершения; False, если запрос сейчас невозможен."""
+    locked = _lock(interaction.pk)
+    if not locked.can_request_completion():
+        _write(locked, [], interaction)
+        return False
+
+    now = timezone.now()
+    accepted = locked.participant_links.filter(status=InteractionParticipant.STATUS_ACCEPTED)
+    managers = Q(user_id=locked.created_by_id) | Q(user__is_superuser=True)
+    confirmed = accepted.filter(managers).update(
+        completion_status=InteractionParticipant.COMPLETION_CONFIRMED,
+        completion_requested_at=Coalesce('completion_requested_at', Value(now)),
+        completion_responded_at=now,
+    )
+    pending = accepted.exclude(managers).update(
+        completion_status=InteractionParticipant.COMPLETION_PENDING,
+        completion_requested_at=now,
+        completion_responded_at=None,
+    )
+
+    locked.completion_requested_at = now
+    locked.completion_confirmed_count = confirmed
+    locked.completion_pending_count = pending
+    locked.completion_declined_count = 0
+    _write(locked, ['completion_requested_at', *COMPLETION_COUNTER_FIELDS, *_evaluate(locked, now)], interaction)
+    return True
+
+
+@transaction.atomic
+def respond(participation, confirm):
+    """Ответ участника на запрос завершения; False, если ответ сейчас невозможен."""
+    locked = _lock(participation.interaction_id)
+    current = InteractionParticipant.objects.get(pk=participation.pk)
+    if locked.status != Interaction.STATUS_IN_PROGRESS or current.status != InteractionParticipant.STATUS_ACCEPTED:
+        return False
+
+    now = timezone.now()
+    completion_status = (
+        InteractionParticipant.COMPLETION_CONFIRMED if confirm else InteractionParticipant.COMPLETION_DECLINED
+    )
+    requested_at = current.completion_requested_at or now
+    InteractionParticipant.objects.filter(pk=current.pk).update(
+        completion_status=completion_status,
+        completion_requested_at=requested_at,
+        completion_responded_at=now,
+    )
+    delta = InteractionParticipant.counter_delta(
+        (current.status, current.completion_status),
+        (current.status, completion_status),
+    )
+    for field, value in delta.items():
+        setattr(locked, field, getattr(locked, field) + value)
+
+    _write(locked, [*delta, *_evaluate(locked, now)], participation._cached_interaction())
+    participation.status = current.status
+    participation.completion_status = completion_status
+    participation.completion_requested_at = requested_at
+    participation.completion_responded_at = now
+    return True
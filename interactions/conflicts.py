@@ -0,0 +1,221 @@
+"""Проверка занятости участников на время проекта.
+
+Слот проекта — event_date с event_start_time/event_end_time (без времени —
+весь день; окончание раньше начала — переход через полночь), а если даты
+проведения нет — дни start_date..end_date. Проекты без дат не проверяются.
+
+Конфликтом считается:
+
+* принятое участие (status=accepted) в другом незавершённом и не отменённом
+  проекте, слот которого пересекается с проверяемым;
+* день, недоступный по календарю артиста: отмеченный «Занят» в режиме
+  mark_unavailable или не отмеченный как свободный в режиме mark_available.
+
+find_conflicts проверяет сразу N пользователей: участия и календари за окно
+дат читаются двумя-тремя запросами, после чего для каждого пользователя
+строится интервальный индекс (IntervalIndex), и пересечения ищутся
+бинарным поиском.
+"""
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from django.db.models import Q
+
+from performers.availability import BUSY_STATUSES_MARK_UNAVAILABLE, FREE_STATUSES_MARK_AVAILABLE, date_range
+
+from .models import Interaction, InteractionParticipant
+
+KIND_PROJECT = 'project'
+KIND_UNAVAILABLE = 'unavailable'
+
+ACTIVE_PROJECT_STATUSES = (
+    Interaction.STATUS_DRAFT,
+    Interaction.STATUS_PROPOSAL_SENT,
+    Interaction.STATUS_IN_PROGRESS,
+)
+
+
+class Slot:
+    """Полуоткрытый интервал [start, end)."""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def for_event(cls, event_date, start_time=None, end_time=None):
+        start = datetime.combine(event_date, start_time or time.min)
+        if end_time is None:
+            end = datetime.combine(event_date + timedelta(days=1), time.min)
+        else:
+            end = datetime.combine(event_date, end_time)
+            if end <= start:
+                end += timedelta(days=1)
+        return cls(start, end)
+
+    @classmethod
+    def for_days(cls, first_day, last_day=None):
+        last_day = max(last_day or first_day, first_day)
+        return cls(
+            datetime.combine(first_day, time.min),
+            datetime.combine(last_day + timedelta(days=1), time.min),
+        )
+
+    @property
+    def days(self):
+        return date_range(self.start.date(), (self.end - timedelta(microseconds=1)).date())
+
+
+def project_slot(event_date=None, event_start_time=None, event_end_time=None, start_date=None, end_date=None):
+    if event_date:
+        return Slot.for_event(event_date, event_start_time, event_end_time)
+    if start_date:
+        return Slot.for_days(start_date, end_date)
+    return None
+
+
+def interaction_slot(interaction):
+    return project_slot(
+        interaction.event_date,
+        interaction.event_start_time,
+        interaction.event_end_time,
+        interaction.start_date,
+        interaction.end_date,
+    )
+
+
+class Conflict:
+    def __init__(self, kind, slot, interaction_id=None, title=''):
+        self.kind = kind
+        self.slot = slot
+        self.interaction_id = interaction_id
+        self.title = title
+
+    def describe(self, show_title=True):
+        day = self.slot.start.strftime('%d.%m.%Y')
+        if self.kind == KIND_UNAVAILABLE:
+            return f'{day} — занят по календарю'
+        if not show_title:
+            return f'{day} — участие в другом проекте'
+        return f'{day} — участие в проекте «{self.title}»'
+
+    def as_dict(self, visible_interaction_ids=()):
+        """Для проектов вне visible_interaction_ids — только вид и день, без id и времени."""
+        data = {'kind': self.kind, 'date': self.slot.start.date().isoformat()}
+        if self.interaction_id is not None and self.interaction_id in visible_interaction_ids:
+            data.update(
+                interaction=self.interaction_id,
+                start=self.slot.start.isoformat(),
+                end=self.slot.end.isoformat(),
+            )
+        return data
+
+
+class IntervalIndex:
+    """Отсортированные по началу интервалы с префиксным максимумом окончаний.
+
+    Кандидаты на пересечение со [start, end) — интервалы, начавшиеся раньше
+    end (бинарный поиск); перебор назад останавливается, как только
+    максимальное окончание среди оставшихся не доходит до start.
+    """
+
+    def __init__(self, items):
+        items = sorted(items, key=lambda item: item[0].start)
+        self.slots = [slot for slot, _ in items]
+        self.values = [value for _, value in items]
+        self.starts = [slot.start for slot in self.slots]
+        self.max_ends = list(accumulate((slot.end for slot in self.slots), max))
+
+    def overlapping(self, slot):
+        found = []
+        position = bisect_left(self.starts, slot.end) - 1
+        while position >= 0 and self.max_ends[position] > slot.start:
+            if self.slots[position].end > slot.start:
+                found.append(self.values[position])
+            position -= 1
+        found.reverse()
+        return found
+
+
+def _participations(user_ids, slot, exclude_interaction_id):
+    first_day = slot.start.date() - timedelta(days=1)
+    last_day = slot.end.date()
+    dated = Q(interaction__event_date__gte=first_day, interaction__event_date__lte=last_day)
+    ranged = Q(
+        interaction__event_date__isnull=True,
+        interaction__start_date__lte=last_day,
+    ) & (Q(interaction__end_date__gte=first_day) | Q(interaction__end_date__isnull=True, interaction__start_date__gte=first_day))
+    queryset = InteractionParticipant.objects.filter(
+        dated | ranged,
+        user_id__in=user_ids,
+        status=InteractionParticipant.STATUS_ACCEPTED,
+        interaction__status__in=ACTIVE_PROJECT_STATUSES,
+    )
+    if exclude_interaction_id:
+        queryset = queryset.exclude(interaction_id=exclude_interaction_id)
+    return queryset.values_list(
+        'user_id',
+        'interaction_id',
+        'interaction__title',
+        'interaction__event_date',
+        'interaction__event_start_time',
+        'interaction__event_end_time',
+        'interaction__start_date',
+        'interaction__end_date',
+    )
+
+
+def _calendar_entries(user_ids, days):
+    from performers.models import PerformerAvailability, PerformerProfile
+
+    profiles = {
+        performer_id: (user_id, calendar_mode)
+        for performer_id, user_id, calendar_mode in PerformerProfile.objects.filter(
+            user_id__in=user_ids,
+        ).values_list('id', 'user_id', 'calendar_mode')
+    }
+    statuses = {performer_id: {} for performer_id in profiles}
+    if profiles:
+        for performer_id, day, status in PerformerAvailability.objects.filter(
+            performer_id__in=list(profiles),
+            date__gte=days[0],
+            date__lte=days[-1],
+        ).values_list('performer_id', 'date', 'status'):
+            statuses[performer_id][day] = status
+
+    blocked = {}
+    for performer_id, (user_id, calendar_mode) in profiles.items():
+        for day in days:
+            status = statuses[performer_id].get(day)
+            if calendar_mode == 'mark_available':
+                is_busy = status not in FREE_STATUSES_MARK_AVAILABLE
+            else:
+                is_busy = status in BUSY_STATUSES_MARK_UNAVAILABLE
+            if is_busy:
+                blocked.setdefault(user_id, []).append(day)
+    return blocked
+
+
+def find_conflicts(user_ids, slot, exclude_interaction_id=None):
+    """Конфликты слота для каждого из user_ids: {user_id: [Conflict, ...]}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    if slot is None or not user_ids:
+        return {}
+
+    intervals = {}
+    for user_id, interaction_id, title, *dates in _participations(user_ids, slot, exclude_interaction_id):
+        other = project_slot(*dates)
+        if other is not None:
+            intervals.setdefault(user_id, []).append((other, Conflict(KIND_PROJECT, other, interaction_id, title)))
+    for user_id, days in _calendar_entries(user_ids, slot.days).items():
+        for day in days:
+            day_slot = Slot.for_days(day)
+            intervals.setdefault(user_id, []).append((day_slot, Conflict(KIND_UNAVAILABLE, day_slot)))
+
+    conflicts = {}
+    for user_id, items in intervals.items():
+        found = IntervalIndex(items).overlapping(slot)
+        if found:
+            conflicts[user_id] = found
+    return conflicts
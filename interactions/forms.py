@@ -1,9 +1,15 @@
 from django import forms
+from django.db import transaction
+from django.urls import reverse_lazy
+from django.utils import timezone
 
 from agents.models import AgentProfile
 from clients.models import ClientProfile
 from performers.models import PerformerProfile
+from .conflicts import find_conflicts, interaction_slot, project_slot
 from .models import Interaction, InteractionParticipant, ProjectReport
+from .pickers import PICKERS, ParticipantPickerWidget
+from .signals import participant_counters_batched, participants_invited
 
 
 class InteractionForm(forms.ModelForm):
@@ -23,16 +29,19 @@ class InteractionForm(forms.ModelForm):
         queryset=AgentProfile.objects.none(),
         required=False,
         label='Организаторы',
+        widget=ParticipantPickerWidget(reverse_lazy('interactions:participant_search', args=['agents'])),
     )
     venues = forms.ModelMultipleChoiceField(
         queryset=ClientProfile.objects.none(),
         required=False,
         label='Площадки',
+        widget=ParticipantPickerWidget(reverse_lazy('interactions:participant_search', args=['venues'])),
     )
     performers = forms.ModelMultipleChoiceField(
         queryset=PerformerProfile.objects.none(),
         required=False,
         label='Исполнители',
+        widget=ParticipantPickerWidget(reverse_lazy('interactions:participant_search', args=['performers'])),
     )
     interaction_type = forms.TypedChoiceField(
         choices=Interaction.TYPE_CHOICES,
@@ -114,6 +123,8 @@ class InteractionForm(forms.ModelForm):
 
     def __init__(self, *args, user=None, **kwargs):
         self.request_user = user
+        # Конфликты приглашённых исполнителей: не мешают сохранению (см. _check_performer_conflicts)
+        self.conflict_warnings = []
         super().__init__(*args, **kwargs)
 
         self.fields['title'].required = True
@@ -132,17 +143,11 @@ class InteractionForm(forms.ModelForm):
             field.widget.attrs['class'] = f"{existing} {css_class}".strip()
 
 
-        # Configure participant fields
-        self.fields['agents'].queryset = AgentProfile.objects.select_related('user').only('id', 'display_name', 'user')
-        self.fields['venues'].queryset = ClientProfile.objects.select_related('user').only('id', 'company_name', 'user')
-        self.fields['performers'].queryset = PerformerProfile.objects.select_related('user').only(
-            'id',
-            'full_name',
-            'user',
-            'voice_type',
-            'instrument',
-            'performer_type',
-        )
+        # Configure participant fields: варианты подгружаются с participant_search,
+        # queryset нужен только для проверки и подписей выбранных значений
+        for field_name, picker in PICKERS.items():
+            self.fields[field_name].queryset = picker.queryset()
+            self.fields[field_name].label_from_instance = picker.label
 
         self.fields['agents'].label = 'Организаторы'
         self.fields['venues'].label = 'Площадки'
@@ -161,25 +166,17 @@ class InteractionForm(forms.ModelForm):
             'data-participant': 'performers',
         })
 
-        self.fields['agents'].label_from_instance = lambda obj: obj.display_name
-        self.fields['venues'].label_from_instance = lambda obj: obj.company_name
-        def performer_label(obj):
-            if hasattr(obj, 'performer_type') and obj.performer_type == PerformerProfile.PERFORMER_TYPE_INSTRUMENTALIST:
-                if getattr(obj, 'instrument', ''):
-                    return f"{obj.full_name} — {obj.instrument}"
-            if getattr(obj, 'voice_type', ''):
-                return f"{obj.full_name} — {obj.voice_type}"
-            return obj.full_name
-
-        self.fields['performers'].label_from_instance = performer_label
-
         self.fields['agents'].required = False
         self.fields['venues'].required = False
         self.fields['performers'].required = False
 
         # Initial selections
         if self.instance.pk:
-            participant_links = self.instance.participant_links.select_related('user')
+            participant_links = self.instance.participant_links.select_related(
+                'user__agent_profile',
+                'user__client_profile',
+                'user__performer_profile',
+            )
             self.fields['agents'].initial = [link.profile.pk for link in participant_links if link.role == InteractionParticipant.ROLE_AGENT and link.profile]
             self.fields['venues'].initial = [link.profile.pk for link in participant_links if link.role == InteractionParticipant.ROLE_VENUE and link.profile]
             self.fields['performers'].initial = [link.profile.pk for link in participant_links if link.role == InteractionParticipant.ROLE_PERFORMER and link.profile]
@@ -267,9 +264,59 @@ class InteractionForm(forms.ModelForm):
         ensure_self_profile('agents', 'agent_profile')
         ensure_self_profile('venues', 'client_profile')
         ensure_self_profile('performers', 'performer_profile')
+        self._check_performer_conflicts(cleaned)
 
         return cleaned
 
+    def _check_performer_conflicts(self, cleaned):
+        """Исполнители, занятые в другом проекте или по календарю на даты проекта.
+
+        Приглашение занятому исполнителю не запрещается — отказ получит он сам
+        при принятии (participant_decision), а форма лишь предупреждает
+        (conflict_warnings). Ошибкой конфликт становится только у тех, чьё
+        участие уже принято (принявшие приглашение и сам редактор), и только
+        если форма его создаёт: меняет даты проекта или добавляет исполнителя.
+        Конфликт, возникший позже (например, исполнитель закрыл день в
+        календаре), остаётся предупреждением и не мешает править проект.
+        """
+        slot = project_slot(*(cleaned.get(field) for field in (
+            'event_date', 'event_start_time', 'event_end_time', 'start_date', 'end_date',
+        )))
+        performers = cleaned.get('performers')
+        if slot is None or performers is None:
+            return
+        performers = list(performers)
+        conflicts = find_conflicts([performer.user_id for performer in performers], slot, self.instance.pk)
+        if not conflicts:
+            return
+
+        accepted = {getattr(self.request_user, 'pk', None)}
+        current_performers = set()
+        slot_changed = True
+        if self.instance.pk:
+            for user_id, status in self.instance.participant_links.filter(
+                role=InteractionParticipant.ROLE_PERFORMER,
+            ).values_list('user_id', 'status'):
+                current_performers.add(user_id)
+                if status == InteractionParticipant.STATUS_ACCEPTED:
+                    accepted.add(user_id)
+            # clean() вызывается до того, как данные формы попадут в instance
+            previous_slot = interaction_slot(self.instance)
+            slot_changed = previous_slot is None or (previous_slot.start, previous_slot.end) != (slot.start, slot.end)
+        interaction_ids = {conflict.interaction_id for items in conflicts.values() for conflict in items if conflict.interaction_id}
+        visible = set(
+            Interaction.objects.accessible_to(self.request_user).filter(pk__in=interaction_ids).values_list('pk', flat=True)
+        ) if interaction_ids and self.request_user is not None else set()
+
+        for performer in performers:
+            blocking = performer.user_id in accepted and (slot_changed or performer.user_id not in current_performers)
+            for conflict in conflicts.get(performer.user_id, []):
+                text = f'{performer.full_name}: {conflict.describe(show_title=conflict.interaction_id in visible)}'
+                if blocking:
+                    self.add_error('performers', text)
+                else:
+                    self.conflict_warnings.append(text)
+
     # Custom save / participants sync -----------------------------------------
     def save(self, commit=True, created_by=None):
         interaction = super().save(commit=False)
@@ -283,6 +330,12 @@ class InteractionForm(forms.ModelForm):
         return interaction
 
     def _sync_participants(self, interaction: Interaction):
+        """
+        Приводит участников проекта к выбранным в форме: разница множеств
+        (роль, пользователь) применяется одним bulk_create и одним delete(),
+        счётчики проекта обновляются одним UPDATE, а приглашения уходят одной
+        пачкой после коммита (сигнал participants_invited).
+        """
         if not interaction.pk:
             return
 
@@ -291,40 +344,64 @@ class InteractionForm(forms.ModelForm):
             InteractionParticipant.ROLE_VENUE: self.cleaned_data.get('venues') or ClientProfile.objects.none(),
             InteractionParticipant.ROLE_PERFORMER: self.cleaned_data.get('performers') or PerformerProfile.objects.none(),
         }
-
-        for role, profiles in role_map.items():
-            existing_links = {
-                link.user_id: link
-                for link in interaction.participant_links.filter(role=role)
+        selected = {
+            (role, user_id)
+            for role, profiles in role_map.items()
+            for user_id in profiles.values_list('user_id', flat=True)
+            if user_id
+        }
+        request_user_id = getattr(self.request_user, 'pk', None)
+        manager_is_editing = interaction.can_manage(self.request_user)
+
+        with transaction.atomic():
+            # Параллельные сохранения одного проекта выполняются по очереди
+            Interaction.objects.select_for_update().filter(pk=interaction.pk).values_list('pk').first()
+            existing = {
+                (link.role, link.user_id): link
+                for link in interaction.participant_links.only('id', 'role', 'user_id', 'status', 'completion_status')
             }
 
-            new_user_ids = set()
-            for profile in profiles:
-                user = getattr(profile, 'user', None)
-                if not user:
-                    continue
-                new_user_ids.add(user.id)
-                if user.id in existing_links:
-                    continue
-
+            now = timezone.now()
+            to_create = []
+            for role, user_id in sorted(selected - set(existing)):
                 status = InteractionParticipant.STATUS_PENDING
-                if interaction.can_manage(self.request_user) and user == self.request_user:
+                if manager_is_editing and user_id == request_user_id:
                     status = InteractionParticipant.STATUS_ACCEPTED
-
-                interaction.add_participant(
-                    user=user,
+                to_create.append(InteractionParticipant(
+                    interaction=interaction,
+                    user_id=user_id,
                     role=role,
-                    invited_by=self.request_user,
                     status=status,
-                )
-
-            # Remove users that were unselected
-            to_remove = set(existing_links.keys()) - new_user_ids
-            for user_id in to_remove:
-                interaction.participant_links.filter(role=role, user_id=user_id).delete()
+                    invited_by=self.request_user or interaction.created_by,
+                    responded_at=now if status != InteractionParticipant.STATUS_PENDING else None,
+                ))
+            to_remove = [link for key, link in existing.items() if key not in selected]
+
+            delta = {}
+            for link in to_create:
+                for field, value in InteractionParticipant.counter_contribution((link.status, link.completion_status)).items():
+                    delta[field] = delta.get(field, 0) + value
+            for link in to_remove:
+                for field, value in InteractionParticipant.counter_contribution((link.status, link.completion_status)).items():
+                    delta[field] = delta.get(field, 0) - value
+
+            if to_create:
+                InteractionParticipant.objects.bulk_create(to_create)
+            if to_remove:
+                # Обработчики post_delete срабатывают как обычно, только
+                # счётчики учтены в delta и применяются одним UPDATE ниже
+                with participant_counters_batched():
+                    InteractionParticipant.objects.filter(pk__in=[link.pk for link in to_remove]).delete()
+            Interaction.adjust_participant_counters(interaction.pk, delta, interaction)
+
+        if to_create:
+            participants_invited.send(sender=InteractionParticipant, interaction=interaction, participants=to_create)
 
 
 class ProjectReportForm(forms.ModelForm):
+    # Файл, загруженный по частям (interactions/uploads.py), вместо attachment
+    upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = ProjectReport
         fields = ['summary', 'highlights', 'audience', 'feedback', 'media_link', 'attachment']
@@ -336,7 +413,7 @@ class ProjectReportForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for name, field in self.fields.items():
-            if name in ('summary', 'feedback'):
+            if name in ('summary', 'feedback', 'upload'):
                 continue
             field.widget.attrs['class'] = 'form-control'
 
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from interactions.uploads import discard_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершённые загрузки файлов, брошенные дольше указанного времени'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        removed = discard_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {removed}'))
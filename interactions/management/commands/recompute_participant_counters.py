@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from interactions.models import Interaction
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики участников проектов по таблице участников'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects', help='ID проекта (можно несколько)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Interaction.objects.all()
+        if options['projects']:
+            queryset = queryset.filter(pk__in=options['projects'])
+        fixed = Interaction.recompute_participant_counters(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено проектов: {fixed}'))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:28
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_participant_counters(apps, schema_editor):
+    Interaction = apps.get_model('interactions', 'Interaction')
+
+    accepted = Q(participant_links__status='accepted')
+    rows = Interaction.objects.annotate(
+        actual_pending=Count('participant_links', filter=Q(participant_links__status='pending')),
+        actual_accepted=Count('participant_links', filter=accepted),
+        actual_declined=Count('participant_links', filter=Q(participant_links__status='declined')),
+        actual_completion_pending=Count('participant_links', filter=accepted & Q(participant_links__completion_status='pending')),
+        actual_completion_confirmed=Count('participant_links', filter=accepted & Q(participant_links__completion_status='confirmed')),
+        actual_completion_declined=Count('participant_links', filter=accepted & Q(participant_links__completion_status='declined')),
+    ).order_by()
+    interactions = []
+    for interaction in rows:
+        interaction.participants_pending_count = interaction.actual_pending
+        interaction.participants_accepted_count = interaction.actual_accepted
+        interaction.participants_declined_count = interaction.actual_declined
+        interaction.completion_pending_count = interaction.actual_completion_pending
+        interaction.completion_confirmed_count = interaction.actual_completion_confirmed
+        interaction.completion_declined_count = interaction.actual_completion_declined
+        interactions.append(interaction)
+    Interaction.objects.bulk_update(interactions, [
+        'participants_pending_count',
+        'participants_accepted_count',
+        'participants_declined_count',
+        'completion_pending_count',
+        'completion_confirmed_count',
+        'completion_declined_count',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0008_alter_interaction_interaction_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='completion_confirmed_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подтвердили завершение'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='completion_declined_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отклонили завершение'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='completion_pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ожидают подтверждения завершения'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='participants_accepted_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Приняли участие'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='participants_declined_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отказались'),
+        ),
+        migrations.AddField(
+            model_name='interaction',
+            name='participants_pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ожидают ответа'),
+        ),
+        migrations.RunPython(populate_participant_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0009_interaction_participant_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interactionevent',
+            index=models.Index(fields=['interaction', 'created_at', 'id'], name='interaction_interac_2336af_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0010_interactionevent_timeline_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='interaction_created_7f3a53_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['created_at', 'id'], name='interaction_created_dfcca1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['status', 'created_at'], name='interaction_status_b7dbd8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['event_date'], name='interaction_event_d_045928_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interactionparticipant',
+            index=models.Index(fields=['user', 'interaction'], name='interaction_user_id_f972f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interactionparticipant',
+            index=models.Index(fields=['interaction', 'role', 'status'], name='interaction_interac_12bf7f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interactionparticipant',
+            index=models.Index(fields=['interaction', 'status', 'completion_status'], name='interaction_interac_280bff_idx'),
+        ),
+    ]
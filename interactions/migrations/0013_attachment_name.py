@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+def fill_attachment_names(apps, schema_editor):
+    # Имя берётся из загрузки того же проекта: одинаковые файлы разных
+    # проектов хранятся под одним именем
+    UploadSession = apps.get_model('interactions', 'UploadSession')
+    names = {
+        (interaction_id, stored_name): filename
+        for interaction_id, stored_name, filename in UploadSession.objects.filter(
+            completed_at__isnull=False,
+        ).values_list('interaction_id', 'stored_name', 'filename')
+    }
+    if not names:
+        return
+    for model_name in ('ProjectReport', 'InteractionEvent'):
+        model = apps.get_model('interactions', model_name)
+        changed = []
+        for obj in model.objects.filter(attachment__startswith='interactions/files/').only('id', 'interaction_id', 'attachment'):
+            filename = names.get((obj.interaction_id, obj.attachment.name))
+            if filename:
+                obj.attachment_name = filename
+                changed.append(obj)
+        model.objects.bulk_update(changed, ['attachment_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactions', '0012_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interactionevent',
+            name='attachment_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Имя файла'),
+        ),
+        migrations.AddField(
+            model_name='projectreport',
+            name='attachment_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Имя файла'),
+        ),
+        migrations.RunPython(fill_attachment_names, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,58 @@
+import uuid
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, OuterRef, Q, Subquery
 from django.utils import timezone
 
 from agents.models import AgentProfile
 from clients.models import ClientProfile
 from performers.models import PerformerProfile
 
+PARTICIPANT_COUNTER_FIELDS = [
+    'participants_pending_count',
+    'participants_accepted_count',
+    'participants_declined_count',
+    'completion_pending_count',
+    'completion_confirmed_count',
+    'completion_declined_count',
+]
+VIEWER_PARTICIPATION_FIELDS = ('id', 'role', 'status', 'completion_status', 'completion_requested_at')
+
+
+class InteractionQuerySet(models.QuerySet):
+    def accessible_to(self, user):
+        """
+        Проекты, созданные пользователем или с его участием (все — для суперпользователя).
+
+        Вместо OR по двум таблицам с DISTINCT — UNION двух подзапросов, каждый
+        из которых идёт по своему индексу: (created_by, created_at, id) и
+        (user, interaction) у участников.
+        """
+        if user.is_superuser:
+            return self
+        created = Interaction.objects.filter(created_by=user).order_by().values('pk')
+        joined = InteractionParticipant.objects.filter(user=user).order_by().values('interaction_id')
+        return self.filter(pk__in=created.union(joined))
+
+    def with_completion_state(self, user):
+        """
+        Аннотирует флаг активного подтверждения завершения и участие
+        пользователя (viewer_*) — без отдельного запроса на каждый проект.
+        Участие можно получить объектом через Interaction.viewer_participation().
+        """
+        viewer_links = InteractionParticipant.objects.filter(interaction=OuterRef('pk'), user=user).order_by('id')
+        return self.annotate(
+            completion_active=ExpressionWrapper(
+                Q(completion_pending_count__gt=0) | Q(completion_declined_count__gt=0),
+                output_field=BooleanField(),
+            ),
+            **{
+                f'viewer_{field}': Subquery(viewer_links.values(field)[:1])
+                for field in VIEWER_PARTICIPATION_FIELDS
+            },
+        )
+
 
 class Interaction(models.Model):
     TYPE_ONE_TIME = 'one_time'
@@ -136,17 +183,58 @@ class Interaction(models.Model):
     result_notes = models.TextField('Результаты', blank=True)
     completion_requested_at = models.DateTimeField('Запрос завершения', null=True, blank=True)
     completion_completed_at = models.DateTimeField('Дата завершения', null=True, blank=True)
+    # Счётчики участников поддерживаются InteractionParticipant.save() и сигналом
+    # post_delete; completion_* считаются только по принявшим участие.
+    participants_pending_count = models.PositiveIntegerField('Ожидают ответа', default=0, editable=False)
+    participants_accepted_count = models.PositiveIntegerField('Приняли участие', default=0, editable=False)
+    participants_declined_count = models.PositiveIntegerField('Отказались', default=0, editable=False)
+    completion_pending_count = models.PositiveIntegerField('Ожидают подтверждения завершения', default=0, editable=False)
+    completion_confirmed_count = models.PositiveIntegerField('Подтвердили завершение', default=0, editable=False)
+    completion_declined_count = models.PositiveIntegerField('Отклонили завершение', default=0, editable=False)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
 
+    objects = InteractionQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Проект'
         verbose_name_plural = 'Проекты'
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['event_date']),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            # Сигнал notify_project_status_change сравнивает с ним без повторного запроса
+            instance._loaded_status = instance.status
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
+
+    def save(self, *args, **kwargs):
+        # Счётчики меняются F-выражениями в обход экземпляра, поэтому полное
+        # сохранение устаревшего объекта не должно их перезаписывать.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in PARTICIPANT_COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
     @property
     def event_type_label(self):
         mapping = dict(self.EVENT_TYPE_CHOICES)
@@ -171,11 +259,58 @@ class Interaction(models.Model):
                 qs = qs.filter(status=statuses)
         return qs
 
+    @staticmethod
+    def participants_prefetch():
+        """
+        Prefetch участников вместе с пользователями и профилями, которые нужны
+        InteractionParticipant.display_name. Результат кладётся в
+        prefetched_participants и группируется grouped_participants().
+        """
+        return models.Prefetch(
+            'participant_links',
+            queryset=InteractionParticipant.objects.select_related(
+                'user',
+                'user__agent_profile',
+                'user__client_profile',
+                'user__performer_profile',
+            ).order_by('id'),
+            to_attr='prefetched_participants',
+        )
+
+    def grouped_participants(self):
+        """Участники, сгруппированные по роли: {role: [participant, ...]}."""
+        grouped = getattr(self, '_grouped_participants', None)
+        if grouped is not None:
+            return grouped
+        participants = getattr(self, 'prefetched_participants', None)
+        if participants is None:
+            participants = self.participant_links.select_related('user').order_by('id')
+        grouped = {role: [] for role, _ in InteractionParticipant.ROLE_CHOICES}
+        for participant in participants:
+            grouped.setdefault(participant.role, []).append(participant)
+        self._grouped_participants = grouped
+        return grouped
+
     def accepted_participants_by_role(self, role):
         return self.participants_by_role(
             role, statuses=InteractionParticipant.STATUS_ACCEPTED
         )
 
+    def viewer_participation(self, user):
+        """Участие user из аннотаций with_completion_state() (без запроса к БД)."""
+        if getattr(self, 'viewer_id', None) is None:
+            return None
+        loaded = {'interaction_id': self.pk, 'user_id': user.pk}
+        loaded.update((field, getattr(self, f'viewer_{field}')) for field in VIEWER_PARTICIPATION_FIELDS)
+        # from_db ожидает значения в порядке полей модели
+        field_names = [field.attname for field in InteractionParticipant._meta.concrete_fields if field.attname in loaded]
+        participant = InteractionParticipant.from_db(
+            self._state.db, field_names, [loaded[name] for name in field_names]
+        )
+        participant.interaction = self
+        participant.user = user
+        return participant
+
     def get_participant(self, user):
         try:
             return self.participant_links.get(user=user)
@@ -185,8 +320,9 @@ class Interaction(models.Model):
     def add_participant(self, *, user, role, invited_by=None, status=None):
         if status is None:
             status = InteractionParticipant.STATUS_PENDING
-        participant, created = InteractionParticipant.objects.update_or_create(
-            interaction=self,
+        # Через related manager участник получает ссылку на self, и счётчики
+        # обновляются и в этом экземпляре
+        participant, created = self.participant_links.update_or_create(
             user=user,
             role=role,
             defaults={
@@ -203,104 +339,95 @@ class Interaction(models.Model):
     def remove_participant(self, user):
         self.participant_links.filter(user=user).delete()
 
-    def update_status_from_participants(self):
-        participants = self.participant_links.all()
-        if not participants.exists():
-            self.status = self.STATUS_DRAFT
-            self.save(update_fields=['status'])
-            return
+    # --- Participant counters -------------------------------------------------
 
-        pending_exists = participants.filter(status=InteractionParticipant.STATUS_PENDING).exists()
-        accepted_exists = participants.filter(status=InteractionParticipant.STATUS_ACCEPTED).exists()
+    @property
+    def participants_total_count(self):
+        return self.participants_pending_count + self.participants_accepted_count + self.participants_declined_count
 
-        if pending_exists:
-            self.status = self.STATUS_PROPOSAL_SENT
-        else:
-            if self.status not in (self.STATUS_COMPLETED, self.STATUS_CANCELLED):
-                self.status = self.STATUS_IN_PROGRESS if accepted_exists else self.STATUS_PROPOSAL_SENT
-        self.save(update_fields=['status'])
+    @property
+    def completion_outstanding_count(self):
+        """Принявшие участие, которые ещё не подтвердили и не отклонили завершение."""
+        return self.participants_accepted_count - self.completion_confirmed_count - self.completion_declined_count
+
+    @classmethod
+    def adjust_participant_counters(cls, interaction_id, delta, instance=None):
+        """Атомарно применяет приращения счётчиков; instance обновляется в памяти."""
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            return
+        cls.objects.filter(pk=interaction_id).update(**{field: F(field) + value for field, value in delta.items()})
+        if instance is not None:
+            for field, value in delta.items():
+                setattr(instance, field, getattr(instance, field) + value)
+
+    @classmethod
+    def participant_counter_annotations(cls):
+        annotations = {}
+        for status, field in InteractionParticipant.STATUS_COUNTER_FIELDS.items():
+            annotations[f'actual_{field}'] = Count('participant_links', filter=Q(participant_links__status=status))
+        for completion_status, field in InteractionParticipant.COMPLETION_COUNTER_FIELDS.items():
+            annotations[f'actual_{field}'] = Count(
+                'participant_links',
+                filter=Q(
+                    participant_links__status=InteractionParticipant.STATUS_ACCEPTED,
+                    participant_links__completion_status=completion_status,
+                ),
+            )
+        return annotations
+
+    @classmethod
+    def recompute_participant_counters(cls, queryset=None, batch_size=500):
+        """Пересчитывает счётчики одним агрегирующим запросом; возвращает число исправленных проектов."""
+        queryset = cls.objects.all() if queryset is None else queryset
+        rows = queryset.order_by().annotate(**cls.participant_counter_annotations()).only('pk', *PARTICIPANT_COUNTER_FIELDS)
+        changed = []
+        for interaction in rows:
+            dirty = False
+            for field in PARTICIPANT_COUNTER_FIELDS:
+                actual = getattr(interaction, f'actual_{field}')
+                if getattr(interaction, field) != actual:
+                    setattr(interaction, field, actual)
+                    dirty = True
+            if dirty:
+                changed.append(interaction)
+        cls.objects.bulk_update(changed, PARTICIPANT_COUNTER_FIELDS, batch_size=batch_size)
+        return len(changed)
+
+    # --- Completion workflow (см. interactions/completion.py) -----------------
+
+    def update_status_from_participants(self):
+        from . import completion
 
-        if self.status in (self.STATUS_DRAFT, self.STATUS_PROPOSAL_SENT):
-            self.reset_completion_workflow()
+        completion.sync_status_from_participants(self)
 
     def reset_completion_workflow(self):
-        self.completion_requested_at = None
-        if self.status != self.STATUS_COMPLETED:
-            self.completion_completed_at = None
-        self.save(update_fields=['completion_requested_at', 'completion_completed_at'])
-        self.participant_links.update(
-            completion_status=InteractionParticipant.COMPLETION_NOT_REQUESTED,
-            completion_requested_at=None,
-            completion_responded_at=None,
-        )
+        from . import completion
+
+        completion.reset(self)
 
     def can_request_completion(self):
         if self.status != self.STATUS_IN_PROGRESS:
             return False
-        accepted_participants = self.participant_links.filter(status=InteractionParticipant.STATUS_ACCEPTED)
-        return accepted_participants.exists()
+        return self.participants_accepted_count > 0
 
     def start_completion_confirmation(self):
-        if not self.can_request_completion():
-            return False
+        from . import completion
 
-        now = timezone.now()
-        self.completion_requested_at = now
-        self.save(update_fields=['completion_requested_at'])
-
-        accepted_participants = self.participant_links.filter(status=InteractionParticipant.STATUS_ACCEPTED)
-        for link in accepted_participants:
-            if link.user_id == self.created_by_id or getattr(link.user, 'is_superuser', False):
-                link.mark_completion_confirmed()
-                if not link.completion_requested_at:
-                    link.completion_requested_at = now
-                    link.save(update_fields=['completion_requested_at'])
-            else:
-                link.completion_status = InteractionParticipant.COMPLETION_PENDING
-                link.completion_requested_at = now
-                link.completion_responded_at = None
-                link.save(update_fields=['completion_status', 'completion_requested_at', 'completion_responded_at'])
-
-        return True
+        return completion.start(self)
 
     def is_completion_confirmation_active(self):
-        accepted_participants = self.participant_links.filter(status=InteractionParticipant.STATUS_ACCEPTED)
-        return accepted_participants.filter(
-            completion_status__in=[
-                InteractionParticipant.COMPLETION_PENDING,
-                InteractionParticipant.COMPLETION_DECLINED,
-            ]
-        ).exists()
+        return self.completion_pending_count > 0 or self.completion_declined_count > 0
 
     def evaluate_completion_confirmation(self):
-        accepted_participants = self.participant_links.filter(status=InteractionParticipant.STATUS_ACCEPTED)
-        if not accepted_participants.exists():
-            return
+        from . import completion
 
-        if accepted_participants.filter(completion_status=InteractionParticipant.COMPLETION_DECLINED).exists():
-            # At least one participant declined completion, keep project active
-            self.status = self.STATUS_IN_PROGRESS
-            self.save(update_fields=['status'])
-            return
-
-        outstanding = accepted_participants.filter(
-            completion_status__in=[
-                InteractionParticipant.COMPLETION_NOT_REQUESTED,
-                InteractionParticipant.COMPLETION_PENDING,
-            ]
-        )
-        if outstanding.exists():
-            return
-
-        self.status = self.STATUS_COMPLETED
-        self.success_flag = True
-        self.completion_completed_at = timezone.now()
-        self.save(update_fields=['status', 'success_flag', 'completion_completed_at'])
+        completion.evaluate(self)
 
     def cancel_project(self):
-        self.status = self.STATUS_CANCELLED
-        self.reset_completion_workflow()
-        self.save(update_fields=['status', 'completion_requested_at', 'completion_completed_at'])
+        from . import completion
+
+        completion.cancel(self)
 
     def is_creator(self, user):
         return bool(user) and user == self.created_by
@@ -387,14 +514,92 @@ class InteractionParticipant(models.Model):
     completion_requested_at = models.DateTimeField('Запрос подтверждения', null=True, blank=True)
     completion_responded_at = models.DateTimeField('Ответ на подтверждение', null=True, blank=True)
 
+    STATUS_COUNTER_FIELDS = {
+        STATUS_PENDING: 'participants_pending_count',
+        STATUS_ACCEPTED: 'participants_accepted_count',
+        STATUS_DECLINED: 'participants_declined_count',
+    }
+    COMPLETION_COUNTER_FIELDS = {
+        COMPLETION_PENDING: 'completion_pending_count',
+        COMPLETION_CONFIRMED: 'completion_confirmed_count',
+        COMPLETION_DECLINED: 'completion_declined_count',
+    }
+
     class Meta:
         unique_together = ('interaction', 'user', 'role')
         verbose_name = 'Участник проекта'
         verbose_name_plural = 'Участники проекта'
+        indexes = [
+            models.Index(fields=['user', 'interaction']),
+            models.Index(fields=['interaction', 'role', 'status']),
+            models.Index(fields=['interaction', 'status', 'completion_status']),
+        ]
 
     def __str__(self):
         return f"{self.user} — {self.get_role_display()} ({self.get_status_display()})"
 
+    # Counters on Interaction --------------------------------------------------
+    @classmethod
+    def counter_contribution(cls, state):
+        """Вклад участника в счётчики проекта: {поле: 1}."""
+        if state is None:
+            return {}
+        status, completion_status = state
+        contribution = {}
+        if status in cls.STATUS_COUNTER_FIELDS:
+            contribution[cls.STATUS_COUNTER_FIELDS[status]] = 1
+        if status == cls.STATUS_ACCEPTED and completion_status in cls.COMPLETION_COUNTER_FIELDS:
+            contribution[cls.COMPLETION_COUNTER_FIELDS[completion_status]] = 1
+        return contribution
+
+    @classmethod
+    def counter_delta(cls, previous, current):
+        delta = {}
+        for field, value in cls.counter_contribution(current).items():
+            delta[field] = delta.get(field, 0) + value
+        for field, value in cls.counter_contribution(previous).items():
+            delta[field] = delta.get(field, 0) - value
+        return delta
+
+    def _previous_counter_state(self):
+        """Сохранённое в базе состояние участника; строка блокируется до конца транзакции.
+
+        Состояние читается из базы, а не из экземпляра: второй экземпляр той
+        же строки, загруженный раньше первого сохранения, иначе повторно
+        применил бы ту же разницу к счётчикам.
+        """
+        if self._state.adding:
+            return None
+        return (
+            InteractionParticipant.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list('status', 'completion_status')
+            .first()
+        )
+
+    def _cached_interaction(self):
+        return self._state.fields_cache.get('interaction')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'status', 'completion_status'} & set(update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = self._previous_counter_state()
+            super().save(*args, **kwargs)
+            current = (self.status, self.completion_status)
+            if update_fields is not None and previous is not None:
+                # Поля, не попавшие в update_fields, в базе остались прежними
+                current = (
+                    self.status if 'status' in update_fields else previous[0],
+                    self.completion_status if 'completion_status' in update_fields else previous[1],
+                )
+            Interaction.adjust_participant_counters(
+                self.interaction_id,
+                self.counter_delta(previous, current),
+                self._cached_interaction(),
+            )
+
     # Convenience accessors ----------------------------------------------------
     @property
     def profile(self):
@@ -511,6 +716,7 @@ class InteractionEvent(models.Model):
         blank=True,
         null=True,
     )
+    attachment_name = models.CharField('Имя файла', max_length=255, blank=True)
     metadata = models.JSONField('Дополнительные данные', blank=True, null=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
 
@@ -518,6 +724,10 @@ class InteractionEvent(models.Model):
         ordering = ['created_at']
         verbose_name = 'Событие взаимодействия'
         verbose_name_plural = 'События взаимодействий'
+        indexes = [
+            # Лента проекта: курсор по (created_at, id), см. interactions/timeline.py
+            models.Index(fields=['interaction', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.get_event_type_display()} для {self.interaction}"
@@ -547,6 +757,8 @@ class ProjectReport(models.Model):
         blank=True,
         null=True,
     )
+    # Файлы загрузок хранятся под хешем содержимого, исходное имя — здесь
+    attachment_name = models.CharField('Имя файла', max_length=255, blank=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
 
     class Meta:
@@ -557,4 +769,43 @@ class ProjectReport(models.Model):
     def __str__(self):
         return f"Отчёт по {self.interaction.title} от {self.author}"
 
-# Create your models here.
+
+class UploadSession(models.Model):
+    """Возобновляемая загрузка файла проекта по частям (см. interactions/uploads.py)."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    interaction = models.ForeignKey(
+        Interaction,
+        verbose_name='Проект',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name='Загружает',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+    )
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveBigIntegerField('Размер')
+    received = models.PositiveBigIntegerField('Получено байт', default=0)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    stored_name = models.CharField('Файл в хранилище', max_length=255, blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+    completed_at = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка файла'
+        verbose_name_plural = 'Загрузки файлов'
+        indexes = [
+            models.Index(fields=['completed_at', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
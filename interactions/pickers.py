@@ -0,0 +1,125 @@
+"""Поиск профилей для выбора участников проекта.
+
+Форма проекта больше не выводит все профили каталога: виджет
+ParticipantPickerWidget рендерит только выбранные значения (один запрос по
+id), а остальные подгружаются с JSON-эндпоинта participant_search
+постранично.
+
+Поиск идёт по началу имени или специализации (istartswith), страницы
+выбираются курсором по (имя, id) — без COUNT и OFFSET. Обычный B-tree
+istartswith не обслуживает: в PostgreSQL условие компилируется в
+UPPER(col::text) LIKE UPPER(%s), поэтому миграции prefix_search_indexes
+строят индексы по UPPER(col) с varchar_pattern_ops, а в SQLite — по
+col COLLATE NOCASE, которым пользуется регистронезависимый LIKE.
+"""
+from django import forms
+from django.db.models import Q
+
+from agents.models import AgentProfile
+from clients.models import ClientProfile
+from core.pagination import KeysetPaginator
+from performers.models import PerformerProfile
+
+PAGE_SIZE = 20
+MAX_QUERY_LENGTH = 100
+
+
+def _agent_label(profile):
+    if profile.specialization:
+        return f"{profile.display_name} — {profile.specialization}"
+    return profile.display_name
+
+
+def _venue_label(profile):
+    if profile.venue_type:
+        return f"{profile.company_name} — {profile.venue_type}"
+    return profile.company_name
+
+
+def _performer_label(profile):
+    if profile.performer_type == PerformerProfile.PERFORMER_TYPE_INSTRUMENTALIST and profile.instrument:
+        return f"{profile.full_name} — {profile.instrument}"
+    if profile.voice_type:
+        return f"{profile.full_name} — {profile.voice_type}"
+    return profile.full_name
+
+
+class ParticipantPicker:
+    def __init__(self, model, name_field, search_fields, label, only):
+        self.model = model
+        self.name_field = name_field
+        self.search_fields = search_fields
+        self.label = label
+        self.only = only
+
+    def queryset(self):
+        return self.model.objects.only('id', 'user', *self.only).order_by(self.name_field, 'id')
+
+    def filter(self, query=''):
+        queryset = self.queryset()
+        query = query.strip()[:MAX_QUERY_LENGTH]
+        if query:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{f'{field}__istartswith': query})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def search(self, query='', cursor=None, per_page=PAGE_SIZE):
+        return KeysetPaginator(self.filter(query), [self.name_field, 'id'], per_page).get_page(cursor)
+
+    def serialize(self, profile):
+        return {'id': profile.pk, 'label': self.label(profile)}
+
+
+PICKERS = {
+    'agents': ParticipantPicker(
+        AgentProfile,
+        name_field='display_name',
+        search_fields=('display_name', 'specialization'),
+        label=_agent_label,
+        only=('display_name', 'specialization'),
+    ),
+    'venues': ParticipantPicker(
+        ClientProfile,
+        name_field='company_name',
+        search_fields=('company_name', 'venue_type'),
+        label=_venue_label,
+        only=('company_name', 'venue_type'),
+    ),
+    'performers': ParticipantPicker(
+        PerformerProfile,
+        name_field='full_name',
+        search_fields=('full_name', 'voice_type', 'instrument'),
+        label=_performer_label,
+        only=('full_name', 'performer_type', 'voice_type', 'instrument'),
+    ),
+}
+
+
+class ParticipantPickerWidget(forms.SelectMultiple):
+    """SelectMultiple, в котором есть только <option> выбранных значений.
+
+    Подписи выбранных профилей загружаются одним запросом по id; список
+    вариантов для добавления виджет получает с search_url.
+    """
+
+    def __init__(self, search_url='', attrs=None):
+        super().__init__(attrs)
+        self.search_url = search_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        if self.search_url:
+            context['widget']['attrs']['data-search-url'] = str(self.search_url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [item for item in value if str(item).isdigit()]
+        if not selected:
+            return []
+        groups = []
+        for index, obj in enumerate(self.choices.queryset.filter(pk__in=selected)):
+            option_value, label = self.choices.choice(obj)
+            groups.append((None, [self.create_option(name, option_value, label, True, index, attrs=attrs)], index))
+        return groups
@@ -0,0 +1,44 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Interaction, InteractionParticipant
+
+# Отправляется после массового создания участников (bulk_create не вызывает
+# post_save): kwargs interaction, participants
+participants_invited = Signal()
+
+_state = threading.local()
+
+
+@contextmanager
+def participant_counters_batched():
+    """Внутри блока post_delete не меняет счётчики проекта.
+
+    Для массового удаления участников: вызывающий код сам применяет разницу
+    счётчиков одним UPDATE (Interaction.adjust_participant_counters).
+    """
+    previous = getattr(_state, 'counters_batched', False)
+    _state.counters_batched = True
+    try:
+        yield
+    finally:
+        _state.counters_batched = previous
+
+
+@receiver(post_delete, sender=InteractionParticipant)
+def decrement_participant_counters(sender, instance, **kwargs):
+    """Вычитает удалённого участника из счётчиков проекта."""
+    if getattr(_state, 'counters_batched', False):
+        return
+    # При каскадном удалении проекта счётчики удаляются вместе с ним
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is Interaction:
+        return
+    Interaction.adjust_participant_counters(
+        instance.interaction_id,
+        InteractionParticipant.counter_delta((instance.status, instance.completion_status), None),
+        instance._cached_interaction(),
+    )
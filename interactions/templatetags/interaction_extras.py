@@ -6,11 +6,13 @@ register = template.Library()
 @register.filter
 def participants_by_role(interaction, role):
     """
-    Template filter that returns the queryset of participants for a given role.
+    Template filter that returns the participants for a given role.
+    Uses the grouped participants (one query per project, none when
+    Interaction.participants_prefetch() was applied).
     Usage: {{ interaction|participants_by_role:'agent' }}
     """
-    if hasattr(interaction, 'participants_by_role'):
-        return interaction.participants_by_role(role)
+    if hasattr(interaction, 'grouped_participants'):
+        return interaction.grouped_participants().get(role, [])
     return []
 
 
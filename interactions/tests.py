@@ -1,3 +1,945 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from datetime import date, time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import LegalAcceptance
+from agents.models import AgentProfile
+from clients.models import ClientProfile
+from core.legal import LEGAL_DOCUMENTS, REQUIRED_LEGAL_DOCUMENT_SLUGS
+from core.pagination import encode_cursor
+from performers.models import PerformerAvailability, PerformerProfile
+from notifications.models import Notification
+from . import completion, conflicts
+from .forms import InteractionForm
+from .pickers import PICKERS
+from .models import Interaction, InteractionEvent, InteractionParticipant, ProjectReport, UploadSession
+
+
+def create_user(username):
+    user = get_user_model().objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='test-pass',
+    )
+    for slug in REQUIRED_LEGAL_DOCUMENT_SLUGS:
+        LegalAcceptance.objects.create(
+            user=user,
+            document_slug=slug,
+            document_title=LEGAL_DOCUMENTS[slug]['title'],
+            document_version=LEGAL_DOCUMENTS[slug]['version'],
+        )
+    return user
+
+
+def create_interaction(created_by, title='Проект', **fields):
+    return Interaction.objects.create(
+        title=title,
+        description='Описание',
+        created_by=created_by,
+        interaction_type=Interaction.TYPE_ONE_TIME,
+        **fields,
+    )
+
+
+class InteractionListQueryTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.client.force_login(self.owner)
+        self.url = reverse('interactions:list')
+
+    def _add_projects(self, count, start=0):
+        for index in range(start, start + count):
+            interaction = create_interaction(self.owner, title=f'Проект {index}')
+            agent = create_user(f'agent{index}')
+            AgentProfile.objects.create(user=agent, display_name=f'Агент {index}')
+            venue = create_user(f'venue{index}')
+            ClientProfile.objects.create(user=venue, company_name=f'Зал {index}')
+            performer = create_user(f'performer{index}')
+            PerformerProfile.objects.create(user=performer, full_name=f'Артист {index}', voice_type='Тенор', performer_type='vocalist')
+            InteractionParticipant.objects.create(interaction=interaction, user=agent, role=InteractionParticipant.ROLE_AGENT)
+            InteractionParticipant.objects.create(interaction=interaction, user=venue, role=InteractionParticipant.ROLE_VENUE)
+            InteractionParticipant.objects.create(
+                interaction=interaction,
+                user=performer,
+                role=InteractionParticipant.ROLE_PERFORMER,
+                status=InteractionParticipant.STATUS_DECLINED,
+            )
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_list_renders_in_constant_number_of_queries(self):
+        self._add_projects(2)
+        baseline, _ = self._count_queries()
+
+        self._add_projects(10, start=2)
+        queries, response = self._count_queries()
+
+        self.assertEqual(queries, baseline)
+        self.assertContains(response, 'Агент 11')
+        self.assertContains(response, 'Зал 11')
+        self.assertContains(response, 'Артист 11 — Тенор (отклонено)')
+
+    def test_list_is_paginated_and_filtered(self):
+        for index in range(25):
+            create_interaction(
+                self.owner,
+                title=f'Серия {index:02d}',
+                status=Interaction.STATUS_IN_PROGRESS if index % 5 == 0 else Interaction.STATUS_DRAFT,
+                event_date=date(2031, 1, index + 1),
+            )
+
+        first = self.client.get(self.url)
+        self.assertContains(first, 'Серия 24')
+        self.assertNotContains(first, 'Серия 04')
+        next_cursor = first.context['page_obj'].next_cursor
+        second = self.client.get(self.url, {'cursor': next_cursor})
+        self.assertEqual(len(second.context['project_entries']), 5)
+        self.assertContains(second, 'Серия 00')
+
+        tampered = self.client.get(self.url, {'cursor': encode_cursor(['not-a-date', 'x'])})
+        self.assertEqual(tampered.status_code, 200)
+        self.assertContains(tampered, 'Серия 24')
+
+        filtered = self.client.get(self.url, {'status': Interaction.STATUS_IN_PROGRESS, 'date_from': '2031-01-06'})
+        titles = [entry['interaction'].title for entry in filtered.context['project_entries']]
+        self.assertEqual(titles, ['Серия 20', 'Серия 15', 'Серия 10', 'Серия 05'])
+
+    def test_access_query_unions_created_and_joined_projects(self):
+        other = create_user('other')
+        own = create_interaction(self.owner, title='Свой')
+        joined = create_interaction(other, title='Чужой с участием')
+        create_interaction(other, title='Чужой')
+        for role in (InteractionParticipant.ROLE_AGENT, InteractionParticipant.ROLE_VENUE):
+            InteractionParticipant.objects.create(interaction=joined, user=self.owner, role=role)
+        InteractionParticipant.objects.create(interaction=own, user=self.owner, role=InteractionParticipant.ROLE_AGENT)
+
+        accessible = Interaction.objects.accessible_to(self.owner)
+        self.assertIn('UNION', str(accessible.query))
+        self.assertNotIn('DISTINCT', str(accessible.query))
+        self.assertEqual(sorted(interaction.title for interaction in accessible), ['Свой', 'Чужой с участием'])
+
+    def test_grouped_participants_use_prefetch(self):
+        self._add_projects(1)
+        interaction = Interaction.objects.prefetch_related(Interaction.participants_prefetch()).get()
+
+        with self.assertNumQueries(0):
+            grouped = interaction.grouped_participants()
+            names = [participant.display_name for participants in grouped.values() for participant in participants]
+
+        self.assertEqual(names, ['Агент 0', 'Зал 0', 'Артист 0 — Тенор'])
+
+
+class ParticipantCountersTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.interaction = create_interaction(self.owner)
+        self.users = [create_user(f'user{index}') for index in range(3)]
+
+    def assertCountersMatchTable(self):
+        stored = Interaction.objects.get(pk=self.interaction.pk)
+        self.assertEqual(Interaction.recompute_participant_counters(Interaction.objects.filter(pk=stored.pk)), 0)
+        return stored
+
+    def test_counters_follow_participant_workflow(self):
+        links = [
+            self.interaction.add_participant(user=user, role=InteractionParticipant.ROLE_PERFORMER)
+            for user in self.users
+        ]
+        self.assertEqual(self.interaction.participants_pending_count, 3)
+
+        links[0].mark_accepted()
+        links[1].mark_accepted()
+        links[2].mark_declined()
+        self.interaction.update_status_from_participants()
+        self.assertEqual(self.interaction.status, Interaction.STATUS_IN_PROGRESS)
+        self.assertTrue(self.interaction.can_request_completion())
+
+        self.assertTrue(self.interaction.start_completion_confirmation())
+        self.assertEqual(self.interaction.completion_pending_count, 2)
+        self.assertTrue(self.interaction.is_completion_confirmation_active())
+
+        for link, expected_status in zip(links, (Interaction.STATUS_IN_PROGRESS, Interaction.STATUS_COMPLETED)):
+            participation = InteractionParticipant.objects.select_related('interaction').get(pk=link.pk)
+            participation.mark_completion_confirmed()
+            participation.interaction.evaluate_completion_confirmation()
+            self.assertEqual(participation.interaction.status, expected_status)
+
+        stored = self.assertCountersMatchTable()
+        self.assertEqual(
+            (stored.participants_accepted_count, stored.participants_declined_count, stored.completion_confirmed_count),
+            (2, 1, 2),
+        )
+
+    def test_status_evaluation_reads_counters_without_queries(self):
+        link = self.interaction.add_participant(user=self.users[0], role=InteractionParticipant.ROLE_AGENT)
+        link.mark_accepted()
+        interaction = Interaction.objects.get(pk=self.interaction.pk)
+
+        with self.assertNumQueries(0):
+            interaction.can_request_completion()
+            interaction.is_completion_confirmation_active()
+
+    def test_deletes_and_resets_keep_counters_consistent(self):
+        for user in self.users:
+            self.interaction.add_participant(
+                user=user,
+                role=InteractionParticipant.ROLE_VENUE,
+                status=InteractionParticipant.STATUS_ACCEPTED,
+            )
+        self.interaction.status = Interaction.STATUS_IN_PROGRESS
+        self.interaction.save()
+        self.interaction.start_completion_confirmation()
+
+        self.interaction.participant_links.filter(user=self.users[0]).delete()
+        self.interaction.remove_participant(self.users[1])
+        self.assertEqual(self.interaction.participants_accepted_count, 1)
+
+        self.interaction.cancel_project()
+        self.assertEqual(self.interaction.completion_pending_count, 0)
+        self.assertCountersMatchTable()
+
+    def test_full_save_of_stale_instance_keeps_counters(self):
+        stale = Interaction.objects.get(pk=self.interaction.pk)
+        self.interaction.add_participant(user=self.users[0], role=InteractionParticipant.ROLE_AGENT)
+
+        stale.title = 'Новое название'
+        stale.save()
+
+        stored = self.assertCountersMatchTable()
+        self.assertEqual(stored.participants_pending_count, 1)
+        self.assertEqual(stored.title, 'Новое название')
+
+    def test_saving_stale_participant_twice_applies_transition_once(self):
+        link = self.interaction.add_participant(user=self.users[0], role=InteractionParticipant.ROLE_PERFORMER)
+        first = InteractionParticipant.objects.get(pk=link.pk)
+        second = InteractionParticipant.objects.get(pk=link.pk)
+
+        first.mark_accepted()
+        second.mark_accepted()
+
+        stored = self.assertCountersMatchTable()
+        self.assertEqual((stored.participants_pending_count, stored.participants_accepted_count), (0, 1))
+
+    def test_repair_command_recomputes_drifted_counters(self):
+        self.interaction.add_participant(user=self.users[0], role=InteractionParticipant.ROLE_AGENT)
+        Interaction.objects.filter(pk=self.interaction.pk).update(participants_pending_count=7, completion_declined_count=2)
+
+        output = StringIO()
+        call_command('recompute_participant_counters', stdout=output)
+
+        self.assertIn('1', output.getvalue())
+        stored = self.assertCountersMatchTable()
+        self.assertEqual((stored.participants_pending_count, stored.completion_declined_count), (1, 0))
+
+
+class MyProjectsCompletionStateTests(TestCase):
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.client.force_login(self.viewer)
+        self.url = reverse('interactions:my_projects')
+
+    def _add_projects(self, count, start=0):
+        projects = []
+        for index in range(start, start + count):
+            owner = create_user(f'owner{index}')
+            interaction = create_interaction(owner, title=f'Проект {index}', status=Interaction.STATUS_IN_PROGRESS)
+            interaction.add_participant(
+                user=self.viewer,
+                role=InteractionParticipant.ROLE_PERFORMER,
+                status=InteractionParticipant.STATUS_ACCEPTED,
+            )
+            projects.append(interaction)
+        return projects
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_page_runs_constant_number_of_queries(self):
+        self._add_projects(2)
+        baseline, _ = self._count_queries()
+
+        self._add_projects(8, start=2)
+        queries, response = self._count_queries()
+
+        self.assertEqual(queries, baseline)
+        self.assertEqual(len(response.context['projects']), 10)
+
+    def test_annotations_describe_viewer_participation(self):
+        requested, idle = self._add_projects(2)
+        requested.start_completion_confirmation()
+        foreign = create_interaction(create_user('stranger'), title='Чужой проект')
+
+        interactions = {
+            interaction.pk: interaction
+            for interaction in Interaction.objects.accessible_to(self.viewer).with_completion_state(self.viewer)
+        }
+
+        self.assertNotIn(foreign.pk, interactions)
+        self.assertTrue(interactions[requested.pk].completion_active)
+        self.assertFalse(interactions[idle.pk].completion_active)
+        with self.assertNumQueries(0):
+            participation = interactions[requested.pk].viewer_participation(self.viewer)
+            self.assertEqual(participation.status, InteractionParticipant.STATUS_ACCEPTED)
+            self.assertEqual(participation.completion_status, InteractionParticipant.COMPLETION_PENDING)
+        self.assertEqual(participation.pk, requested.participant_links.get(user=self.viewer).pk)
+
+        response = self.client.get(self.url)
+        self.assertContains(
+            response,
+            reverse('interactions:participant_completion_decision', args=[participation.pk, 'confirm']),
+        )
+
+
+class CompletionWorkflowTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.interaction = create_interaction(self.owner, status=Interaction.STATUS_IN_PROGRESS)
+
+    def _add_accepted(self, count, start=0):
+        return [
+            self.interaction.add_participant(
+                user=create_user(f'member{index}'),
+                role=InteractionParticipant.ROLE_PERFORMER,
+                status=InteractionParticipant.STATUS_ACCEPTED,
+            )
+            for index in range(start, start + count)
+        ]
+
+    def _start_queries(self, interaction):
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(completion.start(interaction))
+        return len(context.captured_queries)
+
+    def test_start_runs_constant_number_of_queries(self):
+        self._add_accepted(2)
+        small = self._start_queries(self.interaction)
+
+        other = create_interaction(self.owner, title='Большой', status=Interaction.STATUS_IN_PROGRESS)
+        for index in range(2, 12):
+            other.add_participant(
+                user=create_user(f'member{index}'),
+                role=InteractionParticipant.ROLE_VENUE,
+                status=InteractionParticipant.STATUS_ACCEPTED,
+            )
+        self.assertEqual(self._start_queries(other), small)
+        self.assertEqual(other.completion_pending_count, 10)
+
+    def test_creator_confirms_automatically_and_responses_complete_project(self):
+        owner_link = self.interaction.add_participant(
+            user=self.owner,
+            role=InteractionParticipant.ROLE_AGENT,
+            status=InteractionParticipant.STATUS_ACCEPTED,
+        )
+        first, second = self._add_accepted(2)
+
+        completion.start(self.interaction)
+        owner_link.refresh_from_db()
+        self.assertEqual(owner_link.completion_status, InteractionParticipant.COMPLETION_CONFIRMED)
+        self.assertEqual((self.interaction.completion_confirmed_count, self.interaction.completion_pending_count), (1, 2))
+
+        self.assertTrue(completion.respond(first, confirm=False))
+        self.interaction.refresh_from_db()
+        self.assertEqual(self.interaction.status, Interaction.STATUS_IN_PROGRESS)
+        self.assertTrue(self.interaction.is_completion_confirmation_active())
+
+        completion.respond(first, confirm=True)
+        completion.respond(second, confirm=True)
+        self.interaction.refresh_from_db()
+        self.assertEqual(self.interaction.status, Interaction.STATUS_COMPLETED)
+        self.assertTrue(self.interaction.success_flag)
+        self.assertEqual(Interaction.recompute_participant_counters(), 0)
+
+        # После завершения ответы больше не принимаются
+        self.assertFalse(completion.respond(first, confirm=False))
+
+    def test_cancel_writes_project_once_and_resets_participants(self):
+        links = self._add_accepted(3)
+        completion.start(self.interaction)
+        interaction = Interaction.objects.get(pk=self.interaction.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(6):
+                # SAVEPOINT, SELECT ... FOR UPDATE, UPDATE участников,
+                # выборка участников для уведомления, UPDATE проекта, RELEASE
+                completion.cancel(interaction)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(interaction.status, Interaction.STATUS_CANCELLED)
+        self.assertFalse(
+            InteractionParticipant.objects.filter(pk__in=[link.pk for link in links])
+            .exclude(completion_status=InteractionParticipant.COMPLETION_NOT_REQUESTED)
+            .exists()
+        )
+        self.assertEqual(Interaction.recompute_participant_counters(), 0)
+
+    def test_completion_views_use_service(self):
+        (link,) = self._add_accepted(1)
+        self.client.force_login(self.owner)
+        self.client.post(reverse('interactions:complete_project', args=[self.interaction.pk]))
+
+        self.client.force_login(link.user)
+        self.client.post(reverse('interactions:participant_completion_decision', args=[link.pk, 'confirm']))
+
+        self.interaction.refresh_from_db()
+        self.assertEqual(self.interaction.status, Interaction.STATUS_COMPLETED)
+
+
+@override_settings(NOTIFICATION_EMAILS_ASYNC=False)
+class ParticipantSyncTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(username=f'singer{index}', email=f'singer{index}@example.com', is_email_verified=True)
+            for index in range(45)
+        ])
+        self.performers = PerformerProfile.objects.bulk_create([
+            PerformerProfile(user=user, full_name=f'Артист {index}')
+            for index, user in enumerate(users)
+        ])
+
+    def _save_form(self, performers, instance=None):
+        form = InteractionForm(
+            data={
+                'title': 'Кастинг',
+                'description': 'Большой кастинг',
+                'interaction_type': Interaction.TYPE_CASTING,
+                'status': Interaction.STATUS_DRAFT,
+                'budget_currency': Interaction.CURRENCY_RUB,
+                'performers': [performer.pk for performer in performers],
+            },
+            instance=instance,
+            user=self.owner,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save(created_by=self.owner)
+
+    def _queries_for(self, performers, instance=None):
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks() as callbacks:
+                interaction = self._save_form(performers, instance)
+        return len(context.captured_queries), callbacks, interaction
+
+    def test_sync_writes_in_bulk_and_batches_invitations(self):
+        self._save_form([])  # прогрев: профили владельца кешируются на объекте пользователя
+        small, _, _ = self._queries_for(self.performers[:2])
+        large, callbacks, interaction = self._queries_for(self.performers[2:42])
+
+        self.assertEqual(large, small)
+        self.assertEqual(interaction.participants_pending_count, 40)
+        self.assertEqual(interaction.status, Interaction.STATUS_PROPOSAL_SENT)
+        invitations = [callback for callback in callbacks if callback.__qualname__.startswith('_queue_project_invitations')]
+        self.assertEqual(len(invitations), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        invitations[0]()
+        self.assertEqual(len(mail.outbox), 40)
+        self.assertEqual(
+            Notification.objects.filter(
+                notification_type=Notification.NOTIFICATION_TYPE_PROJECT_INVITATION,
+                related_object_id=interaction.pk,
+            ).count(),
+            40,
+        )
+
+    @override_settings(NOTIFICATION_EMAILS_ASYNC=True)
+    def test_invitations_are_sent_outside_the_request(self):
+        with mock.patch('notifications.utils._get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                interaction = self._save_form(self.performers[:3])
+
+        self.assertEqual(len(mail.outbox), 0)
+        submit = get_executor.return_value.submit
+        submit.assert_called_once()
+        task, interaction_id, participant_ids = submit.call_args.args
+        self.assertEqual(interaction_id, interaction.pk)
+        self.assertEqual(set(participant_ids), set(interaction.participant_links.values_list('pk', flat=True)))
+
+        # Фоновый поток закрывает свои соединения; соединение теста не трогаем
+        with mock.patch('notifications.utils.connections'):
+            task(interaction_id, participant_ids)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_resync_applies_only_the_difference(self):
+        interaction = self._save_form(self.performers[:10])
+        kept = set(interaction.participant_links.filter(user__performer_profile__in=self.performers[5:10]).values_list('pk', flat=True))
+
+        interaction = self._save_form(self.performers[5:15], instance=Interaction.objects.get(pk=interaction.pk))
+
+        links = interaction.participant_links.all()
+        self.assertEqual(
+            {link.user_id for link in links},
+            {performer.user_id for performer in self.performers[5:15]},
+        )
+        self.assertTrue(kept <= {link.pk for link in links})
+        self.assertEqual(interaction.participants_pending_count, 10)
+        self.assertEqual(Interaction.recompute_participant_counters(), 0)
+
+
+class ParticipantPickerTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.owner.is_email_verified = True
+        self.owner.save(update_fields=['is_email_verified'])
+        self.client.force_login(self.owner)
+        self.catalog = self._add_performers(30)
+
+    def _add_performers(self, count, start=0):
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(username=f'artist{index}', email=f'artist{index}@example.com')
+            for index in range(start, start + count)
+        ])
+        return PerformerProfile.objects.bulk_create([
+            PerformerProfile(
+                user=user,
+                full_name=f'Артист {index:03d}',
+                performer_type=PerformerProfile.PERFORMER_TYPE_VOCALIST,
+                voice_type='Баритон' if index % 2 else 'Тенор',
+            )
+            for index, user in enumerate(users, start=start)
+        ])
+
+    def _search(self, role, **params):
+        response = self.client.get(reverse('interactions:participant_search', args=[role]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_pages_through_matches_by_cursor(self):
+        first = self._search('performers', q='Артист')
+        self.assertEqual(len(first['results']), 20)
+        self.assertEqual(first['results'][0], {'id': self.catalog[0].pk, 'label': 'Артист 000 — Тенор'})
+
+        second = self._search('performers', q='Артист', cursor=first['next'])
+        self.assertEqual(len(second['results']), 10)
+        self.assertIsNone(second['next'])
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, [performer.pk for performer in self.catalog])
+
+        by_voice = self._search('performers', q='Барит')
+        self.assertEqual({item['id'] for item in by_voice['results']}, {p.pk for p in self.catalog[1::2]})
+
+    def test_tampered_cursor_returns_first_page(self):
+        data = self._search('performers', q='Артист', cursor=encode_cursor([['x'], 'y']))
+        self.assertEqual(data['results'][0]['id'], self.catalog[0].pk)
+
+    @skipUnless(connection.vendor == 'sqlite', 'План запроса проверяется для SQLite')
+    def test_prefix_search_uses_indexes(self):
+        for role, picker in PICKERS.items():
+            plan = picker.filter('ab').explain()
+            for field in picker.search_fields:
+                self.assertIn(f'{picker.model._meta.db_table}_{field}_prefix', plan, role)
+
+    def test_unknown_role_is_not_found(self):
+        response = self.client.get(reverse('interactions:participant_search', args=['managers']))
+        self.assertEqual(response.status_code, 404)
+
+    def _performer_options(self, response):
+        html = response.content.decode()
+        start = html.index('<select name="performers"')
+        return html[start:html.index('</select>', start)].count('<option')
+
+    def test_form_renders_only_selected_options(self):
+        interaction = create_interaction(self.owner)
+        for performer in self.catalog[:2]:
+            InteractionParticipant.objects.create(
+                interaction=interaction,
+                user=performer.user,
+                role=InteractionParticipant.ROLE_PERFORMER,
+            )
+        url = reverse('interactions:update', args=[interaction.pk])
+
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url)
+        self.assertEqual(self._performer_options(response), 2)
+        self.assertContains(response, 'data-search-url="/interactions/participants/performers/search/"')
+
+        self._add_performers(200, start=30)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(self._performer_options(response), 2)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class InteractionTimelineTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.client.force_login(self.owner)
+        self.interaction = create_interaction(self.owner)
+        self.events = self._add_events(25)
+        self.url = reverse('interactions:timeline', args=[self.interaction.pk])
+
+    def _add_events(self, count, start=0):
+        return [
+            InteractionEvent.objects.create(interaction=self.interaction, actor=self.owner, text=f'Событие {index}')
+            for index in range(start, start + count)
+        ]
+
+    def _get(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_go_from_newest_to_oldest(self):
+        first = self._get()
+        self.assertEqual([event['id'] for event in first['events']], [event.id for event in self.events[:4:-1]])
+        self.assertIsNotNone(first['latest'])
+
+        second = self._get(cursor=first['next'])
+        self.assertEqual([event['id'] for event in second['events']], [event.id for event in self.events[4::-1]])
+        self.assertIsNone(second['next'])
+        self.assertIsNone(second['latest'])
+
+    def test_since_returns_only_newer_events(self):
+        latest = self._get()['latest']
+        self.assertEqual(self._get(since=latest), {'events': [], 'latest': latest, 'has_more': False})
+
+        new_events = self._add_events(2, start=25)
+        data = self._get(since=latest)
+        self.assertEqual([event['id'] for event in data['events']], [event.id for event in new_events])
+        self.assertEqual(data['events'][0]['text'], 'Событие 25')
+        self.assertEqual(self._get(since=data['latest'])['events'], [])
+
+    def test_invalid_since_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'broken'}).status_code, 400)
+        tampered = encode_cursor(['not-a-date', 'x'])
+        self.assertEqual(self.client.get(self.url, {'since': tampered}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': tampered}).status_code, 200)
+
+    def test_timeline_is_limited_to_project_members(self):
+        self.client.force_login(create_user('stranger'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_detail_page_renders_latest_page_only(self):
+        response = self.client.get(reverse('interactions:detail', args=[self.interaction.pk]))
+        self.assertContains(response, 'class="timeline-item" data-event-id=', count=20)
+        self.assertContains(response, 'Событие 24')
+        self.assertNotContains(response, 'Событие 4<')
+
+
+class BookingConflictTests(TestCase):
+    EVENT_DAY = date(2031, 5, 20)
+
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.singer = create_user('singer')
+        self.profile = PerformerProfile.objects.create(user=self.singer, full_name='Певица')
+        self.booked = create_interaction(
+            self.owner,
+            title='Гала-концерт',
+            status=Interaction.STATUS_IN_PROGRESS,
+            event_date=self.EVENT_DAY,
+            event_start_time=time(18, 0),
+            event_end_time=time(21, 0),
+        )
+        InteractionParticipant.objects.create(
+            interaction=self.booked,
+            user=self.singer,
+            role=InteractionParticipant.ROLE_PERFORMER,
+            status=InteractionParticipant.STATUS_ACCEPTED,
+        )
+
+    def _conflicts(self, start, end, day=None):
+        slot = conflicts.Slot.for_event(day or self.EVENT_DAY, start, end)
+        return conflicts.find_conflicts([self.singer.pk], slot).get(self.singer.pk, [])
+
+    def test_overlapping_accepted_participation_conflicts(self):
+        found = self._conflicts(time(20, 0), time(23, 0))
+        self.assertEqual([(c.kind, c.interaction_id) for c in found], [(conflicts.KIND_PROJECT, self.booked.pk)])
+        self.assertEqual(self._conflicts(time(21, 0), time(23, 0)), [])
+        self.assertEqual(len(self._conflicts(None, None)), 1)
+
+        self.booked.status = Interaction.STATUS_CANCELLED
+        self.booked.save(update_fields=['status'])
+        self.assertEqual(self._conflicts(time(20, 0), time(23, 0)), [])
+
+    def test_calendar_days_conflict_by_mode(self):
+        other_day = date(2031, 6, 1)
+        PerformerAvailability.objects.create(performer=self.profile, date=other_day, status='unavailable')
+        self.assertEqual([c.kind for c in self._conflicts(None, None, other_day)], [conflicts.KIND_UNAVAILABLE])
+
+        self.profile.calendar_mode = 'mark_available'
+        self.profile.save(update_fields=['calendar_mode'])
+        self.assertEqual(len(self._conflicts(None, None, date(2031, 6, 2))), 1)
+        PerformerAvailability.objects.create(performer=self.profile, date=date(2031, 6, 2), status='available')
+        self.assertEqual(self._conflicts(None, None, date(2031, 6, 2)), [])
+
+    def test_interval_index_finds_all_overlaps(self):
+        slots = [
+            conflicts.Slot.for_days(date(2031, 1, 1), date(2031, 1, 31)),
+            conflicts.Slot.for_event(date(2031, 1, 10), time(10, 0), time(11, 0)),
+            conflicts.Slot.for_event(date(2031, 1, 10), time(23, 0), time(1, 0)),
+            conflicts.Slot.for_days(date(2031, 2, 1)),
+        ]
+        index = conflicts.IntervalIndex([(slot, position) for position, slot in enumerate(slots)])
+        self.assertEqual(index.overlapping(conflicts.Slot.for_event(date(2031, 1, 11), time(0, 30), time(2, 0))), [0, 2])
+        self.assertEqual(index.overlapping(conflicts.Slot.for_days(date(2031, 2, 1))), [3])
+        self.assertEqual(index.overlapping(conflicts.Slot.for_days(date(2030, 12, 31))), [])
+
+    def test_accepting_overlapping_invitation_is_refused(self):
+        clash = create_interaction(
+            self.owner,
+            title='Свадьба',
+            event_date=self.EVENT_DAY,
+            event_start_time=time(19, 0),
+        )
+        invitation = InteractionParticipant.objects.create(
+            interaction=clash,
+            user=self.singer,
+            role=InteractionParticipant.ROLE_PERFORMER,
+        )
+        self.client.force_login(self.singer)
+        response = self.client.post(reverse('interactions:participant_decision', args=[invitation.pk, 'accept']))
+        self.assertRedirects(response, reverse('interactions:my_projects'), fetch_redirect_response=False)
+        invitation.refresh_from_db()
+        self.assertEqual(invitation.status, InteractionParticipant.STATUS_PENDING)
+
+    def _romance_form(self, instance=None):
+        return InteractionForm(
+            data={
+                'title': 'Вечер романса',
+                'description': 'Камерный концерт',
+                'interaction_type': Interaction.TYPE_ONE_TIME,
+                'status': Interaction.STATUS_DRAFT,
+                'budget_currency': Interaction.CURRENCY_RUB,
+                'event_date': self.EVENT_DAY.isoformat(),
+                'event_start_time': '17:00',
+                'event_end_time': '19:00',
+                'performers': [self.profile.pk],
+            },
+            instance=instance,
+            user=self.owner,
+        )
+
+    def test_form_warns_about_busy_invited_performers(self):
+        form = self._romance_form()
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(len(form.conflict_warnings), 1)
+        self.assertIn('Гала-концерт', form.conflict_warnings[0])
+
+    def test_form_rejects_busy_accepted_performers(self):
+        romance = create_interaction(self.owner, title='Вечер романса', event_date=date(2031, 5, 21))
+        InteractionParticipant.objects.create(
+            interaction=romance,
+            user=self.singer,
+            role=InteractionParticipant.ROLE_PERFORMER,
+            status=InteractionParticipant.STATUS_ACCEPTED,
+        )
+        form = self._romance_form(instance=romance)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Гала-концерт', form.errors['performers'][0])
+
+    def test_form_keeps_later_conflicts_of_accepted_performers_as_warnings(self):
+        romance = create_interaction(
+            self.owner,
+            title='Вечер романса',
+            event_date=self.EVENT_DAY,
+            event_start_time=time(17, 0),
+            event_end_time=time(19, 0),
+        )
+        InteractionParticipant.objects.create(
+            interaction=romance,
+            user=self.singer,
+            role=InteractionParticipant.ROLE_PERFORMER,
+            status=InteractionParticipant.STATUS_ACCEPTED,
+        )
+        # Исполнитель закрыл день в календаре уже после того, как принял приглашение
+        PerformerAvailability.objects.create(performer=self.profile, date=self.EVENT_DAY, status='unavailable')
+
+        # Даты не менялись: и занятый день, и пересечение с концертом — лишь предупреждения
+        form = self._romance_form(instance=romance)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(len(form.conflict_warnings), 2)
+
+    def test_double_submitted_accept_is_applied_once(self):
+        concert = create_interaction(self.owner, title='Камерный вечер', event_date=date(2031, 7, 1))
+        invitation = concert.add_participant(user=self.singer, role=InteractionParticipant.ROLE_PERFORMER)
+        self.client.force_login(self.singer)
+        url = reverse('interactions:participant_decision', args=[invitation.pk, 'accept'])
+
+        for _ in range(2):
+            response = self.client.post(url)
+            self.assertRedirects(response, reverse('interactions:my_projects'), fetch_redirect_response=False)
+
+        concert.refresh_from_db()
+        self.assertEqual((concert.participants_pending_count, concert.participants_accepted_count), (0, 1))
+
+    def test_bulk_check_reports_each_performer(self):
+        free = PerformerProfile.objects.create(user=create_user('pianist'), full_name='Пианист')
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('interactions:performer_conflicts'), {
+            'performers': f'{self.profile.pk},{free.pk}',
+            'date': self.EVENT_DAY.isoformat(),
+            'start': '20:00',
+            'end': '22:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        performers = response.json()['performers']
+        self.assertFalse(performers[str(self.profile.pk)]['available'])
+        self.assertEqual(performers[str(self.profile.pk)]['conflicts'][0]['interaction'], self.booked.pk)
+        self.assertEqual(performers[str(free.pk)], {'available': True, 'conflicts': []})
+
+        # Чужой проект: только занятый день, без id и времени
+        self.client.force_login(create_user('stranger'))
+        response = self.client.get(reverse('interactions:performer_conflicts'), {
+            'performers': str(self.profile.pk),
+            'date': self.EVENT_DAY.isoformat(),
+        })
+        self.assertEqual(
+            response.json()['performers'][str(self.profile.pk)],
+            {'available': False, 'conflicts': [{'kind': conflicts.KIND_PROJECT, 'date': '2031-05-20'}]},
+        )
+
+        response = self.client.get(reverse('interactions:performer_conflicts'), {'performers': 'x', 'date': '2031-05-20'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.upload_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, CHUNKED_UPLOAD_DIR=self.upload_dir)
+        self.settings_override.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        self.addCleanup(self.settings_override.disable)
+
+        self.owner = create_user('owner')
+        self.client.force_login(self.owner)
+        self.interaction = create_interaction(self.owner)
+        self.content = bytes(range(256)) * 40  # 10 КБ
+
+    def _start(self, filename='rider.pdf', size=None):
+        response = self.client.post(
+            reverse('interactions:upload_start', args=[self.interaction.pk]),
+            data={'filename': filename, 'size': len(self.content) if size is None else size},
+            content_type='application/json',
+        )
+        return response
+
+    def _put(self, upload_id, start, end):
+        return self.client.put(
+            reverse('interactions:upload_chunk', args=[upload_id]),
+            data=self.content[start:end + 1],
+            content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {start}-{end}/{len(self.content)}'},
+        )
+
+    def _upload(self, filename='rider.pdf'):
+        upload_id = self._start(filename).json()['id']
+        for start in range(0, len(self.content), 4096):
+            response = self._put(upload_id, start, min(start + 4096, len(self.content)) - 1)
+            self.assertEqual(response.status_code, 200)
+        return upload_id, response.json()
+
+    def test_chunks_are_resumable_and_hashed(self):
+        upload_id = self._start().json()['id']
+        self.assertEqual(self._put(upload_id, 0, 4095).json()['offset'], 4096)
+
+        # Часть не с текущего смещения отклоняется, клиент узнаёт, откуда продолжить
+        response = self._put(upload_id, 8192, 10239)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4096)
+        state = self.client.get(reverse('interactions:upload_chunk', args=[upload_id])).json()
+        self.assertEqual((state['offset'], state['complete']), (4096, False))
+
+        self.assertEqual(self._put(upload_id, 4096, 8191).status_code, 200)
+        result = self._put(upload_id, 8192, len(self.content) - 1).json()
+        self.assertTrue(result['complete'])
+
+        session = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual(session.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertTrue(session.stored_name.endswith(f'{session.sha256}.pdf'))
+
+    def test_identical_content_is_stored_once(self):
+        first, _ = self._upload('rider.pdf')
+        second, _ = self._upload('rider-copy.pdf')
+        names = set(UploadSession.objects.filter(pk__in=[first, second]).values_list('stored_name', flat=True))
+        self.assertEqual(len(names), 1)
+
+    def test_upload_limits_and_ownership(self):
+        with self.settings(ATTACHMENT_MAX_SIZE_MB=0):
+            self.assertEqual(self._start().status_code, 413)
+        upload_id = self._start().json()['id']
+        self.client.force_login(create_user('stranger'))
+        self.assertEqual(self._put(upload_id, 0, 4095).status_code, 404)
+
+    def test_only_project_managers_can_start_uploads(self):
+        participant = create_user('participant')
+        InteractionParticipant.objects.create(
+            interaction=self.interaction,
+            user=participant,
+            role=InteractionParticipant.ROLE_PERFORMER,
+            status=InteractionParticipant.STATUS_ACCEPTED,
+        )
+        self.client.force_login(participant)
+        self.assertEqual(self._start().status_code, 403)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_report_attachment_is_served_with_ranges(self):
+        upload_id, _ = self._upload('rider.pdf')
+        response = self.client.post(reverse('interactions:add_report', args=[self.interaction.pk]), {
+            'summary': 'Итоги',
+            'upload': upload_id,
+        })
+        self.assertEqual(response.status_code, 302)
+        report = ProjectReport.objects.get()
+        url = reverse('interactions:attachment', args=[self.interaction.pk, 'reports', report.pk])
+
+        full = self.client.get(url)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertIn('rider.pdf', full['Content-Disposition'])
+        self.assertEqual(report.attachment_name, 'rider.pdf')
+        self.assertEqual(b''.join(full.streaming_content), self.content)
+
+        partial = self.client.get(url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(partial.streaming_content), self.content[100:200])
+
+        tail = self.client.get(url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(tail.streaming_content), self.content[-10:])
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=999999-'}).status_code, 416)
+
+        self.client.force_login(create_user('stranger'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_download_name_does_not_leak_from_other_projects(self):
+        # Тот же файл, загруженный в другой проект под другим именем
+        other_owner = create_user('other-owner')
+        other = create_interaction(other_owner)
+        self.client.force_login(other_owner)
+        self.interaction, own_interaction = other, self.interaction
+        self._upload('secret-contract.pdf')
+
+        self.client.force_login(self.owner)
+        self.interaction = own_interaction
+        upload_id, _ = self._upload('rider.pdf')
+        self.client.post(reverse('interactions:add_report', args=[self.interaction.pk]), {
+            'summary': 'Итоги',
+            'upload': upload_id,
+        })
+        report = ProjectReport.objects.get(interaction=own_interaction)
+        url = reverse('interactions:attachment', args=[self.interaction.pk, 'reports', report.pk])
+
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertIn('rider.pdf', response['Content-Disposition'])
+        self.assertNotIn('secret', response['Content-Disposition'])
@@ -0,0 +1,68 @@
+"""Лента событий проекта (InteractionEvent).
+
+Страницы идут от новых событий к старым и выбираются курсором по
+(created_at, id) — core.pagination.KeysetPaginator поверх индекса
+(interaction, created_at, id). Карточка проекта выводит только последнюю
+страницу, более ранние подгружаются по курсору next.
+
+Режим since отдаёт события строго после указанного ключа (от старых к
+новым): клиент передаёт курсор latest из предыдущего ответа и получает
+только новые события — для периодического опроса или push-уведомлений.
+"""
+from django.urls import reverse
+
+from core.pagination import DIRECTION_NEXT, KeysetPaginator, decode_cursor, encode_cursor, keyset_filter
+
+from .models import InteractionEvent
+
+PAGE_SIZE = 20
+SINCE_LIMIT = 100
+TIMELINE_ORDERING = ['-created_at', '-id']
+SINCE_ORDERING = ['created_at', 'id']
+
+
+def _events(interaction):
+    return InteractionEvent.objects.filter(interaction=interaction).select_related('actor')
+
+
+def latest_cursor(event):
+    """Курсор для режима since: «всё, что новее event»."""
+    return encode_cursor([event.created_at, event.id], DIRECTION_NEXT)
+
+
+def timeline_page(interaction, cursor=None, per_page=PAGE_SIZE):
+    """Страница ленты от новых к старым; неверный курсор даёт первую страницу."""
+    return KeysetPaginator(_events(interaction), TIMELINE_ORDERING, per_page).get_page(cursor)
+
+
+def events_since(interaction, cursor, limit=SINCE_LIMIT):
+    """
+    События новее курсора (по возрастанию) и признак, что есть ещё.
+
+    Курсор — значение latest из предыдущего ответа; InvalidCursor
+    пробрасывается вызывающему коду.
+    """
+    values, _ = decode_cursor(cursor)
+    events = _events(interaction)
+    rows = list(
+        events
+        .filter(keyset_filter(SINCE_ORDERING, values, DIRECTION_NEXT, queryset=events))
+        .order_by(*SINCE_ORDERING)[:limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'type_display': event.get_event_type_display(),
+        'text': event.text,
+        'actor': str(event.actor),
+        'attachment': (
+            reverse('interactions:attachment', args=[event.interaction_id, 'events', event.id])
+            if event.attachment else None
+        ),
+        'metadata': event.metadata,
+        'created_at': event.created_at.isoformat(),
+    }
@@ -0,0 +1,227 @@
+"""Загрузка и выдача вложений проекта без буферизации в памяти.
+
+Загрузка по частям (UploadSession):
+
+1. клиент создаёт сессию с именем и размером файла;
+2. отправляет части телом запроса с заголовком
+   ``Content-Range: bytes <start>-<end>/<size>``; часть дописывается в
+   файл <CHUNKED_UPLOAD_DIR>/<id>.part блоками по STREAM_BLOCK_SIZE;
+3. после обрыва клиент узнаёт смещение (received) и продолжает с него;
+4. когда получен весь файл, считается SHA-256, и файл переносится в
+   хранилище под именем interactions/files/<hash>.<ext>. Одинаковое
+   содержимое хранится один раз.
+
+Выдача (attachment_response) — FileResponse с поддержкой одного диапазона
+Range, так что плееры и менеджеры загрузок могут перематывать и докачивать.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import UploadSession
+
+STREAM_BLOCK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+STORAGE_PREFIX = 'interactions/files'
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UploadError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_upload_size():
+    return getattr(settings, 'ATTACHMENT_MAX_SIZE_MB', 2048) * 1024 * 1024
+
+
+def _partial_path(session):
+    directory = getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or os.path.join(tempfile.gettempdir(), 'chunked-uploads')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{session.pk}.part')
+
+
+def start_upload(interaction, owner, filename, size):
+    filename = get_valid_filename(os.path.basename(filename or ''))[:255]
+    if not filename:
+        raise UploadError('Invalid filename')
+    if size <= 0 or size > max_upload_size():
+        raise UploadError('Invalid file size', status=413 if size > 0 else 400)
+    return UploadSession.objects.create(interaction=interaction, owner=owner, filename=filename, size=size)
+
+
+def parse_content_range(header):
+    match = _CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range required')
+    start, end, total = (int(value) for value in match.groups())
+    if end < start or end - start + 1 > MAX_CHUNK_SIZE:
+        raise UploadError('Invalid chunk size')
+    return start, end, total
+
+
+def _copy_stream(source, target, length):
+    remaining = length
+    while remaining > 0:
+        block = source.read(min(STREAM_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        target.write(block)
+        remaining -= len(block)
+    return length - remaining
+
+
+def receive_chunk(session_id, owner, stream, content_range):
+    """
+    Дописывает часть к сессии и возвращает сессию.
+
+    Сессия блокируется на время записи, поэтому повторно отправленная или
+    параллельная часть не может записаться дважды; часть не с текущего
+    смещения отклоняется с 409, клиент должен продолжить с received.
+    """
+    start, end, total = parse_content_range(content_range)
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id, owner=owner)
+        if session.is_complete:
+            return session
+        if total != session.size or end >= session.size:
+            raise UploadError('Content-Range does not match upload size')
+        if start != session.received:
+            raise UploadError('Unexpected offset', status=409)
+
+        path = _partial_path(session)
+        with open(path, 'ab') as target:
+            target.truncate(session.received)
+            written = _copy_stream(stream, target, end - start + 1)
+        if written != end - start + 1:
+            raise UploadError('Incomplete chunk')
+
+        session.received += written
+        fields = ['received', 'updated_at']
+        if session.received == session.size:
+            session.sha256, session.stored_name = _store(session, path)
+            session.completed_at = timezone.now()
+            fields += ['sha256', 'stored_name', 'completed_at']
+        session.save(update_fields=fields)
+    return session
+
+
+def _store(session, path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+
+    extension = os.path.splitext(session.filename)[1].lower()[:16]
+    name = f'{STORAGE_PREFIX}/{sha256[:2]}/{sha256}{extension}'
+    if not default_storage.exists(name):
+        with open(path, 'rb') as source:
+            name = default_storage.save(name, File(source))
+    os.remove(path)
+    return sha256, name
+
+
+def completed_upload(session_id, owner, interaction):
+    """Завершённая загрузка пользователя в этом проекте или None."""
+    return UploadSession.objects.filter(
+        pk=session_id,
+        owner=owner,
+        interaction=interaction,
+        completed_at__isnull=False,
+    ).first()
+
+
+def attach_upload(obj, session):
+    """Указывает вложение obj на уже сохранённый файл загрузки (без копирования)."""
+    obj.attachment.name = session.stored_name
+    obj.attachment_name = session.filename
+
+
+def discard_stale_uploads(max_age=timedelta(days=1)):
+    """Удаляет незавершённые загрузки, не получавшие частей дольше max_age."""
+    stale = UploadSession.objects.filter(completed_at__isnull=True, updated_at__lt=timezone.now() - max_age)
+    removed = 0
+    for session in stale:
+        path = _partial_path(session)
+        if os.path.exists(path):
+            os.remove(path)
+        session.delete()
+        removed += 1
+    return removed
+
+
+class _RangeFile:
+    """Файл, из которого читается не больше length байт начиная с offset."""
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.file.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _parse_range(header, size):
+    """(start, end) единственного диапазона, None без Range, False — если неисполним."""
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def attachment_response(field_file, request, filename=None):
+    """FileResponse для вложения с поддержкой Range (206/416)."""
+    filename = filename or os.path.basename(field_file.name)
+    size = field_file.size
+    byte_range = _parse_range(request.headers.get('Range'), size) if size else None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = field_file.storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = FileResponse(_RangeFile(file, start, end - start + 1), as_attachment=True, filename=filename, status=206)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
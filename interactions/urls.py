@@ -8,11 +8,17 @@ urlpatterns = [
     path('', views.interaction_list, name='list'),
     path('my/', views.my_projects, name='my_projects'),
     path('new/', views.interaction_create, name='create'),
+    path('performers/conflicts/', views.performer_conflicts, name='performer_conflicts'),
+    path('participants/<str:role>/search/', views.participant_search, name='participant_search'),
     path('<int:pk>/', views.interaction_detail, name='detail'),
+    path('<int:pk>/timeline/', views.interaction_timeline, name='timeline'),
     path('<int:pk>/edit/', views.interaction_update, name='update'),
     path('<int:pk>/cancel/', views.cancel_project, name='cancel_project'),
     path('<int:pk>/complete/', views.complete_project, name='complete_project'),
     path('<int:pk>/reports/add/', views.interaction_add_report, name='add_report'),
+    path('<int:pk>/uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('<int:pk>/<str:kind>/<int:object_id>/attachment/', views.attachment_download, name='attachment'),
     path('participations/<int:pk>/<str:decision>/', views.participant_decision, name='participant_decision'),
     path('participations/<int:pk>/completion/<str:decision>/', views.participant_completion_decision, name='participant_completion_decision'),
 ]
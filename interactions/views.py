@@ -1,38 +1,91 @@
+import json
+from datetime import datetime
+
 from django.contrib import messages
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from core.pagination import InvalidCursor, KeysetPaginator
+from performers.models import PerformerProfile
 
+from . import completion, conflicts, timeline, uploads
 from .forms import InteractionForm, ProjectReportForm
-from .models import Interaction, InteractionParticipant
+from .models import Interaction, InteractionEvent, InteractionParticipant, ProjectReport, UploadSession
+from .pickers import PICKERS
+
+
+PROJECTS_PER_PAGE = 20
+PROJECT_LIST_ORDERING = ['-created_at', '-id']
 
 
 def _accessible_interactions_queryset(user):
-    qs = Interaction.objects.all().select_related('created_by').prefetch_related('participant_links__user')
-    if user.is_superuser:
-        return qs
+    return (
+        Interaction.objects.accessible_to(user)
+        .select_related('created_by')
+        .prefetch_related(Interaction.participants_prefetch())
+    )
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
 
-    filters = Q(created_by=user) | Q(participant_links__user=user)
-    return qs.filter(filters).distinct()
+def _warn_about_conflicts(request, form):
+    for text in form.conflict_warnings:
+        messages.warning(request, f'Исполнитель занят на даты проекта и не сможет принять приглашение: {text}.')
 
 
 @login_required
 def interaction_list(request):
-    interactions_qs = _accessible_interactions_queryset(request.user).order_by('-created_at')
+    interactions_qs = _accessible_interactions_queryset(request.user)
+
+    status = request.GET.get('status', '')
+    if status not in dict(Interaction.STATUS_CHOICES):
+        status = ''
+    if status:
+        interactions_qs = interactions_qs.filter(status=status)
+
+    # Фильтр по дате проведения
+    date_from = _parse_date(request.GET.get('date_from'))
+    date_to = _parse_date(request.GET.get('date_to'))
+    if date_from is not None:
+        interactions_qs = interactions_qs.filter(event_date__gte=date_from)
+    if date_to is not None:
+        interactions_qs = interactions_qs.filter(event_date__lte=date_to)
+
+    paginator = KeysetPaginator(interactions_qs, PROJECT_LIST_ORDERING, PROJECTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     interaction_entries = []
-    for interaction in interactions_qs:
+    for interaction in page_obj:
+        grouped = interaction.grouped_participants()
         interaction_entries.append({
             'interaction': interaction,
             'participants': {
-                'agents': interaction.participants_by_role(InteractionParticipant.ROLE_AGENT),
-                'venues': interaction.participants_by_role(InteractionParticipant.ROLE_VENUE),
-                'performers': interaction.participants_by_role(InteractionParticipant.ROLE_PERFORMER),
+                'agents': grouped[InteractionParticipant.ROLE_AGENT],
+                'venues': grouped[InteractionParticipant.ROLE_VENUE],
+                'performers': grouped[InteractionParticipant.ROLE_PERFORMER],
             },
         })
 
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+
     return render(request, 'interactions/interaction_list.html', {
         'project_entries': interaction_entries,
+        'page_obj': page_obj,
+        'query_params': query_params.urlencode(),
+        'status_choices': Interaction.STATUS_CHOICES,
+        'selected_status': status,
+        'date_from': date_from.isoformat() if date_from else '',
+        'date_to': date_to.isoformat() if date_to else '',
+        'is_filtered': bool(status or date_from or date_to),
     })
 
 
@@ -56,6 +109,7 @@ def interaction_detail(request, pk):
         status=InteractionParticipant.STATUS_ACCEPTED,
         completion_status=InteractionParticipant.COMPLETION_DECLINED,
     ).select_related('user')
+    events_page = timeline.timeline_page(interaction)
     return render(request, 'interactions/interaction_detail.html', {
         'interaction': interaction,
         'report_form': report_form,
@@ -67,6 +121,38 @@ def interaction_detail(request, pk):
         'completion_pending': completion_pending,
         'completion_declined': completion_declined,
         'completion_active': interaction.is_completion_confirmation_active(),
+        'events_page': events_page,
+        'events_latest': timeline.latest_cursor(events_page.object_list[0]) if events_page else '',
+    })
+
+
+@login_required
+@require_GET
+def interaction_timeline(request, pk):
+    """
+    Лента событий проекта в JSON.
+
+    ?cursor= — страница более ранних событий (next из предыдущего ответа);
+    ?since= — только события новее курсора latest, для опроса.
+    """
+    interaction = get_object_or_404(Interaction.objects.accessible_to(request.user).only('id'), pk=pk)
+    since = request.GET.get('since')
+    if since:
+        try:
+            events, has_more = timeline.events_since(interaction, since)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        return JsonResponse({
+            'events': [timeline.serialize_event(event) for event in events],
+            'latest': timeline.latest_cursor(events[-1]) if events else since,
+            'has_more': has_more,
+        })
+
+    page = timeline.timeline_page(interaction, request.GET.get('cursor'))
+    return JsonResponse({
+        'events': [timeline.serialize_event(event) for event in page],
+        'next': page.next_cursor,
+        'latest': timeline.latest_cursor(page.object_list[0]) if page and not page.has_previous() else None,
     })
 
 
@@ -80,6 +166,7 @@ def interaction_create(request):
     if request.method == 'POST' and form.is_valid():
         interaction = form.save(created_by=request.user)
         messages.success(request, 'Проект создан.')
+        _warn_about_conflicts(request, form)
         return redirect('interactions:detail', pk=interaction.pk)
 
     return render(request, 'interactions/interaction_form.html', {
@@ -98,6 +185,7 @@ def interaction_update(request, pk):
     if request.method == 'POST' and form.is_valid():
         form.save()
         messages.success(request, 'Проект обновлён.')
+        _warn_about_conflicts(request, form)
         return redirect('interactions:detail', pk=interaction.pk)
 
     return render(request, 'interactions/interaction_form.html', {
@@ -107,6 +195,66 @@ def interaction_update(request, pk):
     })
 
 
+@login_required
+@require_GET
+def participant_search(request, role):
+    """Страница профилей для выбора участников: ?q=начало имени&cursor=..."""
+    picker = PICKERS.get(role)
+    if picker is None:
+        raise Http404
+    page = picker.search(request.GET.get('q', ''), request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [picker.serialize(profile) for profile in page],
+        'next': page.next_cursor,
+    })
+
+
+MAX_CONFLICT_CHECK_PERFORMERS = 50
+
+
+@login_required
+@require_GET
+def performer_conflicts(request):
+    """Занятость нескольких артистов на слот одним запросом.
+
+    Параметры: performers=1,2,3&date=YYYY-MM-DD[&start=HH:MM&end=HH:MM]
+    [&exclude=<id проекта>]. Для каждого артиста возвращается available и
+    список конфликтов (участие в другом проекте или занятость по календарю).
+    Подробности — id проекта и время — только для проектов, доступных
+    запрашивающему; о чужих проектах сообщается лишь занятый день.
+    """
+    try:
+        performer_ids = sorted({int(value) for value in request.GET.get('performers', '').split(',') if value.strip()})
+        event_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+        start_time = datetime.strptime(request.GET['start'], '%H:%M').time() if request.GET.get('start') else None
+        end_time = datetime.strptime(request.GET['end'], '%H:%M').time() if request.GET.get('end') else None
+        exclude_id = int(request.GET['exclude']) if request.GET.get('exclude') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    if not performer_ids or len(performer_ids) > MAX_CONFLICT_CHECK_PERFORMERS:
+        return JsonResponse({'error': 'Invalid performers list'}, status=400)
+
+    users = dict(PerformerProfile.objects.filter(id__in=performer_ids).values_list('id', 'user_id'))
+    found = conflicts.find_conflicts(
+        users.values(),
+        conflicts.project_slot(event_date, start_time, end_time),
+        exclude_interaction_id=exclude_id,
+    )
+    interaction_ids = {conflict.interaction_id for items in found.values() for conflict in items if conflict.interaction_id}
+    visible = set(
+        Interaction.objects.accessible_to(request.user).filter(pk__in=interaction_ids).values_list('pk', flat=True)
+    ) if interaction_ids else set()
+    return JsonResponse({
+        'performers': {
+            str(performer_id): {
+                'available': user_id not in found,
+                'conflicts': [conflict.as_dict(visible) for conflict in found.get(user_id, [])],
+            }
+            for performer_id, user_id in users.items()
+        },
+    })
+
+
 @login_required
 def interaction_add_report(request, pk):
     interaction = get_object_or_404(_accessible_interactions_queryset(request.user), pk=pk)
@@ -121,6 +269,12 @@ def interaction_add_report(request, pk):
         report = form.save(commit=False)
         report.interaction = interaction
         report.author = request.user
+        if form.cleaned_data['upload']:
+            upload = uploads.completed_upload(form.cleaned_data['upload'], request.user, interaction)
+            if upload is None:
+                messages.error(request, 'Файл отчёта не загружен до конца. Попробуйте ещё раз.')
+                return redirect('interactions:detail', pk=interaction.pk)
+            uploads.attach_upload(report, upload)
         report.save()
         messages.success(request, 'Отчёт сохранён.')
     else:
@@ -129,23 +283,91 @@ def interaction_add_report(request, pk):
     return redirect('interactions:detail', pk=interaction.pk)
 
 
+def _upload_state(session):
+    return {
+        'id': str(session.pk),
+        'size': session.size,
+        'offset': session.received,
+        'complete': session.is_complete,
+        'chunk_size': uploads.MAX_CHUNK_SIZE,
+    }
+
+
+@login_required
+@require_POST
+def upload_start(request, pk):
+    """Начинает загрузку файла по частям: JSON {filename, size}."""
+    interaction = get_object_or_404(Interaction.objects.accessible_to(request.user).only('id', 'created_by'), pk=pk)
+    # Загрузки принимает только interaction_add_report — с теми же правами
+    if not interaction.can_manage(request.user):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    try:
+        payload = json.loads(request.body or b'{}')
+        session = uploads.start_upload(interaction, request.user, payload.get('filename'), int(payload.get('size', 0)))
+    except (ValueError, TypeError, AttributeError) as error:
+        status = error.status if isinstance(error, uploads.UploadError) else 400
+        return JsonResponse({'error': str(error) or 'Invalid parameters'}, status=status)
+    return JsonResponse(_upload_state(session), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_chunk(request, upload_id):
+    """
+    GET — текущее смещение загрузки (для возобновления);
+    PUT — очередная часть телом запроса с заголовком Content-Range.
+    """
+    if request.method == 'GET':
+        session = get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+        return JsonResponse(_upload_state(session))
+    try:
+        session = uploads.receive_chunk(upload_id, request.user, request, request.headers.get('Content-Range'))
+    except UploadSession.DoesNotExist:
+        raise Http404
+    except uploads.UploadError as error:
+        current = UploadSession.objects.filter(pk=upload_id, owner=request.user).values_list('received', flat=True).first()
+        return JsonResponse({'error': str(error), 'offset': current}, status=error.status)
+    return JsonResponse(_upload_state(session))
+
+
+ATTACHMENT_MODELS = {
+    'reports': ProjectReport,
+    'events': InteractionEvent,
+}
+
+
+@login_required
+@require_GET
+def attachment_download(request, pk, kind, object_id):
+    """Вложение отчёта или события проекта — потоком, с поддержкой Range."""
+    if not _accessible_interactions_queryset(request.user).filter(pk=pk).exists():
+        raise Http404
+    model = ATTACHMENT_MODELS.get(kind)
+    if model is None:
+        raise Http404
+    obj = get_object_or_404(
+        model.objects.only('id', 'interaction_id', 'attachment', 'attachment_name'),
+        pk=object_id,
+        interaction_id=pk,
+    )
+    if not obj.attachment:
+        raise Http404
+    return uploads.attachment_response(obj.attachment, request, obj.attachment_name or None)
+
+
 @login_required
 def my_projects(request):
-    if request.user.is_superuser:
-        interactions = Interaction.objects.all().select_related('created_by').prefetch_related('participant_links__user').order_by('-created_at')
-    else:
-        interactions = Interaction.objects.filter(
-            Q(created_by=request.user) | Q(participant_links__user=request.user)
-        ).distinct().select_related('created_by').prefetch_related('participant_links__user').order_by('-created_at')
+    interactions = (
+        Interaction.objects.accessible_to(request.user)
+        .with_completion_state(request.user)
+        .select_related('created_by')
+        .prefetch_related(Interaction.participants_prefetch())
+        .order_by('-created_at')
+    )
 
     projects = []
-    participation_index = {
-        link.interaction_id: link
-        for link in InteractionParticipant.objects.filter(interaction__in=interactions, user=request.user)
-    }
-
     for interaction in interactions:
-        link = participation_index.get(interaction.id)
+        link = interaction.viewer_participation(request.user)
         is_creator = interaction.is_creator(request.user)
         if interaction.can_manage(request.user):
             participant_status = InteractionParticipant.STATUS_ACCEPTED
@@ -171,7 +393,7 @@ def my_projects(request):
             'completion_status': completion_status,
             'completion_request': completion_request,
             'completion_declined': completion_declined,
-            'completion_active': interaction.is_completion_confirmation_active(),
+            'completion_active': interaction.completion_active,
         })
 
     return render(request, 'interactions/my_projects.html', {
@@ -189,16 +411,51 @@ def participant_decision(request, pk, decision):
     )
     interaction = participation.interaction
 
+    if decision not in ('accept', 'decline'):
+        messages.error(request, 'Некорректное действие.')
+        return redirect('interactions:my_projects')
+
+    busy = None
+    with transaction.atomic():
+        if decision == 'accept':
+            # Принятия одного пользователя выполняются по очереди: иначе два
+            # пересекающихся приглашения, принятые одновременно, оба пройдут проверку
+            get_user_model().objects.select_for_update().filter(pk=request.user.pk).values_list('pk').first()
+        # Повторная отправка формы ждёт первую и видит уже сохранённый ответ
+        participation = (
+            InteractionParticipant.objects.select_for_update()
+            .filter(pk=participation.pk)
+            .first()
+        )
+        if participation is None or (
+            decision == 'accept' and participation.status != InteractionParticipant.STATUS_PENDING
+        ):
+            messages.info(request, 'Вы уже ответили на это приглашение.')
+            return redirect('interactions:my_projects')
+        participation.interaction = interaction
+
+        if decision == 'accept':
+            busy = conflicts.find_conflicts(
+                [request.user.pk],
+                conflicts.interaction_slot(interaction),
+                exclude_interaction_id=interaction.pk,
+            ).get(request.user.pk)
+            if not busy:
+                participation.mark_accepted()
+        else:
+            participation.mark_declined()
+            participation.delete()
+
+    if busy:
+        messages.error(
+            request,
+            'Нельзя принять приглашение: ' + '; '.join(conflict.describe() for conflict in busy) + '.',
+        )
+        return redirect('interactions:my_projects')
     if decision == 'accept':
-        participation.mark_accepted()
         messages.success(request, 'Вы приняли приглашение в проект.')
-    elif decision == 'decline':
-        participation.mark_declined()
-        participation.delete()
-        messages.info(request, 'Вы отказались от участия в проекте.')
     else:
-        messages.error(request, 'Некорректное действие.')
-        return redirect('interactions:my_projects')
+        messages.info(request, 'Вы отказались от участия в проекте.')
 
     interaction.update_status_from_participants()
     return redirect('interactions:my_projects')
@@ -210,12 +467,7 @@ def cancel_project(request, pk):
     interaction = get_object_or_404(_accessible_interactions_queryset(request.user), pk=pk)
     if not interaction.is_creator(request.user):
         return redirect('interactions:detail', pk=interaction.pk)
-    interaction.cancel_project()
-    interaction.participant_links.update(
-        completion_status=InteractionParticipant.COMPLETION_NOT_REQUESTED,
-        completion_requested_at=None,
-        completion_responded_at=None,
-    )
+    completion.cancel(interaction)
     return redirect('interactions:detail', pk=interaction.pk)
 
 
@@ -225,9 +477,7 @@ def complete_project(request, pk):
     interaction = get_object_or_404(_accessible_interactions_queryset(request.user), pk=pk)
     if not interaction.is_creator(request.user):
         return redirect('interactions:detail', pk=interaction.pk)
-    started = interaction.start_completion_confirmation()
-    if started:
-        interaction.evaluate_completion_confirmation()
+    completion.start(interaction)
     return redirect('interactions:detail', pk=interaction.pk)
 
 
@@ -239,16 +489,9 @@ def participant_completion_decision(request, pk, decision):
         pk=pk,
         user=request.user,
     )
-    interaction = participation.interaction
     if participation.status != InteractionParticipant.STATUS_ACCEPTED:
         return redirect('interactions:my_projects')
 
-    if decision == 'confirm':
-        participation.mark_completion_confirmed()
-    elif decision == 'decline':
-        participation.mark_completion_declined()
-    else:
-        return redirect('interactions:my_projects')
-
-    interaction.evaluate_completion_confirmation()
+    if decision in ('confirm', 'decline'):
+        completion.respond(participation, confirm=decision == 'confirm')
     return redirect('interactions:my_projects')
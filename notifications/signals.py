@@ -3,92 +3,109 @@ from django.dispatch import receiver
 from django.db import transaction
 from announcements.models import AnnouncementResponse
 from interactions.models import Interaction, InteractionParticipant
+from interactions.signals import participants_invited
 from chat.models import Message
 from .models import Notification
-from .utils import send_new_message_email, send_notification_email
+from .utils import (
+    dispatch_project_invitations,
+    recipient_has_chat_open,
+    send_new_message_email,
+    send_notification_email,
+)
+
+
+def _queue_project_invitations(interaction, participants):
+    pending = [
+        participant for participant in participants
+        if participant.status == InteractionParticipant.STATUS_PENDING
+    ]
+    if pending:
+        # Одна пачка приглашений после коммита, а не письмо на каждую запись;
+        # отправка идёт в фоновом потоке, а не в потоке запроса
+        transaction.on_commit(lambda: dispatch_project_invitations(interaction, pending))
 
 
 @receiver(post_save, sender=InteractionParticipant)
 def notify_participant_invitation(sender, instance, created, **kwargs):
     """Уведомление при приглашении в проект"""
-    if created and instance.status == InteractionParticipant.STATUS_PENDING:
-        interaction = instance.interaction
-        
-        # Определяем роль для отображения
-        role_display = instance.get_role_display()
-        
-        send_notification_email(
-            user=instance.user,
-            notification_type=Notification.NOTIFICATION_TYPE_PROJECT_INVITATION,
-            title=f'Приглашение в проект "{interaction.title}"',
-            message=f'Вас пригласили участвовать в проекте "{interaction.title}" в роли {role_display}',
-            context={
-                'project_title': interaction.title,
-                'project_description': interaction.description[:200],
-                'role': role_display,
-                'inviter_name': interaction.created_by.username,
-                'project_url': f'/interactions/{interaction.id}/',
-            },
-            related_object_id=interaction.id,
-            related_object_type='interactions.interaction'
-        )
+    if created:
+        _queue_project_invitations(instance.interaction, [instance])
+
+
+@receiver(participants_invited)
+def notify_bulk_participant_invitations(sender, interaction, participants, **kwargs):
+    _queue_project_invitations(interaction, participants)
 
 
 @receiver(pre_save, sender=Interaction)
-def notify_project_status_change(sender, instance, **kwargs):
+def notify_project_status_change(sender, instance, update_fields=None, **kwargs):
     """Уведомление об изменении статуса проекта"""
-    if instance.pk:  # Только для существующих проектов
-        try:
-            old_instance = Interaction.objects.get(pk=instance.pk)
-            old_status = old_instance.status
-            new_status = instance.status
-            
-            # Если статус изменился
-            if old_status != new_status:
-                # Уведомляем всех участников проекта
-                # Используем all() чтобы получить все связи, так как instance еще не сохранен
-                participants = list(InteractionParticipant.objects.filter(
-                    interaction=instance,
-                    status=InteractionParticipant.STATUS_ACCEPTED
-                ).select_related('user'))
-                
-                status_display = instance.get_status_display()
-                
-                for participant in participants:
-                    # Не уведомляем создателя, если он сам изменил статус
-                    if participant.user != instance.created_by:
-                        send_notification_email(
-                            user=participant.user,
-                            notification_type=Notification.NOTIFICATION_TYPE_PROJECT_STATUS_CHANGE,
-                            title=f'Изменение статуса проекта "{instance.title}"',
-                            message=f'Статус проекта "{instance.title}" изменен на "{status_display}"',
-                            context={
-                                'project_title': instance.title,
-                                'old_status': old_instance.get_status_display(),
-                                'new_status': status_display,
-                                'project_url': f'/interactions/{instance.id}/',
-                            },
-                            related_object_id=instance.id,
-                            related_object_type='interactions.interaction'
-                        )
-                
-                # Уведомление о завершении проекта
-                if new_status == Interaction.STATUS_COMPLETED:
-                    for participant in participants:
-                        send_notification_email(
-                            user=participant.user,
-                            notification_type=Notification.NOTIFICATION_TYPE_PROJECT_COMPLETION,
-                            title=f'Проект "{instance.title}" завершен',
-                            message=f'Проект "{instance.title}" был завершен',
-                            context={
-                                'project_title': instance.title,
-                                'project_url': f'/interactions/{instance.id}/',
-                            },
-                            related_object_id=instance.id,
-                            related_object_type='interactions.interaction'
-                        )
-        except Interaction.DoesNotExist:
-            pass
+    if not instance.pk:  # Только для существующих проектов
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+
+    # Статус, загруженный вместе с объектом; перечитываем строку только если его нет
+    old_status = instance.__dict__.get('_loaded_status')
+    if old_status is None:
+        old_status = Interaction.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        if old_status is None:
+            return
+
+    new_status = instance.status
+    # Если статус изменился
+    if old_status == new_status:
+        return
+
+    # Уведомляем всех участников проекта
+    participants = list(InteractionParticipant.objects.filter(
+        interaction=instance,
+        status=InteractionParticipant.STATUS_ACCEPTED
+    ).select_related('user'))
+
+    statuses = dict(Interaction.STATUS_CHOICES)
+    status_display = instance.get_status_display()
+    project_title = instance.title
+    project_id = instance.id
+    created_by_id = instance.created_by_id
+
+    def send_notifications():
+        for participant in participants:
+            # Не уведомляем создателя, если он сам изменил статус
+            if participant.user_id != created_by_id:
+                send_notification_email(
+                    user=participant.user,
+                    notification_type=Notification.NOTIFICATION_TYPE_PROJECT_STATUS_CHANGE,
+                    title=f'Изменение статуса проекта "{project_title}"',
+                    message=f'Статус проекта "{project_title}" изменен на "{status_display}"',
+                    context={
+                        'project_title': project_title,
+                        'old_status': statuses.get(old_status, old_status),
+                        'new_status': status_display,
+                        'project_url': f'/interactions/{project_id}/',
+                    },
+                    related_object_id=project_id,
+                    related_object_type='interactions.interaction'
+                )
+
+        # Уведомление о завершении проекта
+        if new_status == Interaction.STATUS_COMPLETED:
+            for participant in participants:
+                send_notification_email(
+                    user=participant.user,
+                    notification_type=Notification.NOTIFICATION_TYPE_PROJECT_COMPLETION,
+                    title=f'Проект "{project_title}" завершен',
+                    message=f'Проект "{project_title}" был завершен',
+                    context={
+                        'project_title': project_title,
+                        'project_url': f'/interactions/{project_id}/',
+                    },
+                    related_object_id=project_id,
+                    related_object_type='interactions.interaction'
+                )
+
+    # Письма отправляются после коммита, чтобы не держать блокировку проекта
+    transaction.on_commit(send_notifications)
 
 
 @receiver(post_save, sender=Message)
@@ -97,18 +114,26 @@ def schedule_chat_notification(sender, instance, created, **kwargs):
     if not created:
         return
 
-    recipient = instance.room.client if instance.sender == instance.room.performer else instance.room.performer
-    if recipient == instance.sender:
+    room = instance.room
+    recipient = room.client if instance.sender_id == room.performer_id else room.performer
+    if recipient.pk == instance.sender_id:
         return
 
-    transaction.on_commit(lambda: send_new_message_email(
-        user=recipient,
-        sender=instance.sender,
-        message_text=instance.text,
-        platform_url=f'/chat/{instance.room.id}/',
-        related_object_id=instance.id,
-        related_object_type='chat.message',
-    ))
+    def send_email():
+        # Чат открыт у получателя — он видит сообщение, письмо не нужно.
+        # Если он уйдёт, не прочитав, напомнит check_unread_chat_messages.
+        if recipient_has_chat_open(room.id, recipient.pk):
+            return
+        send_new_message_email(
+            user=recipient,
+            sender=instance.sender,
+            message_text=instance.text,
+            platform_url=f'/chat/{room.id}/',
+            related_object_id=instance.id,
+            related_object_type='chat.message',
+        )
+
+    transaction.on_commit(send_email)
 
 
 @receiver(post_save, sender=AnnouncementResponse)
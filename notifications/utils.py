@@ -1,7 +1,11 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.mail import send_mail
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.conf import settings
+from django.db import connections
 from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
@@ -9,6 +13,20 @@ from .models import Notification, NotificationPreference
 
 logger = logging.getLogger(__name__)
 
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'NOTIFICATION_EMAIL_WORKERS', 2),
+                thread_name_prefix='notification-emails',
+            )
+    return _executor
+
 
 def _absolute_platform_url(path):
     site_url = getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000').rstrip('/')
@@ -99,6 +117,28 @@ def send_new_message_email(user, sender, message_text, platform_url=None, relate
     return email_sent
 
 
+def _render_notification_email(user, notification_type, title, message, context=None):
+    """Тема, текст и HTML письма уведомления по шаблонам notifications/emails/<тип>."""
+    template_context = {
+        'user': user,
+        'title': title,
+        'message': message,
+        'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
+    }
+    if context:
+        template_context.update(context)
+
+    subject = f'Maestro Platform - {title}'
+    try:
+        message_text = render_to_string(f'notifications/emails/{notification_type}.txt', template_context)
+        html_message = render_to_string(f'notifications/emails/{notification_type}.html', template_context)
+    except Exception:
+        # Если шаблона нет, используем базовый
+        message_text = message
+        html_message = None
+    return subject, message_text, html_message
+
+
 def send_notification_email(user, notification_type, title, message, context=None, related_object_id=None, related_object_type=None):
     """Создает системное уведомление и, при настройке, отправляет email."""
     preference = NotificationPreference.get_or_create_for(user, notification_type)
@@ -120,31 +160,8 @@ def send_notification_email(user, notification_type, title, message, context=Non
         if recent_notification:
             return False
     
-    # Создаем контекст для шаблона
-    template_context = {
-        'user': user,
-        'title': title,
-        'message': message,
-        'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-    }
-    if context:
-        template_context.update(context)
-    
-    # Тема письма
-    subject = f'Maestro Platform - {title}'
-    
-    # Текст письма
-    text_template = f'notifications/emails/{notification_type}.txt'
-    html_template = f'notifications/emails/{notification_type}.html'
-    
-    try:
-        message_text = render_to_string(text_template, template_context)
-        html_message = render_to_string(html_template, template_context)
-    except:
-        # Если шаблона нет, используем базовый
-        message_text = message
-        html_message = None
-    
+    subject, message_text, html_message = _render_notification_email(user, notification_type, title, message, context)
+
     should_send_email = preference.email_enabled and getattr(user, 'is_email_verified', False)
     in_app_sent = preference.in_app_enabled
     email_sent = False
@@ -178,22 +195,203 @@ def send_notification_email(user, notification_type, title, message, context=Non
     return email_sent
 
 
+def send_notification_emails(notification_type, items):
+    """
+    Пакетная версия send_notification_email для рассылки многим пользователям.
+
+    items — словари с ключами user, title, message и необязательными context,
+    related_object_id, related_object_type. Настройки и дубликаты проверяются
+    общими запросами, письма уходят через одно SMTP-соединение, уведомления
+    создаются одним bulk_create. Возвращает число отправленных писем.
+    """
+    items = [item for item in items if item.get('user') is not None]
+    if not items:
+        return 0
+
+    users = {item['user'].pk: item['user'] for item in items}
+    preferences = {
+        preference.user_id: preference
+        for preference in NotificationPreference.objects.filter(user_id__in=users, notification_type=notification_type)
+    }
+    missing = [
+        NotificationPreference(user_id=user_id, notification_type=notification_type, in_app_enabled=True, email_enabled=True)
+        for user_id in users
+        if user_id not in preferences
+    ]
+    if missing:
+        NotificationPreference.objects.bulk_create(missing, ignore_conflicts=True)
+        preferences.update((preference.user_id, preference) for preference in missing)
+
+    # Не отправляем дубликаты в течение часа
+    related_ids = {item.get('related_object_id') for item in items if item.get('related_object_id')}
+    recent = set()
+    if related_ids:
+        recent = set(Notification.objects.filter(
+            user_id__in=users,
+            notification_type=notification_type,
+            related_object_id__in=related_ids,
+            sent_at__gte=timezone.now() - timedelta(hours=1),
+        ).values_list('user_id', 'related_object_id', 'related_object_type', 'title', 'message'))
+
+    connection = None
+    notifications = []
+    sent_count = 0
+    for item in items:
+        user = item['user']
+        preference = preferences[user.pk]
+        if not preference.in_app_enabled and not preference.email_enabled:
+            continue
+        related_object_id = item.get('related_object_id')
+        related_object_type = item.get('related_object_type')
+        if related_object_id and related_object_type:
+            key = (user.pk, related_object_id, related_object_type, item['title'], item['message'])
+            if key in recent:
+                continue
+            recent.add(key)
+
+        should_send_email = preference.email_enabled and getattr(user, 'is_email_verified', False)
+        email_sent = False
+        if should_send_email:
+            subject, message_text, html_message = _render_notification_email(
+                user, notification_type, item['title'], item['message'], item.get('context'),
+            )
+            try:
+                if connection is None:
+                    connection = get_connection()
+                    connection.open()
+                email = EmailMultiAlternatives(
+                    subject=subject,
+                    body=message_text,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[user.email],
+                    connection=connection,
+                )
+                if html_message:
+                    email.attach_alternative(html_message, 'text/html')
+                email_sent = email.send() > 0
+            except Exception:
+                logger.exception('Failed to send %s email to user %s', notification_type, user.pk)
+            if email_sent:
+                sent_count += 1
+
+        notifications.append(Notification(
+            user=user,
+            notification_type=notification_type,
+            title=item['title'],
+            message=item['message'],
+            related_object_id=related_object_id,
+            related_object_type=related_object_type or '',
+            is_sent=email_sent,
+            email_sent=email_sent,
+            in_app_sent=preference.in_app_enabled,
+        ))
+
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            logger.exception('Failed to close email connection')
+    Notification.objects.bulk_create(notifications)
+    return sent_count
+
+
+def send_project_invitations(interaction, participants):
+    """Рассылает приглашения в проект участникам одной пачкой."""
+    users = get_user_model().objects.in_bulk({participant.user_id for participant in participants})
+    items = []
+    for participant in participants:
+        role_display = participant.get_role_display()
+        items.append({
+            'user': users.get(participant.user_id),
+            'title': f'Приглашение в проект "{interaction.title}"',
+            'message': f'Вас пригласили участвовать в проекте "{interaction.title}" в роли {role_display}',
+            'context': {
+                'project_title': interaction.title,
+                'project_description': interaction.description[:200],
+                'role': role_display,
+                'inviter_name': interaction.created_by.username,
+                'project_url': f'/interactions/{interaction.id}/',
+            },
+            'related_object_id': interaction.id,
+            'related_object_type': 'interactions.interaction',
+        })
+    return send_notification_emails(Notification.NOTIFICATION_TYPE_PROJECT_INVITATION, items)
+
+
+def _send_project_invitations_in_background(interaction_id, participant_ids):
+    from interactions.models import Interaction, InteractionParticipant
+
+    try:
+        interaction = Interaction.objects.select_related('created_by').get(pk=interaction_id)
+        participants = list(InteractionParticipant.objects.filter(pk__in=participant_ids))
+        send_project_invitations(interaction, participants)
+    except Exception:
+        logger.exception('Failed to send project invitations for interaction %s', interaction_id)
+    finally:
+        connections.close_all()
+
+
+def dispatch_project_invitations(interaction, participants):
+    """Отправляет приглашения вне потока запроса: SMTP не задерживает ответ.
+
+    Вызывается после коммита; фоновый поток перечитывает проект и участников
+    по id. С NOTIFICATION_EMAILS_ASYNC=False письма уходят сразу (тесты).
+    """
+    if getattr(settings, 'NOTIFICATION_EMAILS_ASYNC', True):
+        _get_executor().submit(
+            _send_project_invitations_in_background,
+            interaction.pk,
+            [participant.pk for participant in participants],
+        )
+    else:
+        send_project_invitations(interaction, participants)
+
+
+def recipient_has_chat_open(room_id, user_id):
+    """Открыт ли чат у получателя; при сбое кэша присутствия — False.
+
+    Недоступный Redis не должен терять уведомление: лучше лишнее письмо,
+    чем ни одного.
+    """
+    from chat import presence as chat_presence
+
+    try:
+        return chat_presence.is_present(room_id, user_id)
+    except Exception:
+        logger.exception('Failed to check chat presence of user %s in room %s', user_id, room_id)
+        return False
+
+
 def check_unread_chat_messages():
     """Проверяет непрочитанные сообщения в чате и отправляет уведомления через 5 минут"""
-    from chat.models import Message
+    from chat.models import ChatReadState, Message
     from datetime import timedelta
+    from django.db.models import F, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
     
-    # Находим сообщения, которые не прочитаны более 5 минут
+    # Находим сообщения, которые не прочитаны более 5 минут:
+    # id выше отметки прочтения собеседника отправителя
     five_minutes_ago = timezone.now() - timedelta(minutes=5)
+    recipient_read_up_to = ChatReadState.objects.filter(
+        room=OuterRef('room'),
+    ).exclude(
+        user=OuterRef('sender'),
+    ).values('last_read_message_id')[:1]
     
-    unread_messages = Message.objects.filter(
-        is_read=False,
+    unread_messages = Message.objects.annotate(
+        recipient_read_up_to=Coalesce(Subquery(recipient_read_up_to), 0),
+    ).filter(
+        id__gt=F('recipient_read_up_to'),
         timestamp__lte=five_minutes_ago
     ).select_related('room', 'sender', 'room__performer', 'room__client')
     
     for message in unread_messages:
         # Определяем получателя (не отправителя)
         recipient = message.room.client if message.sender == message.room.performer else message.room.performer
+
+        # Получатель сейчас в чате — сообщение он видит
+        if recipient_has_chat_open(message.room_id, recipient.pk):
+            continue
         
         # Проверяем, не отправляли ли уже уведомление для этого сообщения
         notification_exists = Notification.objects.filter(
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PerformersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'performers'
+
+    def ready(self):
+        import performers.signals  # Поддержка поискового индекса
@@ -0,0 +1,273 @@
+"""Автодополнение композиторов и произведений без обращения к БД.
+
+Индекс строится лениво в каждом процессе по уникальным кортежам
+(composer, work_title, category, role_or_part) из RepertoireItem и хранит:
+
+* отсортированный список начал слов — для коротких запросов (поиск по префиксу);
+* триграммы — для запросов от трёх символов (поиск подстроки).
+
+Сравнение нечувствительно к регистру и различию ё/е. Результаты ранжируются:
+совпадение с начала строки, затем с начала слова, затем внутри слова; при
+равенстве — по популярности (числу артистов с этим произведением).
+
+Индекс не перестраивается целиком при каждой правке репертуара. Сигналы
+RepertoireItem записывают значения до и после изменения в RepertoireChange,
+а процесс пересчитывает популярность только этих композиторов и
+произведений: свои изменения — при следующем запросе, изменения других
+процессов — прочитав свежие RepertoireChange не чаще раза в POLL_INTERVAL
+секунд. Процесс, не читавший журнал дольше CHANGE_RETENTION, строит индекс
+заново.
+"""
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .search import normalize_text
+
+INDEXED_FIELDS = ('composer', 'work_title', 'category', 'role_or_part')
+DEFAULT_LIMIT = 10
+POLL_INTERVAL = 5
+# Запас на транзакции, закоммиченные позже времени своей записи в журнал
+POLL_OVERLAP = timedelta(minutes=1)
+CHANGE_RETENTION = timedelta(days=1)
+
+
+def _trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TextIndex:
+    """Индекс подстрок над списком нормализованных ключей."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.trigrams = {}
+        words = []
+        for position, key in enumerate(keys):
+            for trigram in _trigrams(key):
+                self.trigrams.setdefault(trigram, set()).add(position)
+            for word in set(key.split()):
+                words.append((word, position))
+        words.sort()
+        self.words = words
+        self.word_keys = [word for word, _ in words]
+
+    def add(self, key):
+        position = len(self.keys)
+        self.keys.append(key)
+        for trigram in _trigrams(key):
+            self.trigrams.setdefault(trigram, set()).add(position)
+        for word in set(key.split()):
+            index = bisect_left(self.words, (word, position))
+            self.words.insert(index, (word, position))
+            self.word_keys.insert(index, word)
+        return position
+
+    def _word_prefix_matches(self, query):
+        matches = set()
+        start = bisect_left(self.word_keys, query)
+        for word, position in self.words[start:]:
+            if not word.startswith(query):
+                break
+            matches.add(position)
+        return matches
+
+    def search(self, query):
+        """Позиции ключей, содержащих query, с оценкой качества совпадения."""
+        if len(query) < 3:
+            # Для коротких запросов триграмм нет — ищем по началу слов
+            candidates = self._word_prefix_matches(query.split()[0]) if query.split() else set()
+        else:
+            trigram_sets = [self.trigrams.get(trigram) for trigram in _trigrams(query)]
+            if not all(trigram_sets):
+                return []
+            candidates = set.intersection(*sorted(trigram_sets, key=len))
+
+        results = []
+        for position in candidates:
+            key = self.keys[position]
+            if query not in key:
+                continue
+            if key.startswith(query):
+                quality = 0
+            elif f' {query}' in key:
+                quality = 1
+            else:
+                quality = 2
+            results.append((quality, position))
+        return results
+
+
+class RepertoireAutocomplete:
+    def __init__(self, composers, works):
+        # composers: [[composer, popularity]], works: [[dict, popularity]];
+        # запись с нулевой популярностью означает, что ключ исчез из репертуара
+        self.composers = [list(entry) for entry in composers]
+        self.works = [list(entry) for entry in works]
+        self.composer_index = TextIndex([normalize_text(name) for name, _ in self.composers])
+        self.work_index = TextIndex([normalize_text(work['work_title']) for work, _ in self.works])
+        self.work_composer_keys = [normalize_text(work['composer']) for work, _ in self.works]
+        self.composer_positions = {name: position for position, (name, _) in enumerate(self.composers)}
+        self.work_positions = {_work_key(work): position for position, (work, _) in enumerate(self.works)}
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_database(cls):
+        from .models import RepertoireItem
+
+        composers = [
+            (row['composer'], row['popularity'])
+            for row in RepertoireItem.objects.exclude(composer='').values('composer').annotate(
+                popularity=Count('performer_id', distinct=True)
+            ).order_by()
+        ]
+        works = [
+            ({field: row[field] for field in INDEXED_FIELDS}, row['popularity'])
+            for row in RepertoireItem.objects.exclude(work_title='').values(*INDEXED_FIELDS).annotate(
+                popularity=Count('performer_id', distinct=True)
+            ).order_by()
+        ]
+        return cls(composers, works)
+
+    def refresh(self, values):
+        """Пересчитывает популярность композиторов и произведений из values.
+
+        values — кортежи значений INDEXED_FIELDS; запрашиваются только эти ключи.
+        """
+        from .models import RepertoireItem
+
+        composers = {value[0] for value in values if value[0]}
+        works = {value for value in values if value[1]}
+        composer_counts = {}
+        if composers:
+            composer_counts = dict(
+                RepertoireItem.objects.filter(composer__in=composers).values('composer').annotate(
+                    popularity=Count('performer_id', distinct=True)
+                ).order_by().values_list('composer', 'popularity')
+            )
+        work_counts = {}
+        if works:
+            condition = Q()
+            for work in works:
+                condition |= Q(**dict(zip(INDEXED_FIELDS, work)))
+            work_counts = {
+                tuple(row[field] for field in INDEXED_FIELDS): row['popularity']
+                for row in RepertoireItem.objects.filter(condition).values(*INDEXED_FIELDS).annotate(
+                    popularity=Count('performer_id', distinct=True)
+                ).order_by()
+            }
+
+        with self.lock:
+            for name in composers:
+                position = self.composer_positions.get(name)
+                if position is None:
+                    position = self.composer_index.add(normalize_text(name))
+                    self.composers.append([name, 0])
+                    self.composer_positions[name] = position
+                self.composers[position][1] = composer_counts.get(name, 0)
+            for work in works:
+                position = self.work_positions.get(work)
+                if position is None:
+                    fields = dict(zip(INDEXED_FIELDS, work))
+                    position = self.work_index.add(normalize_text(fields['work_title']))
+                    self.works.append([fields, 0])
+                    self.work_composer_keys.append(normalize_text(fields['composer']))
+                    self.work_positions[work] = position
+                self.works[position][1] = work_counts.get(work, 0)
+
+    def _rank(self, matches, entries, keys):
+        matches = [match for match in matches if entries[match[1]][1] > 0]
+        return sorted(matches, key=lambda match: (match[0], -entries[match[1]][1], keys[match[1]]))
+
+    def composers_for(self, query, limit=DEFAULT_LIMIT):
+        query = normalize_text(query).strip()
+        if not query:
+            return []
+        with self.lock:
+            matches = self._rank(self.composer_index.search(query), self.composers, self.composer_index.keys)
+            return [self.composers[position][0] for _, position in matches[:limit]]
+
+    def works_for(self, query, composer='', limit=DEFAULT_LIMIT):
+        query = normalize_text(query).strip()
+        if not query:
+            return []
+        composer = normalize_text(composer).strip()
+        with self.lock:
+            matches = self.work_index.search(query)
+            if composer:
+                matches = [match for match in matches if composer in self.work_composer_keys[match[1]]]
+            matches = self._rank(matches, self.works, self.work_index.keys)
+            return [dict(self.works[position][0]) for _, position in matches[:limit]]
+
+
+def _work_key(work):
+    return tuple(work[field] for field in INDEXED_FIELDS)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_polled_at = None
+_next_poll = 0.0
+_pending = set()
+
+
+def record_change(*values):
+    """Записывает изменённые значения RepertoireItem (кортежи INDEXED_FIELDS).
+
+    Свой процесс пересчитает их при следующем запросе, остальные — прочитав
+    журнал RepertoireChange.
+    """
+    from .models import RepertoireChange
+
+    values = {value for value in values if value is not None and (value[0] or value[1])}
+    if not values:
+        return
+    RepertoireChange.objects.bulk_create([
+        RepertoireChange(**dict(zip(INDEXED_FIELDS, value))) for value in values
+    ])
+    RepertoireChange.objects.filter(created_at__lt=timezone.now() - CHANGE_RETENTION).delete()
+    with _engine_lock:
+        _pending.update(values)
+
+
+def _poll_changes():
+    """Значения из журнала, изменённые с прошлого опроса (с запасом POLL_OVERLAP)."""
+    global _polled_at
+    from .models import RepertoireChange
+
+    now = timezone.now()
+    since, _polled_at = _polled_at, now
+    return set(
+        RepertoireChange.objects.filter(created_at__gte=since - POLL_OVERLAP).values_list(*INDEXED_FIELDS)
+    )
+
+
+def get_engine():
+    global _engine, _polled_at, _next_poll
+    with _engine_lock:
+        if _engine is None or _polled_at is None or timezone.now() - _polled_at > CHANGE_RETENTION:
+            _polled_at = timezone.now()
+            _next_poll = time.monotonic() + POLL_INTERVAL
+            _pending.clear()
+            _engine = RepertoireAutocomplete.from_database()
+            return _engine
+        values = set(_pending)
+        _pending.clear()
+        if time.monotonic() >= _next_poll:
+            _next_poll = time.monotonic() + POLL_INTERVAL
+            values |= _poll_changes()
+        if values:
+            _engine.refresh(values)
+        return _engine
+
+
+def reset_engine():
+    """Сбрасывает индекс процесса: следующий запрос построит его заново."""
+    global _engine
+    with _engine_lock:
+        _engine = None
+        _pending.clear()
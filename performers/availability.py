@@ -0,0 +1,297 @@
+"""Битовый индекс доступности артистов.
+
+Для каждого артиста и года хранится PerformerAvailabilityIndex.free_days —
+битовая маска дней года (бит N = N-й день года, считая с нуля), в которой
+единица означает «свободен». Маска уже учитывает calendar_mode:
+
+* mark_unavailable — свободен в любой день, кроме отмеченных как «Занят»;
+* mark_available — свободен только в дни со статусом «Доступен»/«Готов подумать».
+
+Если строки индекса за год нет, действует значение по умолчанию для режима:
+все дни свободны для mark_unavailable и ни одного — для mark_available.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db.models import Q
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+MAX_RANGE_DAYS = 366
+
+_state = threading.local()
+
+FREE_STATUSES_MARK_AVAILABLE = ('available', 'maybe')
+BUSY_STATUSES_MARK_UNAVAILABLE = ('unavailable',)
+
+
+def _day_bit(day):
+    return 1 << (day.timetuple().tm_yday - 1)
+
+
+def _days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def _full_mask(year):
+    return (1 << _days_in_year(year)) - 1
+
+
+def mask_to_bytes(mask):
+    return mask.to_bytes(46, 'little')
+
+
+def mask_from_bytes(value):
+    return int.from_bytes(bytes(value), 'little')
+
+
+def compute_year_mask(calendar_mode, year, entries):
+    """Строит маску свободных дней года по парам (date, status)."""
+    if calendar_mode == 'mark_available':
+        mask = 0
+        for day, status in entries:
+            if status in FREE_STATUSES_MARK_AVAILABLE:
+                mask |= _day_bit(day)
+        return mask
+
+    mask = _full_mask(year)
+    for day, status in entries:
+        if status in BUSY_STATUSES_MARK_UNAVAILABLE:
+            mask &= ~_day_bit(day)
+    return mask
+
+
+def refresh_availability_index(performer, years):
+    """Пересчитывает строки индекса артиста за указанные годы."""
+    from .models import PerformerAvailability, PerformerAvailabilityIndex
+
+    years = set(years)
+    if not years:
+        return
+
+    entries_by_year = {year: [] for year in years}
+    availabilities = PerformerAvailability.objects.filter(
+        performer=performer,
+        date__gte=date(min(years), 1, 1),
+        date__lte=date(max(years), 12, 31),
+    ).values_list('date', 'status')
+    for day, status in availabilities:
+        if day.year in entries_by_year:
+            entries_by_year[day.year].append((day, status))
+
+    empty_years = [year for year, entries in entries_by_year.items() if not entries]
+    if empty_years:
+        PerformerAvailabilityIndex.objects.filter(performer=performer, year__in=empty_years).delete()
+
+    rows = [
+        PerformerAvailabilityIndex(
+            performer=performer,
+            year=year,
+            free_days=mask_to_bytes(compute_year_mask(performer.calendar_mode, year, entries)),
+        )
+        for year, entries in entries_by_year.items()
+        if entries
+    ]
+    if rows:
+        PerformerAvailabilityIndex.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['performer', 'year'],
+            update_fields=['free_days', 'updated_at'],
+        )
+
+
+def rebuild_performer_availability_index(performer):
+    """Полностью пересобирает индекс артиста (например, после смены calendar_mode)."""
+    from .models import PerformerAvailability, PerformerAvailabilityIndex
+
+    years = set(
+        PerformerAvailability.objects.filter(performer=performer).values_list('date__year', flat=True)
+    )
+    PerformerAvailabilityIndex.objects.filter(performer=performer).exclude(year__in=years).delete()
+    refresh_availability_index(performer, years)
+
+
+def date_range(start, end):
+    """Список дат от start до end включительно (не длиннее MAX_RANGE_DAYS)."""
+    if end is None or end < start:
+        end = start
+    end = min(end, start + timedelta(days=MAX_RANGE_DAYS - 1))
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def free_performers_filter(dates, match=MATCH_ALL):
+    """Возвращает Q-фильтр артистов, свободных на все (или любую) из дат.
+
+    Все строки индекса за нужные годы читаются одним запросом, проверка
+    выполняется побитовыми операциями над масками.
+    """
+    from .models import PerformerAvailabilityIndex
+
+    dates = sorted(set(dates))
+    if not dates:
+        return Q()
+
+    requested = {}
+    for day in dates:
+        requested[day.year] = requested.get(day.year, 0) | _day_bit(day)
+
+    rows = PerformerAvailabilityIndex.objects.filter(year__in=requested.keys()).values_list(
+        'performer_id', 'performer__calendar_mode', 'year', 'free_days'
+    )
+    masks = {}
+    modes = {}
+    for performer_id, calendar_mode, year, free_days in rows:
+        modes[performer_id] = calendar_mode
+        masks.setdefault(performer_id, {})[year] = mask_from_bytes(free_days)
+
+    free_ids = []
+    for performer_id, year_masks in masks.items():
+        default_mask = -1 if modes[performer_id] != 'mark_available' else 0
+        hits = [
+            (year_masks.get(year, default_mask) & wanted, wanted)
+            for year, wanted in requested.items()
+        ]
+        if match == MATCH_ANY:
+            is_free = any(hit for hit, _ in hits)
+        else:
+            is_free = all(hit == wanted for hit, wanted in hits)
+        if is_free:
+            free_ids.append(performer_id)
+
+    # Артисты без строк индекса за эти годы получают значение по умолчанию режима
+    return (Q(calendar_mode='mark_unavailable') & ~Q(id__in=list(masks))) | Q(id__in=free_ids)
+
+
+STATUS_CODES = {
+    'available': 'a',
+    'unavailable': 'u',
+    'maybe': 'm',
+}
+NO_STATUS_CODE = '.'
+
+
+def encode_status_runs(start, end, statuses):
+    """Кодирует статусы дней [start, end] как RLE-строку.
+
+    statuses — словарь {date: status}. Каждый отрезок записывается как
+    «длина + код»: a — доступен, u — занят, m — готов подумать, . — нет отметки.
+    Например, «3.1u27.» — занят только 4-й день.
+    """
+    runs = []
+    current, length = None, 0
+    for offset in range((end - start).days + 1):
+        code = STATUS_CODES.get(statuses.get(start + timedelta(days=offset)), NO_STATUS_CODE)
+        if code == current:
+            length += 1
+            continue
+        if current is not None:
+            runs.append(f'{length}{current}')
+        current, length = code, 1
+    if current is not None:
+        runs.append(f'{length}{current}')
+    return ''.join(runs)
+
+
+def expand_operation(operation):
+    """Даты одной операции массового редактирования.
+
+    Операция задаёт либо список dates, либо диапазон start..end с необязательным
+    правилом повторения weekdays (0 — понедельник, 6 — воскресенье).
+    """
+    if 'dates' in operation:
+        return [date.fromisoformat(value) for value in operation['dates']]
+
+    start = date.fromisoformat(operation['start'])
+    end = date.fromisoformat(operation.get('end') or operation['start'])
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError('Invalid date range')
+    days = date_range(start, end)
+    weekdays = operation.get('weekdays')
+    if weekdays:
+        weekdays = {int(weekday) for weekday in weekdays}
+        days = [day for day in days if day.weekday() in weekdays]
+    return days
+
+
+@contextmanager
+def availability_index_batched():
+    """Внутри блока сигналы отметок не пересчитывают индекс построчно.
+
+    Вызывающий код сам обновляет индекс один раз после массовых изменений.
+    """
+    previous = getattr(_state, 'index_batched', False)
+    _state.index_batched = True
+    try:
+        yield
+    finally:
+        _state.index_batched = previous
+
+
+def index_is_batched():
+    return getattr(_state, 'index_batched', False)
+
+
+def apply_bulk_availability(performer, operations):
+    """Применяет операции к календарю артиста и возвращает изменения по месяцам.
+
+    Более поздние операции перекрывают более ранние для тех же дат. Все
+    изменения записываются одним upsert и одним delete() в транзакции, а
+    индекс доступности пересчитывается один раз.
+    """
+    from django.db import transaction
+
+    from .models import PerformerAvailability
+
+    valid_statuses = dict(PerformerAvailability.STATUS_CHOICES)
+    target = {}
+    for operation in operations:
+        status = operation.get('status') or 'none'
+        if status != 'none' and status not in valid_statuses:
+            raise ValueError(f'Invalid status: {status}')
+        notes = operation.get('notes', '')
+        for day in expand_operation(operation):
+            target[day] = (None, '') if status == 'none' else (status, notes)
+    if len(target) > MAX_RANGE_DAYS:
+        raise ValueError('Too many dates')
+    if not target:
+        return {}
+
+    with transaction.atomic():
+        before = dict(
+            PerformerAvailability.objects.select_for_update().filter(
+                performer=performer,
+                date__in=list(target),
+            ).values_list('date', 'status')
+        )
+        upserts = [
+            PerformerAvailability(performer=performer, date=day, status=status, notes=notes)
+            for day, (status, notes) in target.items()
+            if status is not None
+        ]
+        if upserts:
+            PerformerAvailability.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['performer', 'date'],
+                update_fields=['status', 'notes', 'updated_at'],
+            )
+        deletions = [day for day, (status, _) in target.items() if status is None and day in before]
+        if deletions:
+            # Сигналы удаления срабатывают, но индекс пересчитывается ниже одним вызовом
+            with availability_index_batched():
+                PerformerAvailability.objects.filter(performer=performer, date__in=deletions).delete()
+        refresh_availability_index(performer, {day.year for day in target})
+
+    changes = {}
+    for day in sorted(target):
+        old_status, new_status = before.get(day), target[day][0]
+        if old_status == new_status:
+            continue
+        changes.setdefault(day.strftime('%Y-%m'), []).append({
+            'date': day.isoformat(),
+            'before': old_status,
+            'after': new_status,
+        })
+    return changes
@@ -0,0 +1,72 @@
+"""Кешированные словари фильтров каталога (типы голоса, инструменты).
+
+Словари и количество артистов по каждому значению считаются одним
+агрегирующим запросом и хранятся в кеше до изменения PerformerProfile
+(см. performers/signals.py), поэтому страница каталога не делает
+отдельных DISTINCT-запросов.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import PerformerProfile
+
+FACETS_CACHE_KEY = 'performers:facets:v1'
+FACETS_CACHE_TIMEOUT = 60 * 60
+FACET_FIELDS = ('performer_type', 'voice_type', 'instrument')
+
+VOICE_PERFORMER_TYPES = (PerformerProfile.PERFORMER_TYPE_VOCALIST,)
+INSTRUMENT_PERFORMER_TYPES = (
+    PerformerProfile.PERFORMER_TYPE_INSTRUMENTALIST,
+    PerformerProfile.PERFORMER_TYPE_CONCERTMASTER,
+)
+
+
+def _merge_options(default_values, counts):
+    """Значения по умолчанию, затем остальные встреченные — с количеством артистов."""
+    merged = dict.fromkeys(default_values, 0)
+    for value, count in counts.items():
+        merged[value] = merged.get(value, 0) + count
+    return [{'value': value, 'count': count} for value, count in merged.items()]
+
+
+def build_facets():
+    type_counts = {}
+    value_counts = {}
+    rows = PerformerProfile.objects.values(*FACET_FIELDS).annotate(total=Count('id')).order_by()
+    for row in rows:
+        performer_type = row['performer_type']
+        type_counts[performer_type] = type_counts.get(performer_type, 0) + row['total']
+        per_type = value_counts.setdefault(performer_type, {'voice_type': {}, 'instrument': {}})
+        for field in ('voice_type', 'instrument'):
+            value = row[field]
+            if value:
+                per_type[field][value] = per_type[field].get(value, 0) + row['total']
+
+    voice_counts = {}
+    for performer_type in VOICE_PERFORMER_TYPES:
+        for value, count in value_counts.get(performer_type, {}).get('voice_type', {}).items():
+            voice_counts[value] = voice_counts.get(value, 0) + count
+
+    instrument_counts = {}
+    for performer_type in INSTRUMENT_PERFORMER_TYPES:
+        for value, count in value_counts.get(performer_type, {}).get('instrument', {}).items():
+            instrument_counts[value] = instrument_counts.get(value, 0) + count
+
+    return {
+        'voice_types': _merge_options(PerformerProfile.DEFAULT_VOICE_TYPES, voice_counts),
+        'instruments': _merge_options(PerformerProfile.DEFAULT_INSTRUMENTS, instrument_counts),
+        'performer_type_counts': type_counts,
+        'counts_by_type': value_counts,
+    }
+
+
+def get_facets():
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        facets = build_facets()
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate_facets():
+    cache.delete(FACETS_CACHE_KEY)
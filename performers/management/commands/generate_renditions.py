@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from performers.models import ImageRendition, PerformerPhoto, PerformerProfile
+from performers.renditions import delete_renditions, generate_renditions
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии (WebP/JPEG) фотографий артистов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие копии')
+        parser.add_argument('--prune', action='store_true', help='Удалить копии фотографий, которых больше нет')
+
+    def handle(self, *args, **options):
+        sources = set(
+            PerformerProfile.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True)
+        )
+        sources.update(PerformerPhoto.objects.values_list('photo', flat=True))
+
+        existing = set(ImageRendition.objects.values_list('source_name', flat=True).distinct())
+        if options['prune']:
+            stale = existing - sources
+            for source_name in stale:
+                delete_renditions(source_name)
+            self.stdout.write(f'Удалено копий устаревших фото: {len(stale)}')
+
+        pending = sources if options['force'] else sources - existing
+        self.stdout.write(f'Фотографий к обработке: {len(pending)}')
+        failed = 0
+        for source_name in sorted(pending):
+            try:
+                generate_renditions(source_name)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{source_name}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, ошибок: {failed}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from performers.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс каталога музыкантов'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересборка поискового индекса...')
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано артистов: {count}'))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Копия на момент миграции: performers.search может меняться дальше
+FTS_TABLE = 'performers_search_fts'
+DOCUMENT_TABLE = 'performers_performersearchdocument'
+PROFILE_SEARCH_FIELDS = ('full_name', 'voice_type', 'instrument', 'bio', 'education')
+REPERTOIRE_SEARCH_FIELDS = ('composer', 'work_title', 'role_or_part')
+
+
+def compose_document(profile_values, repertoire_rows):
+    parts = [profile_values.get(field) for field in PROFILE_SEARCH_FIELDS]
+    for row in repertoire_rows:
+        parts.extend(row.get(field) for field in REPERTOIRE_SEARCH_FIELDS)
+    return ' '.join(part for part in parts if part).lower().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector '
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        )
+        schema_editor.execute(
+            f'CREATE INDEX performers_search_vector_gin ON {DOCUMENT_TABLE} USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def populate_search_documents(apps, schema_editor):
+    PerformerProfile = apps.get_model('performers', 'PerformerProfile')
+    RepertoireItem = apps.get_model('performers', 'RepertoireItem')
+    PerformerSearchDocument = apps.get_model('performers', 'PerformerSearchDocument')
+    is_sqlite = schema_editor.connection.vendor == 'sqlite'
+
+    for profile_values in PerformerProfile.objects.values('id', *PROFILE_SEARCH_FIELDS).iterator():
+        performer_id = profile_values['id']
+        repertoire_rows = RepertoireItem.objects.filter(performer_id=performer_id).values(*REPERTOIRE_SEARCH_FIELDS)
+        content = compose_document(profile_values, repertoire_rows)
+        PerformerSearchDocument.objects.create(performer_id=performer_id, content=content)
+        if is_sqlite and content:
+            schema_editor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)',
+                [performer_id, content],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0010_alter_performerprofile_performer_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformerSearchDocument',
+            fields=[
+                ('performer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='performers.performerprofile')),
+                ('content', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
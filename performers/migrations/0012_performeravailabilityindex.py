@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:07
+
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Копия на момент миграции: performers.availability может меняться дальше
+FREE_STATUSES_MARK_AVAILABLE = ('available', 'maybe')
+BUSY_STATUSES_MARK_UNAVAILABLE = ('unavailable',)
+
+
+def day_bit(day):
+    return 1 << (day.timetuple().tm_yday - 1)
+
+
+def mask_to_bytes(mask):
+    return mask.to_bytes(46, 'little')
+
+
+def compute_year_mask(calendar_mode, year, entries):
+    if calendar_mode == 'mark_available':
+        mask = 0
+        for day, status in entries:
+            if status in FREE_STATUSES_MARK_AVAILABLE:
+                mask |= day_bit(day)
+        return mask
+
+    mask = (1 << (date(year + 1, 1, 1) - date(year, 1, 1)).days) - 1
+    for day, status in entries:
+        if status in BUSY_STATUSES_MARK_UNAVAILABLE:
+            mask &= ~day_bit(day)
+    return mask
+
+
+def populate_availability_index(apps, schema_editor):
+    PerformerAvailability = apps.get_model('performers', 'PerformerAvailability')
+    PerformerAvailabilityIndex = apps.get_model('performers', 'PerformerAvailabilityIndex')
+
+    grouped = {}
+    rows = PerformerAvailability.objects.values_list(
+        'performer_id', 'performer__calendar_mode', 'date', 'status'
+    ).iterator()
+    for performer_id, calendar_mode, day, status in rows:
+        key = (performer_id, calendar_mode, day.year)
+        grouped.setdefault(key, []).append((day, status))
+
+    PerformerAvailabilityIndex.objects.bulk_create([
+        PerformerAvailabilityIndex(
+            performer_id=performer_id,
+            year=year,
+            free_days=mask_to_bytes(compute_year_mask(calendar_mode, year, entries)),
+        )
+        for (performer_id, calendar_mode, year), entries in grouped.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0011_performersearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformerAvailabilityIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('free_days', models.BinaryField(max_length=46)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('performer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_index', to='performers.performerprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year'], name='performers__year_ce3e6b_idx')],
+                'unique_together': {('performer', 'year')},
+            },
+        ),
+        migrations.RunPython(populate_availability_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0012_performeravailabilityindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(help_text='Путь оригинала в хранилище', max_length=255)),
+                ('variant', models.CharField(choices=[('thumb', 'Миниатюра галереи'), ('card', 'Карточка каталога'), ('hero', 'Hero-секция'), ('full', 'Полный размер')], max_length=10)),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=10)),
+                ('file', models.ImageField(max_length=255, upload_to='renditions/')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source_name'], name='performers__source__cbfa5f_idx')],
+                'unique_together': {('source_name', 'variant', 'format')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0013_imagerendition'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='performerprofile',
+            index=models.Index(fields=['full_name', 'id'], name='performers__full_na_365062_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performerprofile',
+            index=models.Index(fields=['voice_type'], name='performers__voice_t_a1c68f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performerprofile',
+            index=models.Index(fields=['instrument'], name='performers__instrum_4b22dc_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18
+
+from django.db import migrations
+
+# Поиск артистов по началу имени, типа голоса и инструмента
+# (interactions/pickers.py).
+TABLE = 'performers_performerprofile'
+PREFIX_SEARCH_FIELDS = ['full_name', 'voice_type', 'instrument']
+
+
+def _index_name(field):
+    return f'{TABLE}_{field}_prefix'
+
+
+def create_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    quote = schema_editor.quote_name
+    for field in PREFIX_SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} (UPPER({quote(field)}) varchar_pattern_ops)'
+            )
+        elif vendor == 'sqlite':
+            schema_editor.execute(
+                f'CREATE INDEX {quote(_index_name(field))} ON {quote(TABLE)} ({quote(field)} COLLATE NOCASE)'
+            )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    for field in PREFIX_SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(_index_name(field))}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0014_performerprofile_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='performerprofile',
+            name='performers__voice_t_a1c68f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='performerprofile',
+            name='performers__instrum_4b22dc_idx',
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('performers', '0015_performerprofile_prefix_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepertoireChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('composer', models.CharField(blank=True, max_length=200)),
+                ('work_title', models.CharField(blank=True, max_length=300)),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('role_or_part', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -93,6 +93,13 @@ class PerformerProfile(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Индексы для поиска по началу строки (istartswith) создаются
+        # миграцией prefix_search_indexes: они зависят от СУБД
+        indexes = [
+            models.Index(fields=['full_name', 'id']),
+        ]
+
     def clean(self):
         # Обнуляем несоответствующие специализации поля
         if self.performer_type == self.PERFORMER_TYPE_VOCALIST:
@@ -103,6 +110,24 @@ class PerformerProfile(models.Model):
             self.voice_type = ''
             self.instrument = ''
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'calendar_mode' in instance.__dict__:
+            # Сигнал rebuild_availability_index_on_mode_change сравнивает с ним без запроса
+            instance._loaded_calendar_mode = instance.calendar_mode
+        if 'photo' in instance.__dict__:
+            # По нему schedule_profile_photo_renditions удаляет копии заменённого фото
+            instance._loaded_photo = instance.photo.name or ''
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'calendar_mode' in fields:
+            self._loaded_calendar_mode = self.calendar_mode
+        if fields is None or 'photo' in fields:
+            self._loaded_photo = self.photo.name or ''
+
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
@@ -149,6 +174,24 @@ class PerformerAvailability(models.Model):
         return f"{self.performer.full_name} - {self.date} - {self.get_status_display()}"
 
 
+class PerformerAvailabilityIndex(models.Model):
+    """Маска свободных дней артиста за год (см. performers/availability.py)"""
+
+    performer = models.ForeignKey(PerformerProfile, on_delete=models.CASCADE, related_name='availability_index')
+    year = models.PositiveSmallIntegerField()
+    free_days = models.BinaryField(max_length=46)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['performer', 'year']
+        indexes = [
+            models.Index(fields=['year']),
+        ]
+
+    def __str__(self):
+        return f"{self.performer_id} - {self.year}"
+
+
 class PerformerPhoto(models.Model):
     performer = models.ForeignKey(PerformerProfile, on_delete=models.CASCADE, related_name='photos')
     photo = models.ImageField(upload_to='performers/gallery/')
@@ -228,4 +271,100 @@ class RepertoireItem(models.Model):
     
     def __str__(self):
         role_part = f" ({self.role_or_part})" if self.role_or_part else ""
-        return f"{self.composer} - {self.work_title}{role_part}"
\ No newline at end of file
+        return f"{self.composer} - {self.work_title}{role_part}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_autocomplete_values = instance.autocomplete_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._loaded_autocomplete_values = self.autocomplete_values()
+
+    def autocomplete_values(self):
+        """Значения полей автодополнения; None, если какое-то поле не загружено."""
+        from .autocomplete import INDEXED_FIELDS
+
+        if any(field not in self.__dict__ for field in INDEXED_FIELDS):
+            return None
+        return tuple(getattr(self, field) for field in INDEXED_FIELDS)
+
+
+class RepertoireChange(models.Model):
+    """Изменённые ключи автодополнения репертуара (см. performers/autocomplete.py).
+
+    Сигналы RepertoireItem записывают значения до и после изменения; каждый
+    процесс периодически читает свежие записи и пересчитывает только эти
+    композиторы и произведения.
+    """
+
+    composer = models.CharField(max_length=200, blank=True)
+    work_title = models.CharField(max_length=300, blank=True)
+    category = models.CharField(max_length=50, blank=True)
+    role_or_part = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.composer} - {self.work_title}"
+
+
+class PerformerSearchDocument(models.Model):
+    """Поисковый документ артиста: текст профиля и репертуара.
+
+    Физический индекс зависит от СУБД: в PostgreSQL это сгенерированная
+    колонка tsvector с GIN-индексом, в SQLite — виртуальная таблица FTS5
+    (см. performers/search.py и миграцию 0011).
+    """
+
+    performer = models.OneToOneField(
+        PerformerProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+    )
+    content = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for performer {self.performer_id}"
+
+
+class ImageRendition(models.Model):
+    """Уменьшенная копия загруженного фото (см. performers/renditions.py)"""
+
+    VARIANT_THUMB = 'thumb'
+    VARIANT_CARD = 'card'
+    VARIANT_HERO = 'hero'
+    VARIANT_FULL = 'full'
+    VARIANT_CHOICES = [
+        (VARIANT_THUMB, 'Миниатюра галереи'),
+        (VARIANT_CARD, 'Карточка каталога'),
+        (VARIANT_HERO, 'Hero-секция'),
+        (VARIANT_FULL, 'Полный размер'),
+    ]
+
+    FORMAT_WEBP = 'webp'
+    FORMAT_JPEG = 'jpeg'
+    FORMAT_CHOICES = [
+        (FORMAT_WEBP, 'WebP'),
+        (FORMAT_JPEG, 'JPEG'),
+    ]
+
+    source_name = models.CharField(max_length=255, help_text='Путь оригинала в хранилище')
+    variant = models.CharField(max_length=10, choices=VARIANT_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    file = models.ImageField(upload_to='renditions/', max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['source_name', 'variant', 'format']
+        indexes = [
+            models.Index(fields=['source_name']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_name} - {self.variant} ({self.format}, {self.width}×{self.height})"
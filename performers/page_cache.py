@@ -0,0 +1,38 @@
+"""Кеширование фрагментов страницы артиста (performer_detail).
+
+Фрагменты, не зависящие от посетителя (фото, вкладки профиля, галерея),
+кешируются тегом {% cache %} с версией артиста в ключе. Сигналы
+PerformerProfile, PerformerPhoto, PerformerVideo и RepertoireItem меняют
+версию, поэтому устаревшие фрагменты просто перестают читаться и
+вытесняются по таймауту. Кнопки чата и календаря рендерятся на каждый запрос.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+DETAIL_FRAGMENTS = ('performer_detail_photo', 'performer_detail_tabs', 'performer_detail_media')
+
+
+def _version_key(performer_id):
+    return f'performers:detail:version:{performer_id}'
+
+
+def detail_version(performer_id):
+    version = cache.get(_version_key(performer_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_version_key(performer_id), version, None):
+            version = cache.get(_version_key(performer_id), version)
+    return version
+
+
+def bump_detail_version(performer_id):
+    cache.set(_version_key(performer_id), uuid.uuid4().hex, None)
+
+
+def fragments_cached(performer_id, version):
+    """True, если все фрагменты страницы артиста уже лежат в кеше."""
+    keys = [make_template_fragment_key(name, [performer_id, version]) for name in DETAIL_FRAGMENTS]
+    return len(cache.get_many(keys)) == len(keys)
@@ -0,0 +1,185 @@
+"""Уменьшенные копии фотографий артистов.
+
+После загрузки PerformerProfile.photo или PerformerPhoto.photo в фоновом
+потоке (после коммита транзакции) создаются варианты thumb/card/hero/full
+в форматах WebP и JPEG. Копии повёрнуты по EXIF-ориентации, а сами
+EXIF-данные удаляются. Размеры каждого варианта записываются в ImageRendition.
+
+Шаблонный тег {% rendition_img %} (performers/templatetags/image_renditions.py)
+выводит <picture> с srcset. Пока копии не готовы, используется оригинал.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Максимальные размеры (ширина, высота); пропорции сохраняются, увеличения нет
+RENDITION_SIZES = {
+    'thumb': (320, 320),
+    'card': (480, 640),
+    'hero': (1600, 1200),
+    'full': (2048, 2048),
+}
+RENDITION_ORDER = ('thumb', 'card', 'hero', 'full')
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Отправляется после создания копий: kwargs source_name
+renditions_generated = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2),
+                thread_name_prefix='image-renditions',
+            )
+    return _executor
+
+
+def _prepare_image(source):
+    from PIL import Image, ImageOps
+
+    image = Image.open(source)
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    # EXIF (в том числе геометки) в копии не переносим
+    image.info = {}
+    return image
+
+
+def generate_renditions(source_name):
+    """Создаёт (или пересоздаёт) все варианты для файла source_name."""
+    from PIL import Image
+
+    from .models import ImageRendition
+
+    with default_storage.open(source_name, 'rb') as source:
+        original = _prepare_image(source)
+
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    created = []
+    try:
+        for variant in RENDITION_ORDER:
+            image = original.copy()
+            image.thumbnail(RENDITION_SIZES[variant], Image.Resampling.LANCZOS)
+            for format_code, (pil_format, extension, options) in RENDITION_FORMATS.items():
+                buffer = BytesIO()
+                image.save(buffer, pil_format, **options)
+                rendition = ImageRendition(
+                    source_name=source_name,
+                    variant=variant,
+                    format=format_code,
+                    width=image.width,
+                    height=image.height,
+                )
+                created.append(rendition)
+                rendition.file.save(f'{stem}_{variant}.{extension}', ContentFile(buffer.getvalue()), save=False)
+        _replace_rendition_rows(source_name, created)
+    except Exception:
+        # Строки не записаны — файлы этого запуска больше никому не нужны
+        for rendition in created:
+            if rendition.file:
+                rendition.file.delete(save=False)
+        raise
+    renditions_generated.send(sender=ImageRendition, source_name=source_name)
+    return created
+
+
+@transaction.atomic
+def _replace_rendition_rows(source_name, created):
+    """Заменяет строки копий source_name на created.
+
+    Строка фото блокируется, поэтому два запуска для одного файла меняют
+    строки по очереди: второй удаляет копии первого, а не упирается в
+    unique_together. Файлы прежних копий удаляются после коммита.
+    """
+    from .models import ImageRendition, PerformerPhoto, PerformerProfile
+
+    list(PerformerProfile.objects.select_for_update().filter(photo=source_name).values_list('pk', flat=True))
+    list(PerformerPhoto.objects.select_for_update().filter(photo=source_name).values_list('pk', flat=True))
+    previous = list(ImageRendition.objects.filter(source_name=source_name))
+    if previous:
+        ImageRendition.objects.filter(id__in=[rendition.id for rendition in previous]).delete()
+    ImageRendition.objects.bulk_create(created)
+
+    def delete_previous_files():
+        for rendition in previous:
+            rendition.file.delete(save=False)
+
+    transaction.on_commit(delete_previous_files)
+
+
+def _generate_in_background(source_name):
+    try:
+        generate_renditions(source_name)
+    except Exception:
+        logger.exception('Failed to generate renditions for %s', source_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(source_name):
+    """Ставит генерацию копий в очередь после коммита текущей транзакции."""
+    if not source_name:
+        return
+    if getattr(settings, 'IMAGE_RENDITIONS_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, source_name))
+    else:
+        transaction.on_commit(lambda: generate_renditions(source_name))
+
+
+def delete_renditions(source_name):
+    from .models import ImageRendition
+
+    renditions = list(ImageRendition.objects.filter(source_name=source_name))
+    for rendition in renditions:
+        rendition.file.delete(save=False)
+    if renditions:
+        ImageRendition.objects.filter(id__in=[rendition.id for rendition in renditions]).delete()
+
+
+def attach_renditions(field_files):
+    """Загружает копии для списка FieldFile одним запросом.
+
+    Результат сохраняется в атрибуте _renditions каждого FieldFile, его
+    использует тег rendition_img, не делая отдельных запросов.
+    """
+    from .models import ImageRendition
+
+    field_files = [field_file for field_file in field_files if field_file]
+    if not field_files:
+        return
+    grouped = {field_file.name: {} for field_file in field_files}
+    for rendition in ImageRendition.objects.filter(source_name__in=list(grouped)):
+        grouped[rendition.source_name].setdefault(rendition.variant, {})[rendition.format] = rendition
+    for field_file in field_files:
+        field_file._renditions = grouped[field_file.name]
+
+
+def get_renditions(field_file):
+    if not hasattr(field_file, '_renditions'):
+        attach_renditions([field_file])
+    return getattr(field_file, '_renditions', {})
@@ -0,0 +1,149 @@
+"""Полнотекстовый поиск по каталогу музыкантов.
+
+Для каждого PerformerProfile поддерживается PerformerSearchDocument с текстом
+профиля и всего репертуара. Индекс над документом зависит от СУБД:
+
+* PostgreSQL — сгенерированная колонка ``search_vector`` (tsvector) с GIN-индексом;
+* SQLite — виртуальная таблица FTS5 ``performers_search_fts`` (rowid = performer_id).
+
+Совпадения и релевантность подставляются в запрос каталога подзапросами
+(search_condition), поэтому сортировка, фильтры и пагинация работают по всем
+совпадениям. На остальных СУБД search_condition возвращает None, и
+вызывающий код использует прежний фильтр icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'performers_search_fts'
+DOCUMENT_TABLE = 'performers_performersearchdocument'
+PROFILE_TABLE = 'performers_performerprofile'
+
+PROFILE_SEARCH_FIELDS = ('full_name', 'voice_type', 'instrument', 'bio', 'education')
+REPERTOIRE_SEARCH_FIELDS = ('composer', 'work_title', 'role_or_part')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_text(value):
+    """Приводит текст к виду индекса: нижний регистр, ё → е."""
+    return (value or '').lower().replace('ё', 'е')
+
+
+def compose_document(profile_values, repertoire_rows):
+    """Собирает текст документа из значений профиля и строк репертуара."""
+    parts = [profile_values.get(field) for field in PROFILE_SEARCH_FIELDS]
+    for row in repertoire_rows:
+        parts.extend(row.get(field) for field in REPERTOIRE_SEARCH_FIELDS)
+    return normalize_text(' '.join(part for part in parts if part))
+
+
+def search_backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        return 'sqlite'
+    return None
+
+
+def _write_fts_row(cursor, performer_id, content):
+    cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [performer_id])
+    if content:
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)',
+            [performer_id, content],
+        )
+
+
+def refresh_performer_document(performer_id):
+    """Пересобирает поисковый документ одного артиста."""
+    from .models import PerformerProfile, PerformerSearchDocument, RepertoireItem
+
+    profile_values = PerformerProfile.objects.filter(id=performer_id).values(*PROFILE_SEARCH_FIELDS).first()
+    if profile_values is None:
+        remove_performer_document(performer_id)
+        return
+
+    repertoire_rows = RepertoireItem.objects.filter(performer_id=performer_id).values(*REPERTOIRE_SEARCH_FIELDS)
+    content = compose_document(profile_values, repertoire_rows)
+    PerformerSearchDocument.objects.update_or_create(
+        performer_id=performer_id,
+        defaults={'content': content},
+    )
+    if search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            _write_fts_row(cursor, performer_id, content)
+
+
+def remove_performer_document(performer_id):
+    """Удаляет документ артиста (строка модели удаляется каскадом)."""
+    if search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [performer_id])
+
+
+def query_tokens(query):
+    return _TOKEN_RE.findall(normalize_text(query))
+
+
+def _postgres_query(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def _sqlite_match(tokens):
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_condition(query):
+    """Условие и выражение релевантности для QuerySet PerformerProfile.
+
+    Возвращает (Q, выражение): по выражению сортируют по возрастанию —
+    меньше значит релевантнее. None означает, что индекс на этой СУБД
+    недоступен.
+    """
+    backend = search_backend()
+    if backend is None:
+        return None
+
+    tokens = query_tokens(query)
+    if not tokens:
+        return Q(pk__in=[]), RawSQL('0', [], output_field=FloatField())
+
+    if backend == 'postgresql':
+        ts_query = _postgres_query(tokens)
+        matches = RawSQL(
+            f"SELECT performer_id FROM {DOCUMENT_TABLE} WHERE search_vector @@ to_tsquery('simple', %s)",
+            [ts_query],
+        )
+        rank = RawSQL(
+            f"SELECT -ts_rank(search_vector, to_tsquery('simple', %s)) FROM {DOCUMENT_TABLE} "
+            f'WHERE performer_id = "{PROFILE_TABLE}"."id"',
+            [ts_query],
+            output_field=FloatField(),
+        )
+    else:
+        match = _sqlite_match(tokens)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{PROFILE_TABLE}"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+    return Q(pk__in=matches), rank
+
+
+def rebuild_search_index():
+    """Полностью пересобирает документы всех артистов."""
+    from .models import PerformerProfile
+
+    if search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    count = 0
+    for performer_id in PerformerProfile.objects.values_list('id', flat=True).iterator():
+        refresh_performer_document(performer_id)
+        count += 1
+    return count
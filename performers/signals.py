@@ -0,0 +1,170 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, availability, facets, page_cache, renditions, search
+from .models import (
+    ImageRendition,
+    PerformerAvailability,
+    PerformerPhoto,
+    PerformerProfile,
+    PerformerVideo,
+    RepertoireItem,
+)
+
+
+@receiver(post_save, sender=PerformerProfile)
+def refresh_search_document_on_profile_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Обновляет поисковый документ, если изменились индексируемые поля профиля."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(search.PROFILE_SEARCH_FIELDS):
+        return
+    search.refresh_performer_document(instance.pk)
+
+
+@receiver(post_delete, sender=PerformerProfile)
+def remove_search_document_on_profile_delete(sender, instance, **kwargs):
+    search.remove_performer_document(instance.pk)
+
+
+@receiver(post_save, sender=RepertoireItem)
+def refresh_search_document_on_repertoire_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(search.REPERTOIRE_SEARCH_FIELDS):
+        return
+    search.refresh_performer_document(instance.performer_id)
+
+
+@receiver(post_delete, sender=RepertoireItem)
+def refresh_search_document_on_repertoire_delete(sender, instance, **kwargs):
+    search.refresh_performer_document(instance.performer_id)
+
+
+@receiver(post_save, sender=PerformerAvailability)
+@receiver(post_delete, sender=PerformerAvailability)
+def refresh_availability_index_on_change(sender, instance, raw=False, **kwargs):
+    """Пересчитывает маску доступности за год изменённой отметки."""
+    if raw or availability.index_is_batched():
+        return
+    # При каскадном удалении профиля строки индекса удаляются вместе с ним
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not PerformerAvailability:
+        return
+    performer = PerformerProfile.objects.filter(id=instance.performer_id).first()
+    if performer is not None:
+        availability.refresh_availability_index(performer, {instance.date.year})
+
+
+@receiver(post_save, sender=PerformerProfile)
+def rebuild_availability_index_on_mode_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Маски индекса зависят от calendar_mode: при его смене индекс артиста пересобирается."""
+    if raw or created:
+        instance._loaded_calendar_mode = instance.calendar_mode
+        return
+    if update_fields is not None and 'calendar_mode' not in update_fields:
+        return
+    if getattr(instance, '_loaded_calendar_mode', None) == instance.calendar_mode:
+        return
+    availability.rebuild_performer_availability_index(instance)
+    instance._loaded_calendar_mode = instance.calendar_mode
+
+
+@receiver(post_save, sender=PerformerProfile)
+def invalidate_facets_on_profile_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(facets.FACET_FIELDS):
+        return
+    facets.invalidate_facets()
+
+
+@receiver(post_delete, sender=PerformerProfile)
+def invalidate_facets_on_profile_delete(sender, instance, **kwargs):
+    facets.invalidate_facets()
+
+
+@receiver(post_save, sender=RepertoireItem)
+def refresh_autocomplete_on_repertoire_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Отмечает для автодополнения значения произведения до и после сохранения."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(autocomplete.INDEXED_FIELDS):
+        return
+    previous = getattr(instance, '_loaded_autocomplete_values', None)
+    current = instance.autocomplete_values()
+    instance._loaded_autocomplete_values = current
+    if previous != current:
+        autocomplete.record_change(previous, current)
+
+
+@receiver(post_delete, sender=RepertoireItem)
+def refresh_autocomplete_on_repertoire_delete(sender, instance, **kwargs):
+    autocomplete.record_change(getattr(instance, '_loaded_autocomplete_values', None), instance.autocomplete_values())
+
+
+@receiver(post_save, sender=PerformerProfile)
+def schedule_profile_photo_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Ставит в очередь копии главного фото, когда фото меняется.
+
+    Обычное сохранение профиля с тем же фото копии не трогает. Копии
+    заменённого или удалённого фото удаляются после коммита.
+    """
+    if raw:
+        return
+    if update_fields is not None and 'photo' not in update_fields:
+        return
+    previous = getattr(instance, '_loaded_photo', '')
+    current = instance.photo.name or ''
+    instance._loaded_photo = current
+    if previous and previous != current:
+        transaction.on_commit(lambda: _delete_unused_renditions(previous))
+    if current == previous:
+        return
+    if current and not ImageRendition.objects.filter(source_name=current).exists():
+        renditions.schedule_renditions(current)
+
+
+def _delete_unused_renditions(source_name):
+    if PerformerProfile.objects.filter(photo=source_name).exists():
+        return
+    if PerformerPhoto.objects.filter(photo=source_name).exists():
+        return
+    renditions.delete_renditions(source_name)
+
+
+@receiver(post_save, sender=PerformerPhoto)
+def schedule_gallery_photo_renditions(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    renditions.schedule_renditions(instance.photo.name)
+
+
+@receiver(post_delete, sender=PerformerPhoto)
+def delete_gallery_photo_renditions(sender, instance, **kwargs):
+    if instance.photo:
+        renditions.delete_renditions(instance.photo.name)
+
+
+@receiver(post_save, sender=PerformerProfile)
+@receiver(post_delete, sender=PerformerProfile)
+def bump_detail_cache_on_profile_change(sender, instance, **kwargs):
+    page_cache.bump_detail_version(instance.pk)
+
+
+@receiver(post_save, sender=PerformerPhoto)
+@receiver(post_delete, sender=PerformerPhoto)
+@receiver(post_save, sender=PerformerVideo)
+@receiver(post_delete, sender=PerformerVideo)
+@receiver(post_save, sender=RepertoireItem)
+@receiver(post_delete, sender=RepertoireItem)
+def bump_detail_cache_on_related_change(sender, instance, **kwargs):
+    page_cache.bump_detail_version(instance.performer_id)
+
+
+@receiver(renditions.renditions_generated)
+def bump_detail_cache_on_renditions(sender, source_name, **kwargs):
+    """Готовые копии фото должны попасть в закешированную страницу артиста."""
+    performer_ids = set(PerformerProfile.objects.filter(photo=source_name).values_list('id', flat=True))
+    performer_ids.update(PerformerPhoto.objects.filter(photo=source_name).values_list('performer_id', flat=True))
+    for performer_id in performer_ids:
+        page_cache.bump_detail_version(performer_id)
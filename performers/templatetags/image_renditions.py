@@ -0,0 +1,72 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from performers.renditions import RENDITION_ORDER, get_renditions
+
+register = template.Library()
+
+OBJECT_POSITIONS = {
+    'top': 'center top',
+    'bottom': 'center bottom',
+}
+
+
+def _srcset(renditions, variants, image_format):
+    return format_html_join(
+        ', ',
+        '{} {}w',
+        (
+            (renditions[variant][image_format].file.url, renditions[variant][image_format].width)
+            for variant in variants
+            if image_format in renditions.get(variant, {})
+        ),
+    )
+
+
+@register.simple_tag
+def rendition_img(image, variant='card', sizes='100vw', position=None, **attrs):
+    """
+    Выводит <picture> с WebP/JPEG srcset из копий не больше варианта variant.
+    Пока копии не созданы, выводит обычный <img> с оригиналом.
+    position — значение photo_position профиля (top/center/bottom).
+    Usage: {% rendition_img performer.photo 'card' alt=performer.full_name class='specialist-photo' %}
+    """
+    if not image:
+        return ''
+    if position is not None:
+        attrs['style'] = f"object-position: {OBJECT_POSITIONS.get(position, 'center center')};"
+
+    extra_attrs = format_html_join(
+        '',
+        ' {}="{}"',
+        ((name.replace('_', '-'), value) for name, value in attrs.items() if value is not None),
+    )
+    renditions = get_renditions(image)
+    target = renditions.get(variant, {}).get('jpeg')
+    if target is None:
+        return format_html('<img src="{}" loading="lazy"{}>', image.url, extra_attrs)
+
+    variants = RENDITION_ORDER[:RENDITION_ORDER.index(variant) + 1]
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" loading="lazy"{}>'
+        '</picture>',
+        _srcset(renditions, variants, 'webp'),
+        sizes,
+        target.file.url,
+        _srcset(renditions, variants, 'jpeg'),
+        sizes,
+        target.width,
+        target.height,
+        extra_attrs,
+    )
+
+
+@register.simple_tag
+def rendition_url(image, variant='full', image_format='jpeg'):
+    """URL одной копии (или оригинала, если копии ещё нет)."""
+    if not image:
+        return ''
+    rendition = get_renditions(image).get(variant, {}).get(image_format)
+    return rendition.file.url if rendition else image.url
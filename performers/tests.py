@@ -1,3 +1,617 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from accounts.models import LegalAcceptance
+from core.legal import LEGAL_DOCUMENTS, REQUIRED_LEGAL_DOCUMENT_SLUGS
+from core.pagination import encode_cursor
+from . import autocomplete, availability, signals
+from .availability import MATCH_ANY, apply_bulk_availability, date_range, free_performers_filter
+from .facets import get_facets
+from .models import (
+    ImageRendition,
+    PerformerAvailability,
+    PerformerPhoto,
+    PerformerProfile,
+    PerformerVideo,
+    RepertoireChange,
+    RepertoireItem,
+)
+from .search import rebuild_search_index, search_condition
+
+
+def create_performer(username, **fields):
+    user = get_user_model().objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='test-pass',
+    )
+    fields.setdefault('full_name', username)
+    return PerformerProfile.objects.create(user=user, **fields)
+
+
+def accept_legal_documents(user):
+    for slug in REQUIRED_LEGAL_DOCUMENT_SLUGS:
+        LegalAcceptance.objects.create(
+            user=user,
+            document_slug=slug,
+            document_title=LEGAL_DOCUMENTS[slug]['title'],
+            document_version=LEGAL_DOCUMENTS[slug]['version'],
+        )
+
+
+class PerformerSearchTests(TestCase):
+    def setUp(self):
+        self.soprano = create_performer('anna', full_name='Анна Нетребко', voice_type='Сопрано')
+        self.tenor = create_performer('ivan', full_name='Иван Козловский', voice_type='Тенор')
+
+    def _search(self, query):
+        condition, rank = search_condition(query)
+        performers = PerformerProfile.objects.filter(condition).annotate(search_rank=rank)
+        return list(performers.order_by('search_rank', 'id').values_list('id', flat=True))
+
+    def test_search_matches_profile_prefix_and_ignores_yo(self):
+        self.assertEqual(self._search('нетреб'), [self.soprano.id])
+        self.tenor.bio = 'Солист Большого театра, лауреат премий'
+        self.tenor.save()
+        self.assertEqual(self._search('солист БОЛЬШОГО'), [self.tenor.id])
+
+    def test_repertoire_changes_refresh_document(self):
+        item = RepertoireItem.objects.create(
+            performer=self.tenor,
+            composer='Чайковский П.И.',
+            work_title='Евгений Онегин',
+            role_or_part='Ленский',
+        )
+        self.assertEqual(self._search('ленский'), [self.tenor.id])
+
+        item.delete()
+        self.assertEqual(self._search('ленский'), [])
+
+    def test_deleted_profile_leaves_index(self):
+        performer_id = self.soprano.id
+        self.soprano.delete()
+        self.assertNotIn(performer_id, self._search('анна'))
+
+    def test_specialists_list_returns_ranked_results(self):
+        RepertoireItem.objects.create(performer=self.soprano, composer='Верди Дж.', work_title='Травиата')
+
+        response = self.client.get(reverse('performers:specialists'), {'q': 'травиата'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.id for p in response.context['performers']], [self.soprano.id])
+        self.assertEqual(response.context['total_count'], 1)
+
+    def test_specialists_list_counts_and_orders_all_matches(self):
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(username=f'choir{index}', email=f'choir{index}@example.com')
+            for index in range(30)
+        ])
+        PerformerProfile.objects.bulk_create([
+            PerformerProfile(user=user, full_name=f'Хорист {index}') for index, user in enumerate(users)
+        ])
+        rebuild_search_index()
+
+        url = reverse('performers:specialists')
+        response = self.client.get(url, {'q': 'хорист'})
+        self.assertEqual(response.context['total_count'], 30)
+
+        seen = []
+        while True:
+            page = response.context['performers']
+            seen.extend(performer.id for performer in page)
+            if not page.has_next():
+                break
+            response = self.client.get(url, {'q': 'хорист', 'cursor': page.next_cursor})
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+
+class AvailabilityIndexTests(TestCase):
+    def setUp(self):
+        self.busy_marker = create_performer('busy', calendar_mode='mark_unavailable')
+        self.free_marker = create_performer('free', calendar_mode='mark_available')
+        self.week = date_range(date(2026, 6, 1), date(2026, 6, 7))
+
+    def _free_ids(self, dates, **kwargs):
+        return set(
+            PerformerProfile.objects.filter(free_performers_filter(dates, **kwargs)).values_list('id', flat=True)
+        )
+
+    def test_calendar_mode_defaults_without_entries(self):
+        self.assertEqual(self._free_ids(self.week), {self.busy_marker.id})
+
+    def test_all_and_any_over_range(self):
+        PerformerAvailability.objects.create(performer=self.busy_marker, date=date(2026, 6, 3), status='unavailable')
+        PerformerAvailability.objects.create(performer=self.free_marker, date=date(2026, 6, 5), status='available')
+
+        self.assertEqual(self._free_ids(self.week), set())
+        self.assertEqual(self._free_ids(self.week, match=MATCH_ANY), {self.busy_marker.id, self.free_marker.id})
+        self.assertEqual(self._free_ids([date(2026, 6, 3)], match=MATCH_ANY), set())
+
+    def test_index_follows_deletes_and_mode_changes(self):
+        PerformerAvailability.objects.create(performer=self.busy_marker, date=date(2026, 6, 3), status='unavailable')
+        accept_legal_documents(self.busy_marker.user)
+        self.client.force_login(self.busy_marker.user)
+
+        self.client.post(
+            reverse('performers:update_calendar_mode', args=[self.busy_marker.id]),
+            data='{"mode": "mark_available"}',
+            content_type='application/json',
+        )
+        self.assertEqual(self._free_ids(self.week, match=MATCH_ANY), set())
+
+        self.client.post(
+            reverse('performers:update_availability', args=[self.busy_marker.id]),
+            data='{"date": "2026-06-03", "status": "none"}',
+            content_type='application/json',
+        )
+        self.busy_marker.calendar_mode = 'mark_unavailable'
+        self.busy_marker.save()
+        self.assertEqual(self._free_ids(self.week), {self.busy_marker.id})
+
+    def test_mode_change_outside_the_view_rebuilds_index(self):
+        PerformerAvailability.objects.create(performer=self.busy_marker, date=date(2026, 6, 3), status='unavailable')
+
+        # Как при сохранении из админки: объект загружен заново, меняется только режим
+        performer = PerformerProfile.objects.get(pk=self.busy_marker.pk)
+        performer.calendar_mode = 'mark_available'
+        performer.save()
+        self.assertEqual(self._free_ids([date(2026, 6, 4)], match=MATCH_ANY), set())
+
+        performer.calendar_mode = 'mark_unavailable'
+        performer.save()
+        self.assertEqual(self._free_ids([date(2026, 6, 4)]), {self.busy_marker.id})
+        self.assertEqual(self._free_ids([date(2026, 6, 3)]), set())
+
+
+class CatalogCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.performers = [
+            create_performer(f'artist{index}', birth_date=date(1980 + index % 4, 1, 1) if index % 3 else None)
+            for index in range(15)
+        ]
+
+    def _walk(self, sort):
+        seen = []
+        params = {'sort': sort}
+        while True:
+            response = self.client.get(reverse('performers:specialists'), params)
+            page_obj = response.context['performers']
+            seen.extend(performer.id for performer in page_obj)
+            if not page_obj.has_next():
+                return seen, response
+            params = {'sort': sort, 'cursor': page_obj.next_cursor}
+
+    def test_cursor_pages_cover_catalog_once_for_each_sort(self):
+        for sort in ('newest', 'name_asc', 'birth_date_asc', 'birth_date_desc'):
+            seen, response = self._walk(sort)
+            self.assertEqual(sorted(seen), sorted(p.id for p in self.performers), sort)
+            self.assertEqual(response.context['total_count'], 15)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        url = reverse('performers:specialists')
+        first = self.client.get(url, {'sort': 'birth_date_desc'}).context['performers']
+        second = self.client.get(url, {'sort': 'birth_date_desc', 'cursor': first.next_cursor}).context['performers']
+        back = self.client.get(url, {'sort': 'birth_date_desc', 'cursor': second.previous_cursor}).context['performers']
+
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+        self.assertFalse(back.has_previous())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        url = reverse('performers:specialists')
+        first = self.client.get(url, {'sort': 'newest'}).context['performers']
+        for values in (['not-a-date', 'x'], [1], [[1], {}], ['2026-01-01T00:00:00', 'x']):
+            response = self.client.get(url, {'sort': 'newest', 'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 200, values)
+            self.assertEqual([p.id for p in response.context['performers']], [p.id for p in first], values)
+
+
+class CatalogFacetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_facets_are_cached_and_invalidated_by_profile_changes(self):
+        create_performer('bass', voice_type='Бас')
+        create_performer('organ', performer_type=PerformerProfile.PERFORMER_TYPE_INSTRUMENTALIST, instrument='Терменвокс')
+
+        facets = get_facets()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_facets(), facets)
+
+        voice_counts = {option['value']: option['count'] for option in facets['voice_types']}
+        instrument_values = [option['value'] for option in facets['instruments']]
+        self.assertEqual(voice_counts['Бас'], 1)
+        self.assertEqual(voice_counts['Сопрано'], 0)
+        self.assertEqual(instrument_values[-1], 'Терменвокс')
+
+        create_performer('bass2', voice_type='Бас')
+        voice_counts = {option['value']: option['count'] for option in get_facets()['voice_types']}
+        self.assertEqual(voice_counts['Бас'], 2)
+        self.assertEqual(get_facets()['performer_type_counts'][PerformerProfile.PERFORMER_TYPE_VOCALIST], 2)
+
+
+class RepertoireAutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.reset_engine()
+        self.addCleanup(autocomplete.reset_engine)
+        self.first = create_performer('first')
+        self.second = create_performer('second')
+        for performer in (self.first, self.second):
+            RepertoireItem.objects.create(performer=performer, composer='Чайковский П.И.', work_title='Иоланта')
+        RepertoireItem.objects.create(performer=self.first, composer='Мусоргский М.П.', work_title='Хованщина')
+        RepertoireItem.objects.create(performer=self.first, composer='Чайковский П.И.', work_title='Пиковая дама')
+
+    def test_lookups_are_ranked_and_served_from_memory(self):
+        engine = autocomplete.get_engine()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.get_engine().composers_for('ский'), ['Чайковский П.И.', 'Мусоргский М.П.'])
+            self.assertEqual(engine.composers_for('мУ'), ['Мусоргский М.П.'])
+            works = engine.works_for('ДАМ', composer='чайков')
+        self.assertEqual(works, [{
+            'composer': 'Чайковский П.И.',
+            'work_title': 'Пиковая дама',
+            'category': 'other',
+            'role_or_part': '',
+        }])
+
+    def test_index_is_refreshed_after_repertoire_changes(self):
+        self.client.get(reverse('performers:autocomplete_works'), {'q': 'ёлка'})
+        RepertoireItem.objects.create(performer=self.second, composer='Прокофьев С.С.', work_title='Ёлка')
+
+        response = self.client.get(reverse('performers:autocomplete_works'), {'q': 'елк'})
+
+        self.assertEqual([work['work_title'] for work in response.json()['works']], ['Ёлка'])
+
+    def test_changes_refresh_only_affected_entries(self):
+        engine = autocomplete.get_engine()
+        item = RepertoireItem.objects.get(work_title='Хованщина')
+        item.composer = 'Мусоргский М.'
+        item.save()
+
+        with self.assertNumQueries(2):
+            self.assertIs(autocomplete.get_engine(), engine)
+        self.assertEqual(engine.composers_for('мусорг'), ['Мусоргский М.'])
+
+        item.delete()
+        autocomplete.get_engine()
+        self.assertEqual(engine.composers_for('мусорг'), [])
+        self.assertEqual(engine.works_for('хован'), [])
+
+    def test_changes_from_other_processes_are_polled(self):
+        engine = autocomplete.get_engine()
+        # Запись журнала от другого процесса: в этом процессе сигнала не было
+        RepertoireItem.objects.bulk_create([
+            RepertoireItem(performer=self.second, composer='Бородин А.П.', work_title='Князь Игорь'),
+        ])
+        RepertoireChange.objects.create(composer='Бородин А.П.', work_title='Князь Игорь', category='other')
+
+        self.assertEqual(autocomplete.get_engine().composers_for('бород'), [])
+        with mock.patch.object(autocomplete, 'POLL_INTERVAL', 0):
+            autocomplete._next_poll = 0
+            self.assertIs(autocomplete.get_engine(), engine)
+        self.assertEqual(engine.composers_for('бород'), ['Бородин А.П.'])
+
+    def test_fixture_loading_is_ignored(self):
+        item = RepertoireItem(performer=self.second, composer='Глинка М.И.', work_title='Жизнь за царя')
+        before = RepertoireChange.objects.count()
+        signals.refresh_autocomplete_on_repertoire_save(sender=RepertoireItem, instance=item, created=True, raw=True)
+        self.assertEqual(RepertoireChange.objects.count(), before)
+
+
+class CalendarBatchTests(TestCase):
+    def setUp(self):
+        self.first = create_performer('first')
+        self.second = create_performer('second', calendar_mode='mark_available')
+        PerformerAvailability.objects.create(performer=self.first, date=date(2026, 3, 4), status='unavailable')
+        PerformerAvailability.objects.create(performer=self.second, date=date(2026, 3, 1), status='available')
+        PerformerAvailability.objects.create(performer=self.second, date=date(2026, 3, 2), status='available')
+        self.params = {'performers': f'{self.first.id},{self.second.id}', 'start': '2026-03-01', 'end': '2026-03-31'}
+
+    def test_returns_run_length_encoded_days(self):
+        response = self.client.get(reverse('performers:get_calendar_batch'), self.params)
+
+        performers = response.json()['performers']
+        self.assertEqual(performers[str(self.first.id)]['days'], '3.1u27.')
+        self.assertEqual(performers[str(self.second.id)], {'calendar_mode': 'mark_available', 'days': '2a29.'})
+
+    def test_repeat_view_is_not_modified_until_calendar_changes(self):
+        url = reverse('performers:get_calendar_batch')
+        etag = self.client.get(url, self.params)['ETag']
+
+        self.assertEqual(self.client.get(url, self.params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        PerformerAvailability.objects.filter(performer=self.first).delete()
+        self.assertEqual(self.client.get(url, self.params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_days_are_not_hidden_by_if_modified_since(self):
+        url = reverse('performers:get_calendar_batch')
+        response = self.client.get(url, self.params)
+        self.assertNotIn('Last-Modified', response)
+
+        PerformerAvailability.objects.filter(performer=self.first).delete()
+        response = self.client.get(url, self.params, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['performers'][str(self.first.id)]['days'], '31.')
+
+
+class BulkAvailabilityTests(TestCase):
+    def setUp(self):
+        self.performer = create_performer('touring')
+        accept_legal_documents(self.performer.user)
+        self.client.force_login(self.performer.user)
+        self.url = reverse('performers:bulk_update_availability', args=[self.performer.id])
+
+    def _post(self, operations):
+        return self.client.post(self.url, data=json.dumps({'operations': operations}), content_type='application/json')
+
+    def test_recurrence_rule_is_applied_in_constant_queries(self):
+        PerformerAvailability.objects.create(performer=self.performer, date=date(2026, 3, 2), status='maybe')
+        PerformerAvailability.objects.create(performer=self.performer, date=date(2026, 3, 5), status='available')
+        operations = [
+            {'start': '2026-03-01', 'end': '2026-03-31', 'weekdays': [0], 'status': 'unavailable'},
+            {'dates': ['2026-03-05'], 'status': 'none'},
+        ]
+
+        with self.assertNumQueries(8):
+            changes = apply_bulk_availability(self.performer, operations)
+
+        mondays = [date(2026, 3, day) for day in (2, 9, 16, 23, 30)]
+        self.assertEqual(
+            sorted(PerformerAvailability.objects.filter(performer=self.performer).values_list('date', flat=True)),
+            mondays,
+        )
+        self.assertEqual(changes['2026-03'][0], {'date': '2026-03-02', 'before': 'maybe', 'after': 'unavailable'})
+        self.assertIn({'date': '2026-03-05', 'before': 'available', 'after': None}, changes['2026-03'])
+        self.assertFalse(availability.index_is_batched())
+        self.assertEqual(len(changes['2026-03']), 6)
+        self.assertEqual(self._free_ids(mondays), set())
+
+    def _free_ids(self, dates):
+        return set(
+            PerformerProfile.objects.filter(free_performers_filter(dates, match=MATCH_ANY)).values_list('id', flat=True)
+        )
+
+    def test_endpoint_rejects_invalid_status(self):
+        response = self._post([{'dates': ['2026-03-05'], 'status': 'busy'}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PerformerAvailability.objects.exists())
+
+
+class RepertoireReorderTests(TestCase):
+    def setUp(self):
+        self.performer = create_performer('singer')
+        accept_legal_documents(self.performer.user)
+        self.items = [
+            RepertoireItem.objects.create(performer=self.performer, composer='Моцарт В.А.', work_title=f'Ария {index}', order=index)
+            for index in range(30)
+        ]
+        self.client.force_login(self.performer.user)
+        self.url = reverse('performers:reorder_repertoire')
+
+    def _post(self, items):
+        return self.client.post(self.url, data=json.dumps({'items': items}), content_type='application/json')
+
+    def test_reorder_uses_constant_queries(self):
+        payload = [{'id': item.id, 'order': 29 - index} for index, item in enumerate(self.items)]
+        self._post(payload[:2])  # прогреваем сессию и проверку юридических документов
+
+        with self.assertNumQueries(8):
+            response = self._post(payload)
+
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(
+            list(RepertoireItem.objects.filter(performer=self.performer).order_by('order').values_list('id', flat=True)),
+            [item.id for item in reversed(self.items)],
+        )
+
+    def test_foreign_items_reject_whole_request(self):
+        other = create_performer('other')
+        foreign = RepertoireItem.objects.create(performer=other, composer='Бах И.С.', work_title='Кантата', order=5)
+
+        response = self._post([{'id': self.items[0].id, 'order': 7}, {'id': foreign.id, 'order': 0}])
+
+        self.assertEqual(response.status_code, 403)
+        foreign.refresh_from_db()
+        self.items[0].refresh_from_db()
+        self.assertEqual((foreign.order, self.items[0].order), (5, 0))
+
+
+def make_image(size=(3000, 2000), mode='RGB', image_format='JPEG', exif_orientation=None):
+    from PIL import Image
+
+    image = Image.new(mode, size, (200, 50, 50, 128) if mode == 'RGBA' else (200, 50, 50))
+    options = {}
+    if exif_orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        options['exif'] = exif
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_RENDITIONS_ASYNC=False)
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(self.settings_override.disable)
+        self.performer = create_performer('singer')
+
+    def _add_gallery_photo(self, content, name='photo.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return PerformerPhoto.objects.create(
+                performer=self.performer,
+                photo=SimpleUploadedFile(name, content, content_type='image/jpeg'),
+            )
+
+    def test_upload_generates_all_variants_after_commit(self):
+        from PIL import Image
+
+        photo = self._add_gallery_photo(make_image(exif_orientation=6))
+
+        renditions = {(r.variant, r.format): r for r in ImageRendition.objects.filter(source_name=photo.photo.name)}
+        self.assertEqual(len(renditions), 8)
+        # Ориентация 6 — поворот на 90°, поэтому копии портретные
+        hero = renditions[('hero', 'jpeg')]
+        self.assertEqual((hero.width, hero.height), (800, 1200))
+        with Image.open(hero.file.path) as stored:
+            self.assertEqual(stored.size, (800, 1200))
+            self.assertNotIn(0x0112, stored.getexif())
+        self.assertEqual(renditions[('thumb', 'webp')].file.name.rsplit('.', 1)[-1], 'webp')
+
+    def test_transparent_png_is_flattened(self):
+        photo = self._add_gallery_photo(make_image(size=(100, 100), mode='RGBA', image_format='PNG'), name='logo.png')
+
+        thumb = ImageRendition.objects.get(source_name=photo.photo.name, variant='thumb', format='jpeg')
+        self.assertEqual((thumb.width, thumb.height), (100, 100))
+
+    def test_tag_renders_picture_with_srcset_and_falls_back_to_original(self):
+        template = Template("{% load image_renditions %}{% rendition_img photo.photo 'card' alt='Фото' %}")
+        photo = PerformerPhoto.objects.create(
+            performer=self.performer,
+            photo=SimpleUploadedFile('plain.jpg', make_image(size=(50, 50)), content_type='image/jpeg'),
+        )
+        fallback = template.render(Context({'photo': photo}))
+        self.assertIn(f'src="{photo.photo.url}"', fallback)
+        self.assertNotIn('<picture', fallback)
+
+        photo = self._add_gallery_photo(make_image())
+        html = template.render(Context({'photo': PerformerPhoto.objects.get(id=photo.id)}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('320w', html)
+        self.assertIn('480w', html)
+        self.assertNotIn('1600w', html)
+        self.assertIn('width="480" height="320"', html)
+
+    def test_deleting_photo_removes_renditions(self):
+        photo = self._add_gallery_photo(make_image(size=(200, 200)))
+        files = [rendition.file.path for rendition in ImageRendition.objects.filter(source_name=photo.photo.name)]
+
+        photo.delete()
+
+        self.assertFalse(ImageRendition.objects.filter(source_name=photo.photo.name).exists())
+        self.assertFalse(any(os.path.exists(path) for path in files))
+
+    def _set_profile_photo(self, content, name):
+        profile = PerformerProfile.objects.get(pk=self.performer.pk)
+        profile.photo = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        return profile.photo.name
+
+    def test_replacing_profile_photo_removes_old_renditions(self):
+        old_name = self._set_profile_photo(make_image(size=(200, 200)), 'first.jpg')
+        files = [rendition.file.path for rendition in ImageRendition.objects.filter(source_name=old_name)]
+        self.assertEqual(len(files), 8)
+
+        new_name = self._set_profile_photo(make_image(size=(200, 200)), 'second.jpg')
+
+        self.assertFalse(ImageRendition.objects.filter(source_name=old_name).exists())
+        self.assertFalse(any(os.path.exists(path) for path in files))
+        self.assertEqual(ImageRendition.objects.filter(source_name=new_name).count(), 8)
+
+
+    def test_profile_edits_do_not_reschedule_renditions(self):
+        self._set_profile_photo(make_image(size=(200, 200)), 'first.jpg')
+        profile = PerformerProfile.objects.get(pk=self.performer.pk)
+        ImageRendition.objects.all().delete()
+
+        profile.bio = 'Новая биография'
+        with mock.patch('performers.renditions.schedule_renditions') as schedule:
+            profile.save()
+        schedule.assert_not_called()
+
+    def test_regeneration_replaces_rows_and_cleans_up_files(self):
+        from . import renditions
+
+        photo = self._add_gallery_photo(make_image(size=(200, 200)))
+        first = [rendition.file.path for rendition in ImageRendition.objects.filter(source_name=photo.photo.name)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            renditions.generate_renditions(photo.photo.name)
+        second = [rendition.file.path for rendition in ImageRendition.objects.filter(source_name=photo.photo.name)]
+        self.assertEqual(len(second), 8)
+        self.assertFalse(any(os.path.exists(path) for path in first))
+
+        rendition_dir = os.path.dirname(second[0])
+        before = set(os.listdir(rendition_dir))
+        with mock.patch.object(renditions, '_replace_rendition_rows', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                renditions.generate_renditions(photo.photo.name)
+        self.assertEqual(set(os.listdir(rendition_dir)), before)
+
+
+class PerformerDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.performer = create_performer('singer', full_name='Мария Каллас', bio='Оперная певица')
+        self.url = reverse('performers:performer_detail', args=[self.performer.id])
+
+    def _add_content(self, count):
+        for index in range(count):
+            RepertoireItem.objects.create(performer=self.performer, composer='Верди Дж.', work_title=f'Ария {index}')
+            PerformerVideo.objects.create(performer=self.performer, video_url=f'https://example.com/{index}', title=f'Видео {index}')
+
+    def test_cache_miss_runs_fixed_number_of_queries(self):
+        self._add_content(1)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+        self._add_content(10)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.content.decode().count('Ария 9'), 1)
+
+    def test_cache_hit_skips_related_queries(self):
+        self._add_content(3)
+        self.client.get(self.url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Ария 2')
+        self.assertContains(response, 'Видео 2')
+
+    def test_related_changes_invalidate_cached_fragments(self):
+        self.client.get(self.url)
+
+        RepertoireItem.objects.create(performer=self.performer, composer='Пуччини Дж.', work_title='Тоска')
+        self.assertContains(self.client.get(self.url), 'Тоска')
+
+        self.performer.bio = 'Легенда оперной сцены'
+        self.performer.save()
+        self.assertContains(self.client.get(self.url), 'Легенда оперной сцены')
+
+        PerformerVideo.objects.filter(performer=self.performer).delete()
+        PerformerVideo.objects.create(performer=self.performer, video_url='https://example.com/x', title='Норма')
+        self.assertContains(self.client.get(self.url), 'Норма')
+
+    def test_viewer_specific_chrome_is_not_cached(self):
+        self.client.get(self.url)
+        viewer = get_user_model().objects.create_user(username='fan', email='fan@example.com', password='test-pass')
+        accept_legal_documents(viewer)
+        self.client.force_login(viewer)
+
+        response = self.client.get(self.url)
+
+        self.assertContains(response, reverse('start_chat_with_performer', args=[self.performer.id]))
+        self.assertContains(response, 'id="calendar-tab"')
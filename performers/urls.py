@@ -7,7 +7,9 @@ urlpatterns = [
     path('specialists/', views.specialists_list, name='specialists'),
     path('performer/<int:performer_id>/', views.performer_detail, name='performer_detail'),
     path('api/performer/<int:performer_id>/calendar/', views.get_calendar_data, name='get_calendar_data'),
+    path('api/calendar/batch/', views.get_calendar_batch, name='get_calendar_batch'),
     path('api/performer/<int:performer_id>/availability/', views.update_availability, name='update_availability'),
+    path('api/performer/<int:performer_id>/availability/bulk/', views.bulk_update_availability, name='bulk_update_availability'),
     path('api/performer/<int:performer_id>/calendar-mode/', views.update_calendar_mode, name='update_calendar_mode'),
     
     # Repertoire management
@@ -4,17 +4,42 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Q, prefetch_related_objects
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+import hashlib
 import json
 from datetime import datetime, timedelta
+from core.pagination import KeysetPaginator
 from .models import PerformerProfile, PerformerAvailability, RepertoireItem
 from .forms import RepertoireItemForm
+from . import autocomplete
+from .facets import get_facets
+from .availability import (
+    MATCH_ALL,
+    MAX_RANGE_DAYS,
+    apply_bulk_availability,
+    date_range,
+    encode_status_runs,
+    free_performers_filter,
+)
+from .page_cache import DETAIL_CACHE_TIMEOUT, bump_detail_version, detail_version, fragments_cached
+from .renditions import attach_renditions
+from .search import search_condition
 
 def performer_detail(request, performer_id):
     """Страница детальной информации об артисте"""
-    performer = get_object_or_404(PerformerProfile, id=performer_id)
+    performer = get_object_or_404(PerformerProfile.objects.select_related('user'), id=performer_id)
+    version = detail_version(performer.id)
+    if not fragments_cached(performer.id, version):
+        # Промах кеша: связанные данные загружаются фиксированным числом запросов
+        prefetch_related_objects([performer], 'photos', 'videos', 'repertoire_items')
+        attach_renditions([performer.photo] + [photo.photo for photo in performer.photos.all()])
     context = {
         'performer': performer,
+        'detail_version': version,
+        'detail_cache_timeout': DETAIL_CACHE_TIMEOUT,
     }
     return render(request, 'performers/performer_detail.html', context)
 
@@ -26,13 +51,20 @@ def specialists_list(request):
     search_query = request.GET.get('q', '').strip()
     voice_type = request.GET.get('voice_type', '').strip()
     availability_date_str = request.GET.get('availability_date', '').strip()
+    availability_date_to_str = request.GET.get('availability_date_to', '').strip()
+    availability_match = request.GET.get('availability_match', MATCH_ALL)
     performer_type = request.GET.get('performer_type', '').strip()
     instrument = request.GET.get('instrument', '').strip()
     birth_date_from = request.GET.get('birth_date_from', '').strip()
     birth_date_to = request.GET.get('birth_date_to', '').strip()
-    sort_option = request.GET.get('sort', 'newest')
-
-    if search_query:
+    sort_option = request.GET.get('sort', 'relevance' if search_query else 'newest')
+
+    # Совпадения и релевантность считаются в SQL: учитываются все совпадения
+    full_text = search_condition(search_query) if search_query else None
+    if full_text is not None:
+        condition, rank = full_text
+        performers = performers.filter(condition).annotate(search_rank=rank)
+    elif search_query:
         performers = performers.filter(
             Q(full_name__icontains=search_query) |
             Q(voice_type__icontains=search_query) |
@@ -60,22 +92,17 @@ def specialists_list(request):
         except ValueError:
             selected_availability_date = None
 
-    if selected_availability_date:
-        unavailable_ids = PerformerAvailability.objects.filter(
-            date=selected_availability_date,
-            status='unavailable'
-        ).values_list('performer_id', flat=True)
-
-        performers = performers.exclude(id__in=unavailable_ids)
-
-        mark_available_ids = PerformerAvailability.objects.filter(
-            performer__calendar_mode='mark_available',
-            date=selected_availability_date,
-            status__in=['available', 'maybe']
-        ).values_list('performer_id', flat=True)
+    selected_availability_date_to = None
+    if availability_date_to_str:
+        try:
+            selected_availability_date_to = datetime.strptime(availability_date_to_str, '%Y-%m-%d').date()
+        except ValueError:
+            selected_availability_date_to = None
 
+    if selected_availability_date:
+        availability_dates = date_range(selected_availability_date, selected_availability_date_to)
         performers = performers.filter(
-            Q(calendar_mode='mark_unavailable') | Q(id__in=mark_available_ids)
+            free_performers_filter(availability_dates, match=availability_match)
         )
 
     def _parse_date(value):
@@ -95,67 +122,51 @@ def specialists_list(request):
         performers = performers.filter(birth_date__lte=date_to)
 
     sort_map = {
-        'newest': ['-created_at'],
-        'oldest': ['created_at'],
-        'name_asc': ['full_name', '-created_at'],
-        'name_desc': ['-full_name', '-created_at'],
-        'birth_date_desc': ['-birth_date', 'full_name'],
-        'birth_date_asc': ['birth_date', 'full_name'],
+        'relevance': ['search_rank', 'id'] if full_text is not None else ['-created_at', '-id'],
+        'newest': ['-created_at', '-id'],
+        'oldest': ['created_at', 'id'],
+        'name_asc': ['full_name', 'id'],
+        'name_desc': ['-full_name', '-id'],
+        'birth_date_desc': ['-birth_date', '-id'],
+        'birth_date_asc': ['birth_date', 'id'],
     }
-    order_by_fields = sort_map.get(sort_option, ['-created_at'])
+    order_by_fields = sort_map.get(sort_option, sort_map['newest'])
     performers = performers.order_by(*order_by_fields)
 
-    def merge_options(default_list, queryset):
-        merged = list(default_list)
-        for value in queryset:
-            if value and value not in merged:
-                merged.append(value)
-        return merged
-
-    voice_types = merge_options(
-        PerformerProfile.DEFAULT_VOICE_TYPES,
-        PerformerProfile.objects.filter(
-            performer_type=PerformerProfile.PERFORMER_TYPE_VOCALIST
-        )
-        .exclude(voice_type__isnull=True)
-        .exclude(voice_type='')
-        .values_list('voice_type', flat=True)
-        .distinct()
-    )
-
-    instrument_choices = merge_options(
-        PerformerProfile.DEFAULT_INSTRUMENTS,
-        PerformerProfile.objects.filter(
-            performer_type__in=[
-                PerformerProfile.PERFORMER_TYPE_INSTRUMENTALIST,
-                PerformerProfile.PERFORMER_TYPE_CONCERTMASTER,
-            ]
-        )
-        .exclude(instrument__isnull=True)
-        .exclude(instrument='')
-        .values_list('instrument', flat=True)
-        .distinct()
-    )
+    facets = get_facets()
 
-    paginator = Paginator(performers, 12)  # 12 артистов на страницу
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number:
+        # Старые ссылки с номером страницы продолжают работать через OFFSET
+        paginator = Paginator(performers, 12)  # 12 артистов на страницу
+        page_obj = paginator.get_page(page_number)
+        total_count = paginator.count
+    else:
+        paginator = KeysetPaginator(performers, order_by_fields, 12)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+        total_count = paginator.count
+    attach_renditions([performer.photo for performer in page_obj])
 
     query_params = request.GET.copy()
-    if 'page' in query_params:
-        query_params.pop('page')
+    for key in ('page', 'cursor'):
+        if key in query_params:
+            query_params.pop(key)
 
     context = {
         'page_obj': page_obj,
         'performers': page_obj,
-        'voice_types': voice_types,
-        'instrument_choices': instrument_choices,
-        'total_count': paginator.count,
+        'voice_types': facets['voice_types'],
+        'instrument_choices': facets['instruments'],
+        'performer_type_counts': facets['performer_type_counts'],
+        'total_count': total_count,
+        'cursor_pagination': isinstance(paginator, KeysetPaginator),
         'query_params': query_params.urlencode(),
         'search_query': search_query,
         'selected_performer_type': performer_type,
         'selected_instrument': instrument,
         'availability_date': availability_date_str,
+        'availability_date_to': availability_date_to_str,
+        'availability_match': availability_match,
     }
     return render(request, 'performers/specialists_list.html', context)
 
@@ -199,6 +210,67 @@ def get_calendar_data(request, performer_id):
     return JsonResponse(data)
 
 
+MAX_BATCH_CALENDAR_PERFORMERS = 50
+
+
+@require_http_methods(["GET"])
+def get_calendar_batch(request):
+    """Календари нескольких артистов за диапазон дат одним запросом.
+
+    Параметры: performers=1,2,3&start=YYYY-MM-DD&end=YYYY-MM-DD.
+    Статусы по дням кодируются RLE-строкой (см. encode_status_runs).
+    Ответ поддерживает ETag, повторный просмотр получает 304. Last-Modified
+    не отдаётся: Max(updated_at) не меняется при удалении отметок, и
+    If-Modified-Since отвечал бы 304 на устаревший календарь.
+    """
+    try:
+        performer_ids = sorted({int(value) for value in request.GET.get('performers', '').split(',') if value.strip()})
+        start = datetime.strptime(request.GET.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+
+    if not performer_ids or len(performer_ids) > MAX_BATCH_CALENDAR_PERFORMERS:
+        return JsonResponse({'error': 'Invalid performers list'}, status=400)
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        return JsonResponse({'error': 'Invalid date range'}, status=400)
+
+    calendar_modes = dict(
+        PerformerProfile.objects.filter(id__in=performer_ids).values_list('id', 'calendar_mode')
+    )
+    availabilities = PerformerAvailability.objects.filter(
+        performer_id__in=calendar_modes.keys(),
+        date__gte=start,
+        date__lte=end,
+    )
+    stats = availabilities.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+
+    # Количество строк учитывает удаления, которые не меняют Max(updated_at)
+    etag_source = f"{start}|{end}|{sorted(calendar_modes.items())}|{stats['total']}|{stats['last_modified']}"
+    etag = quote_etag(hashlib.md5(etag_source.encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    statuses = {performer_id: {} for performer_id in calendar_modes}
+    for performer_id, day, status in availabilities.values_list('performer_id', 'date', 'status'):
+        statuses[performer_id][day] = status
+
+    response = JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'performers': {
+            str(performer_id): {
+                'calendar_mode': calendar_modes[performer_id],
+                'days': encode_status_runs(start, end, statuses[performer_id]),
+            }
+            for performer_id in calendar_modes
+        },
+    })
+    response['ETag'] = etag
+    return response
+
+
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
@@ -250,6 +322,34 @@ def update_availability(request, performer_id):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+@login_required
+@require_http_methods(["POST"])
+@csrf_exempt
+def bulk_update_availability(request, performer_id):
+    """Массовое обновление доступности диапазонами и правилами повторения.
+
+    Тело запроса: {"operations": [{"start": "2026-03-01", "end": "2026-03-31",
+    "weekdays": [0], "status": "unavailable", "notes": ""}, {"dates": [...],
+    "status": "none"}]}. Статус "none" удаляет отметки.
+    """
+    performer = get_object_or_404(PerformerProfile, id=performer_id)
+
+    # Проверка прав доступа
+    if request.user != performer.user:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        operations = data.get('operations', [])
+        if not isinstance(operations, list):
+            return JsonResponse({'error': 'Invalid operations'}, status=400)
+        changes = apply_bulk_availability(performer, operations)
+        return JsonResponse({'success': True, 'changes': changes})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 @login_required
 @require_http_methods(["POST"])
 @csrf_exempt
@@ -396,16 +496,25 @@ def reorder_repertoire(request):
     try:
         data = json.loads(request.body)
         item_orders = data.get('items', [])  # [{id: 1, order: 0}, {id: 2, order: 1}, ...]
-        
-        for item_data in item_orders:
-            item = RepertoireItem.objects.filter(
-                id=item_data['id'],
-                performer=request.user.performer_profile
-            ).first()
-            if item:
-                item.order = item_data['order']
-                item.save(update_fields=['order'])
-        
+        new_orders = {int(item_data['id']): int(item_data['order']) for item_data in item_orders}
+
+        items = list(
+            RepertoireItem.objects.filter(
+                id__in=new_orders.keys(),
+                performer=request.user.performer_profile,
+            ).only('id', 'order').order_by()
+        )
+        if len(items) != len(new_orders):
+            return JsonResponse({'error': 'Access denied'}, status=403)
+
+        changed = [item for item in items if item.order != new_orders[item.id]]
+        for item in changed:
+            item.order = new_orders[item.id]
+        with transaction.atomic():
+            RepertoireItem.objects.bulk_update(changed, ['order'])
+        # bulk_update не отправляет сигналы — сбрасываем кеш страницы артиста явно
+        bump_detail_version(request.user.performer_profile.id)
+
         return JsonResponse({'success': True})
         
     except Exception as e:
@@ -422,12 +531,10 @@ def autocomplete_composers(request):
     if len(query) < 2:
         return JsonResponse({'composers': []})
     
-    # Ищем уникальных композиторов из уже введенных данных
-    composers = RepertoireItem.objects.filter(
-        composer__icontains=query
-    ).values_list('composer', flat=True).distinct()[:10]
-    
-    return JsonResponse({'composers': list(composers)})
+    # Ищем по индексу уникальных композиторов, построенному в памяти процесса
+    composers = autocomplete.get_engine().composers_for(query)
+
+    return JsonResponse({'composers': composers})
 
 
 @require_http_methods(["GET"])
@@ -440,12 +547,6 @@ def autocomplete_works(request):
         return JsonResponse({'works': []})
     
     # Фильтруем по композитору если указан
-    filters = Q(work_title__icontains=query)
-    if composer:
-        filters &= Q(composer__icontains=composer)
-    
-    works = RepertoireItem.objects.filter(filters).values(
-        'work_title', 'composer', 'category', 'role_or_part'
-    ).distinct()[:10]
-    
-    return JsonResponse({'works': list(works)})
+    works = autocomplete.get_engine().works_for(query, composer=composer)
+
+    return JsonResponse({'works': works})